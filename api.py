@@ -0,0 +1,174 @@
+"""
+API JSON paginée des élèves, évaluations et commentaires (LSU École du Cap)
+Pagination par curseur (keyset) sur la clé primaire : chaque page est une
+requête « id > dernier id vu ORDER BY id LIMIT n » servie par l'index, dont
+le coût ne dépend pas de la profondeur, contrairement à OFFSET. Les champs
+renvoyés peuvent être choisis (?champs=id,nom) et seules ces colonnes sont
+lues. Un enseignant ne voit que les données de ses classes.
+
+    GET /api/eleves?classe=3&champs=id,nom,prenom&limite=100
+    GET /api/evaluations?periode=P2&matiere=1&curseur=<suivant>
+"""
+
+from app import db
+from models import Eleve, Evaluation, Commentaire
+from datetime import date, datetime
+import base64
+import json
+
+
+LIMITE_DEFAUT = 50
+LIMITE_MAX = 500
+
+
+class Ressource:
+    """Modèle exposé : champs publics, filtres et rattachement à une classe"""
+
+    def __init__(self, modele, champs, champs_defaut, filtres, colonne_classe,
+                 jointure=None):
+        self.modele = modele
+        self.champs = champs
+        self.champs_defaut = champs_defaut
+        self.filtres = filtres  # paramètre -> (colonne, conversion)
+        self.colonne_classe = colonne_classe
+        self.jointure = jointure
+
+
+RESSOURCES = {
+    'eleves': Ressource(
+        Eleve,
+        champs=('id', 'nom', 'prenom', 'date_naissance', 'classe_id', 'photo',
+                'observations', 'date_creation'),
+        champs_defaut=('id', 'nom', 'prenom', 'date_naissance', 'classe_id'),
+        filtres={'classe': (Eleve.classe_id, int)},
+        colonne_classe=Eleve.classe_id,
+    ),
+    'evaluations': Ressource(
+        Evaluation,
+        champs=('id', 'eleve_id', 'matiere_id', 'classe_id', 'periode',
+                'annee_scolaire', 'niveau', 'commentaire', 'date_evaluation'),
+        champs_defaut=('id', 'eleve_id', 'matiere_id', 'classe_id', 'periode',
+                       'annee_scolaire', 'niveau'),
+        filtres={'classe': (Evaluation.classe_id, int),
+                 'eleve': (Evaluation.eleve_id, int),
+                 'matiere': (Evaluation.matiere_id, int),
+                 'periode': (Evaluation.periode, str),
+                 'annee_scolaire': (Evaluation.annee_scolaire, str)},
+        colonne_classe=Evaluation.classe_id,
+    ),
+    'commentaires': Ressource(
+        Commentaire,
+        champs=('id', 'eleve_id', 'auteur_id', 'type_commentaire', 'periode',
+                'annee_scolaire', 'contenu', 'version_ia', 'date_creation',
+                'modifie'),
+        champs_defaut=('id', 'eleve_id', 'type_commentaire', 'periode',
+                       'annee_scolaire', 'contenu'),
+        filtres={'classe': (Eleve.classe_id, int),
+                 'eleve': (Commentaire.eleve_id, int),
+                 'periode': (Commentaire.periode, str),
+                 'type': (Commentaire.type_commentaire, str),
+                 'annee_scolaire': (Commentaire.annee_scolaire, str)},
+        colonne_classe=Eleve.classe_id,
+        jointure=Eleve,  # la classe d'un commentaire est celle de l'élève
+    ),
+}
+
+
+def encoder_curseur(dernier_id, ordre):
+    brut = json.dumps({'id': dernier_id, 'ordre': ordre}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(brut.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decoder_curseur(curseur):
+    """(dernier id, ordre) d'un curseur renvoyé par une page précédente"""
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+        contenu = json.loads(brut)
+        if contenu['ordre'] not in ('asc', 'desc'):
+            raise ValueError
+        return int(contenu['id']), contenu['ordre']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Curseur invalide')
+
+
+def serialiser(valeur):
+    if isinstance(valeur, (date, datetime)):
+        return valeur.isoformat()
+    return valeur
+
+
+def page(nom_ressource, parametres, utilisateur):
+    """Une page de la ressource : {'donnees', 'suivant', 'limite'}
+
+    ValueError pour un paramètre invalide, PermissionError pour une classe
+    hors du périmètre de l'utilisateur.
+    """
+    ressource = RESSOURCES[nom_ressource]
+    modele = ressource.modele
+
+    champs = ressource.champs_defaut
+    if parametres.get('champs'):
+        champs = [c.strip() for c in parametres['champs'].split(',') if c.strip()]
+        inconnus = [c for c in champs if c not in ressource.champs]
+        if inconnus:
+            raise ValueError(f"Champs inconnus : {', '.join(inconnus)}")
+        # L'identifiant est toujours renvoyé : il sert de curseur
+        champs = ['id'] + [c for c in champs if c != 'id']
+
+    try:
+        limite = int(parametres.get('limite', LIMITE_DEFAUT))
+    except ValueError:
+        raise ValueError('Limite invalide')
+    if not 1 <= limite <= LIMITE_MAX:
+        raise ValueError(f'La limite doit être comprise entre 1 et {LIMITE_MAX}')
+
+    if parametres.get('curseur'):
+        apres, ordre = decoder_curseur(parametres['curseur'])
+    else:
+        apres, ordre = None, parametres.get('ordre', 'asc')
+        if ordre not in ('asc', 'desc'):
+            raise ValueError("L'ordre doit être asc ou desc")
+
+    requete = db.select(*[getattr(modele, c) for c in champs])
+    if ressource.jointure is not None:
+        requete = requete.join(ressource.jointure)
+
+    # Périmètre : classes de l'enseignant (instantané, sans requête)
+    if utilisateur.role != 'admin':
+        requete = requete.where(ressource.colonne_classe.in_(sorted(utilisateur.classe_ids)))
+
+    for nom, (colonne, conversion) in ressource.filtres.items():
+        valeur = parametres.get(nom)
+        if valeur in (None, ''):
+            continue
+        try:
+            valeur = conversion(valeur)
+        except ValueError:
+            raise ValueError(f'Filtre {nom} invalide')
+        if nom == 'classe' and utilisateur.role != 'admin' \
+                and not utilisateur.possede_classe(valeur):
+            raise PermissionError('Accès non autorisé')
+        requete = requete.where(colonne == valeur)
+
+    if ordre == 'asc':
+        if apres is not None:
+            requete = requete.where(modele.id > apres)
+        requete = requete.order_by(modele.id.asc())
+    else:
+        if apres is not None:
+            requete = requete.where(modele.id < apres)
+        requete = requete.order_by(modele.id.desc())
+
+    # Une ligne de plus que demandé : indique s'il reste une page
+    lignes = db.session.execute(requete.limit(limite + 1)).all()
+    suivant = None
+    if len(lignes) > limite:
+        lignes = lignes[:limite]
+        suivant = encoder_curseur(lignes[-1].id, ordre)
+
+    return {
+        'donnees': [{champ: serialiser(valeur) for champ, valeur in zip(champs, ligne)}
+                    for ligne in lignes],
+        'suivant': suivant,
+        'limite': limite,
+    }
@@ -0,0 +1,207 @@
+"""
+Archivage des années scolaires closes (LSU École du Cap)
+Les évaluations (avec leurs compétences) et les commentaires d'une année close
+sont déplacés des tables courantes vers les tables *_archive, par lots d'une
+transaction chacun : les tables et index courants restent limités aux années
+en cours. Les vues en lecture seule evaluation_historique,
+evaluation_competence_historique et commentaire_historique (courant +
+archive) servent aux livrets des années passées. Les lignes archivées restent
+dans l'index de recherche plein texte (recherche.indexer_archives).
+
+    python archivage.py 2022-2023 [--taille-lot 5000]
+    python archivage.py --statut
+"""
+
+from app import app, db
+from models import (Classe, Eleve, Evaluation, EvaluationCompetence, Commentaire,
+                    EvaluationArchive, EvaluationCompetenceArchive,
+                    CommentaireArchive, AnneeArchivee)
+from versions_donnees import incrementer as incrementer_versions
+from synchro import journaliser
+from datetime import datetime
+import argparse
+import cache_parametres
+import re
+import recherche
+
+
+TAILLE_LOT = 5000
+
+# (table courante, table d'archive, vue de lecture)
+_TABLES = [
+    (Evaluation.__table__, EvaluationArchive.__table__, 'evaluation_historique'),
+    (EvaluationCompetence.__table__, EvaluationCompetenceArchive.__table__,
+     'evaluation_competence_historique'),
+    (Commentaire.__table__, CommentaireArchive.__table__, 'commentaire_historique'),
+]
+
+# Hors de db.metadata : create_all ne doit pas en faire des tables
+_vues = db.MetaData()
+VUES = {
+    courante.name: db.Table(nom, _vues, *[db.Column(c.name, c.type) for c in archive.columns])
+    for courante, archive, nom in _TABLES
+}
+
+
+def creer_vues(connexion):
+    """(Re)crée les vues courant + archive sur les colonnes des archives"""
+    for courante, archive, nom in _TABLES:
+        colonnes = ', '.join(c.name for c in archive.columns)
+        connexion.execute(db.text(f"DROP VIEW IF EXISTS {nom}"))
+        connexion.execute(db.text(
+            f"CREATE VIEW {nom} AS "
+            f"SELECT {colonnes} FROM {courante.name} UNION ALL "
+            f"SELECT {colonnes} FROM {archive.name}"))
+
+
+def annees_archivees(annees=None):
+    """Années (parmi annees si donné) dont une partie des données est archivée"""
+    requete = db.select(AnneeArchivee.annee_scolaire)
+    if annees is not None:
+        requete = requete.where(AnneeArchivee.annee_scolaire.in_(sorted(annees)))
+    return set(db.session.execute(requete).scalars())
+
+
+def sources(historique=False):
+    """Tables (évaluations, compétences, commentaires) à lire : courantes ou vues"""
+    if historique:
+        return VUES['evaluation'], VUES['evaluation_competence'], VUES['commentaire']
+    return _TABLES[0][0], _TABLES[1][0], _TABLES[2][0]
+
+
+def _colonnes(archive):
+    return [c.name for c in archive.columns]
+
+
+def _signaler(connexion, lot):
+    """Lignes retirées des tables courantes : journal de synchronisation et ETag"""
+    classes = {classe_id for _, classe_id in lot}
+    incrementer_versions(connexion, connexion.execute(
+        db.select(Classe.enseignant_id).where(Classe.id.in_(sorted(classes)))).scalars())
+
+
+def _deplacer_evaluations(connexion, annee, taille_lot):
+    table = Evaluation.__table__
+    lot = connexion.execute(
+        db.select(table.c.id, table.c.classe_id)
+        .where(table.c.annee_scolaire == annee)
+        .order_by(table.c.id).limit(taille_lot)).all()
+    if not lot:
+        return 0
+    # Intervalle d'identifiants plutôt qu'une liste : les lignes créées pendant
+    # l'archivage ont des identifiants plus grands et attendent le lot suivant
+    selection = (table.c.annee_scolaire == annee) & table.c.id.between(lot[0].id, lot[-1].id)
+    ids = db.select(table.c.id).where(selection)
+
+    archive = EvaluationArchive.__table__
+    connexion.execute(archive.insert().from_select(
+        _colonnes(archive), db.select(*[table.c[c] for c in _colonnes(archive)]).where(selection)))
+    competences = EvaluationCompetence.__table__
+    archive = EvaluationCompetenceArchive.__table__
+    connexion.execute(archive.insert().from_select(
+        _colonnes(archive), db.select(*[competences.c[c] for c in _colonnes(archive)])
+        .where(competences.c.evaluation_id.in_(ids))))
+    connexion.execute(competences.delete().where(competences.c.evaluation_id.in_(ids)))
+    connexion.execute(table.delete().where(selection))
+    recherche.indexer_archives(connexion, 'evaluation', annee, lot[0].id, lot[-1].id)
+
+    journaliser(connexion, 'evaluations', lot, supprime=True)
+    _signaler(connexion, lot)
+    return len(lot)
+
+
+def _deplacer_commentaires(connexion, annee, taille_lot):
+    table = Commentaire.__table__
+    lot = connexion.execute(
+        db.select(table.c.id, Eleve.classe_id).join(Eleve, table.c.eleve_id == Eleve.id)
+        .where(table.c.annee_scolaire == annee)
+        .order_by(table.c.id).limit(taille_lot)).all()
+    if not lot:
+        return 0
+    selection = (table.c.annee_scolaire == annee) & table.c.id.between(lot[0].id, lot[-1].id)
+
+    archive = CommentaireArchive.__table__
+    connexion.execute(archive.insert().from_select(
+        _colonnes(archive), db.select(*[table.c[c] for c in _colonnes(archive)]).where(selection)))
+    connexion.execute(table.delete().where(selection))
+    recherche.indexer_archives(connexion, 'commentaire', annee, lot[0].id, lot[-1].id)
+
+    journaliser(connexion, 'commentaires', lot, supprime=True)
+    _signaler(connexion, lot)
+    return len(lot)
+
+
+def archiver(annee, taille_lot=TAILLE_LOT, progression=None):
+    """Déplace les évaluations et commentaires de l'année vers les archives
+
+    Une transaction par lot : un archivage interrompu reprend là où il
+    s'était arrêté. L'année courante (et les suivantes) ne peut pas être
+    archivée. progression(type, nombre déplacé) est appelé après chaque lot.
+    """
+    if not re.fullmatch(r'\d{4}-\d{4}', annee or ''):
+        raise ValueError(f"Année scolaire invalide : {annee!r} (attendu 2023-2024)")
+    courante = cache_parametres.valeur('annee_scolaire_courante')
+    if courante and annee >= courante:
+        raise ValueError(f"L'année {annee} n'est pas close (année courante : {courante})")
+    # Session libérée : les transactions Core ne doivent pas attendre son verrou
+    db.session.commit()
+
+    with db.engine.begin() as connexion:
+        # Déclarée dès le début : les livrets lisent les vues pendant le déplacement
+        table = AnneeArchivee.__table__
+        if connexion.execute(db.select(table.c.annee_scolaire)
+                             .where(table.c.annee_scolaire == annee)).first() is None:
+            connexion.execute(table.insert().values(
+                annee_scolaire=annee, statut='en_cours', evaluations=0,
+                commentaires=0, date_debut=datetime.utcnow()))
+        else:
+            connexion.execute(table.update().where(table.c.annee_scolaire == annee)
+                              .values(statut='en_cours'))
+
+    deplacees = {'evaluations': 0, 'commentaires': 0}
+    for type_donnees, deplacer in (('evaluations', _deplacer_evaluations),
+                                   ('commentaires', _deplacer_commentaires)):
+        while True:
+            with db.engine.begin() as connexion:
+                nombre = deplacer(connexion, annee, taille_lot)
+            if not nombre:
+                break
+            deplacees[type_donnees] += nombre
+            if progression:
+                progression(type_donnees, deplacees[type_donnees])
+
+    with db.engine.begin() as connexion:
+        table = AnneeArchivee.__table__
+        connexion.execute(table.update().where(table.c.annee_scolaire == annee).values(
+            statut='terminee', date_fin=datetime.utcnow(),
+            evaluations=table.c.evaluations + deplacees['evaluations'],
+            commentaires=table.c.commentaires + deplacees['commentaires']))
+    return deplacees
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archivage d'une année scolaire close")
+    parser.add_argument('annee', nargs='?', help="année scolaire à archiver (2023-2024)")
+    parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT,
+                        help="lignes déplacées par transaction")
+    parser.add_argument('--statut', action='store_true',
+                        help="affiche les années archivées")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.statut or not args.annee:
+            annees = AnneeArchivee.query.order_by(AnneeArchivee.annee_scolaire).all()
+            for annee in annees:
+                print(f"🗄️  {annee.annee_scolaire} : {annee.statut}, "
+                      f"{annee.evaluations} évaluations, {annee.commentaires} commentaires")
+            if not annees:
+                print("🗄️  Aucune année archivée")
+        else:
+            try:
+                deplacees = archiver(
+                    args.annee, args.taille_lot,
+                    lambda type_donnees, nombre: print(f"   {type_donnees} : {nombre}"))
+            except ValueError as e:
+                parser.error(str(e))
+            print(f"✅ {args.annee} archivée : {deplacees['evaluations']} évaluations, "
+                  f"{deplacees['commentaires']} commentaires")
@@ -0,0 +1,114 @@
+"""
+Archivage des années closes : taille des tables courantes et latence des requêtes
+Sur une base générée par donnees_volume.py avec plusieurs années, mesure la
+taille (tables + index, via dbstat) des évaluations et commentaires courants
+et la durée médiane de requêtes de l'année en cours, avant puis après
+l'archivage des années closes, ainsi que le débit de l'archivage.
+
+    python benchmarks/archivage_annees.py [--classes 40] [--annees 4]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'archivage.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from commun import preparer_base  # noqa: E402
+from app import app, db  # noqa: E402
+from models import User, Classe, Evaluation  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+import api  # noqa: E402
+import archivage  # noqa: E402
+import cache_parametres  # noqa: E402
+import cache_utilisateurs  # noqa: E402
+import export_livrets  # noqa: E402
+
+TABLES = ('evaluation', 'evaluation_competence', 'commentaire')
+
+
+def mediane(fonction, repetitions=15):
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+        db.session.remove()
+    return statistics.median(durees) * 1000
+
+
+def taille_courante():
+    """Ko occupés par les tables courantes et leurs index"""
+    index = db.session.execute(db.text(
+        "SELECT name FROM sqlite_schema WHERE type = 'index' AND tbl_name IN "
+        "('evaluation', 'evaluation_competence', 'commentaire')")).scalars().all()
+    noms = ', '.join(f"'{nom}'" for nom in (*TABLES, *index))
+    return db.session.execute(db.text(
+        f"SELECT SUM(pgsize) FROM dbstat WHERE name IN ({noms})")).scalar() / 1024
+
+
+def requetes(utilisateur, classe_id, annee):
+    return {
+        'évaluations récentes': lambda: Evaluation.query.join(Classe).filter(
+            Classe.enseignant_id == utilisateur.id
+        ).options(joinedload(Evaluation.eleve), joinedload(Evaluation.matiere)).order_by(
+            Evaluation.date_evaluation.desc()).limit(5).all(),
+        'classe × période': lambda: Evaluation.query.filter_by(
+            classe_id=classe_id, periode='P2', annee_scolaire=annee).all(),
+        'api évaluations': lambda: api.page(
+            'evaluations', {'annee_scolaire': annee, 'limite': '100'}, utilisateur),
+        'chargement livrets': lambda: export_livrets.charger_lot([classe_id], 'P2'),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--classes', type=int, default=40)
+    parser.add_argument('--annees', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"📦 Base de mesure ({FICHIER_BASE})...")
+    comptes = preparer_base(classes=args.classes, annees=args.annees)
+    print(f"   {comptes['evaluations']} évaluations, {comptes['commentaires']} commentaires")
+
+    with app.app_context():
+        annee = cache_parametres.valeur('annee_scolaire_courante')
+        utilisateur = cache_utilisateurs.charger(
+            User.query.filter_by(username='ens.e1.c1').one().id)
+        classe_id = min(utilisateur.classe_ids)
+        closes = sorted(db.session.execute(
+            db.select(Evaluation.annee_scolaire).where(Evaluation.annee_scolaire < annee)
+            .distinct()).scalars())
+
+        mesures = {'avant': {}, 'après': {}}
+        tailles = {'avant': taille_courante()}
+        for nom, fonction in requetes(utilisateur, classe_id, annee).items():
+            mesures['avant'][nom] = mediane(fonction)
+
+        debut = time.perf_counter()
+        deplacees = 0
+        for annee_close in closes:
+            resultat = archivage.archiver(annee_close)
+            deplacees += resultat['evaluations'] + resultat['commentaires']
+        duree = time.perf_counter() - debut
+        db.session.execute(db.text("VACUUM"))
+        print(f"\n🗄️  {', '.join(closes)} archivées : {deplacees} lignes en {duree:.1f} s "
+              f"({deplacees / duree:.0f} lignes/s)")
+
+        tailles['après'] = taille_courante()
+        for nom, fonction in requetes(utilisateur, classe_id, annee).items():
+            mesures['après'][nom] = mediane(fonction)
+
+        print(f"\n📏 Tables courantes (+ index) : {tailles['avant']:.0f} Ko → "
+              f"{tailles['après']:.0f} Ko")
+        print(f"\n⏱️  Requêtes de l'année {annee} (ms)")
+        print(f"   {'requête':<22} {'avant':>9} {'après':>9}")
+        for nom in mesures['avant']:
+            print(f"   {nom:<22} {mesures['avant'][nom]:>9.2f} {mesures['après'][nom]:>9.2f}")
@@ -0,0 +1,234 @@
+"""
+Test de charge HTTP des routes authentifiées
+Démarre l'application (serveur WSGI multi-thread, fournisseur IA « bouchon »
+avec latence simulée) sur une base SQLite temporaire générée par
+donnees_volume.py, puis N utilisateurs virtuels connectés chacun comme un
+enseignant parcourent en parallèle tableau de bord, listes, fiches élèves,
+synthèses et génération de commentaires en flux. Affiche le débit et les
+latences p50/p95/p99 par route ; --enregistrer fixe la référence, comparée
+ensuite à chaque exécution (--strict : code de sortie 1 en cas de régression).
+
+    python benchmarks/charge.py [--utilisateurs 8] [--duree 20] [--latence-ia 0.5]
+        [--enregistrer] [--strict]
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from commun import (preparer_base, resume, enregistrer_reference,  # noqa: E402
+                    comparer_reference)
+
+# Parcours d'un enseignant : (route, poids)
+SCENARIO = [
+    ('dashboard', 4),
+    ('classes', 2),
+    ('eleves', 3),
+    ('detail_eleve', 4),
+    ('synthese_classe', 2),
+    ('commentaire_flux', 1),
+]
+
+
+def servir(port):
+    """Processus serveur : application réelle derrière un serveur multi-thread"""
+    import logging
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def port_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def attendre_serveur(port, delai=30):
+    limite = time.time() + delai
+    while time.time() < limite:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Le serveur n'a pas démarré sur le port {port}")
+
+
+class UtilisateurVirtuel:
+    """Enseignant connecté qui enchaîne les requêtes du scénario"""
+
+    def __init__(self, numero, url, compte, latences, erreurs):
+        self.url = url
+        self.compte = compte
+        self.latences = latences
+        self.erreurs = erreurs
+        self.aleatoire = random.Random(numero)
+        self.client = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def requete(self, route, chemin, donnees=None, json_=None):
+        entetes = {}
+        if json_ is not None:
+            donnees = json.dumps(json_).encode('utf-8')
+            entetes['Content-Type'] = 'application/json'
+        elif donnees is not None:
+            donnees = urllib.parse.urlencode(donnees).encode('utf-8')
+        debut = time.perf_counter()
+        try:
+            with self.client.open(urllib.request.Request(
+                    self.url + chemin, data=donnees, headers=entetes), timeout=60) as reponse:
+                corps = reponse.read()
+                # Session perdue : redirection vers la page de connexion
+                ok = '/login' not in reponse.geturl() or route == 'login'
+        except (urllib.error.URLError, OSError):
+            ok, corps = False, b''
+        if route == 'commentaire_flux' and b'event: fin' not in corps:
+            ok = False
+        duree = time.perf_counter() - debut
+        if ok:
+            self.latences.setdefault(route, []).append(duree)
+        else:
+            self.erreurs[route] = self.erreurs.get(route, 0) + 1
+
+    def parcourir(self, fin):
+        self.requete('login', '/login', donnees={
+            'username': self.compte['username'], 'password': 'enseignant123'})
+        routes = [route for route, _ in SCENARIO]
+        poids = [p for _, p in SCENARIO]
+        while time.time() < fin:
+            route = self.aleatoire.choices(routes, poids)[0]
+            classe_id = self.aleatoire.choice(self.compte['classe_ids'])
+            eleve_id = self.aleatoire.choice(self.compte['eleve_ids'])
+            if route == 'detail_eleve':
+                self.requete(route, f'/eleves/{eleve_id}')
+            elif route == 'synthese_classe':
+                self.requete(route, f'/classes/{classe_id}/synthese')
+            elif route == 'commentaire_flux':
+                self.requete(route, '/generateur/commentaire/flux', json_={
+                    'eleve_id': eleve_id, 'type_commentaire': 'bulletin',
+                    'periode': self.aleatoire.choice(['P1', 'P2', 'P3', 'P4']),
+                    'regenerer': True})
+            else:
+                self.requete(route, f'/{route}')
+
+
+def comptes_enseignants(nombre):
+    """Enseignants de la base de volume avec leurs classes et élèves"""
+    from app import app
+    from models import User, Classe, Eleve
+    import cache_parametres
+
+    with app.app_context():
+        cache_parametres.definir('ia_fournisseur', 'bouchon')
+        comptes = []
+        for user in User.query.filter(User.username.like('ens.e%')).order_by(User.id):
+            classe_ids = [c.id for c in Classe.query.filter_by(enseignant_id=user.id)]
+            eleve_ids = [e.id for e in Eleve.query.filter(Eleve.classe_id.in_(classe_ids))]
+            comptes.append({'username': user.username, 'classe_ids': classe_ids,
+                            'eleve_ids': eleve_ids})
+    return [comptes[i % len(comptes)] for i in range(nombre)]
+
+
+def charger(url, comptes, duree):
+    """Lance les utilisateurs virtuels et agrège leurs mesures"""
+    latences, erreurs = [{} for _ in comptes], [{} for _ in comptes]
+    fin = time.time() + duree
+    utilisateurs = [UtilisateurVirtuel(i, url, compte, latences[i], erreurs[i])
+                    for i, compte in enumerate(comptes)]
+    threads = [threading.Thread(target=u.parcourir, args=(fin,)) for u in utilisateurs]
+    debut = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ecoule = time.time() - debut
+
+    resultats = {}
+    toutes = []
+    for route, _ in [('login', 0)] + SCENARIO:
+        durees = [d for l in latences for d in l.get(route, [])]
+        nb_erreurs = sum(e.get(route, 0) for e in erreurs)
+        if not durees and not nb_erreurs:
+            continue
+        statistiques = resume(durees) if durees else {'n': 0}
+        statistiques['erreurs'] = nb_erreurs
+        statistiques['requetes_s'] = round(len(durees) / ecoule, 2)
+        resultats[route] = statistiques
+        if route != 'login':
+            toutes += durees
+    resultats['total'] = dict(resume(toutes), erreurs=sum(
+        r['erreurs'] for nom, r in resultats.items() if nom != 'login'),
+        requetes_s=round(len(toutes) / ecoule, 2))
+    return resultats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--utilisateurs', type=int, default=8)
+    parser.add_argument('--duree', type=float, default=20, help="secondes de charge")
+    parser.add_argument('--latence-ia', type=float, default=0.5,
+                        help="latence simulée du fournisseur bouchon (s)")
+    parser.add_argument('--enregistrer', action='store_true',
+                        help="enregistre les résultats comme nouvelle référence")
+    parser.add_argument('--strict', action='store_true',
+                        help="code de sortie 1 si une mesure régresse")
+    parser.add_argument('--servir', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        servir(args.servir)
+        sys.exit(0)
+
+    fichier_base = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'charge.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{fichier_base}'
+    os.environ['IA_BOUCHON_LATENCE'] = str(args.latence_ia)
+    print(f"📦 Base de mesure ({fichier_base})...")
+    preparer_base()
+    comptes = comptes_enseignants(args.utilisateurs)
+
+    port = port_libre()
+    journal = open(os.path.join(os.path.dirname(fichier_base), 'serveur.log'), 'w')
+    serveur = subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                '--servir', str(port)], env=os.environ,
+                               stdout=journal, stderr=subprocess.STDOUT)
+    try:
+        attendre_serveur(port)
+        print(f"🚀 {args.utilisateurs} utilisateurs pendant {args.duree:.0f} s "
+              f"(latence IA {args.latence_ia} s)")
+        resultats = charger(f'http://127.0.0.1:{port}', comptes, args.duree)
+    finally:
+        serveur.terminate()
+        serveur.wait()
+        journal.close()
+
+    print(f"\n   {'route':<20} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'erreurs':>8}")
+    for route, r in resultats.items():
+        print(f"   {route:<20} {r['requetes_s']:>8.1f} {r.get('p50', 0):>9.1f} "
+              f"{r.get('p95', 0):>9.1f} {r.get('p99', 0):>9.1f} {r['erreurs']:>8}")
+
+    if args.enregistrer:
+        print(f"\n💾 Référence enregistrée : {enregistrer_reference('charge', resultats)}")
+    else:
+        regressions = comparer_reference('charge', resultats, {
+            'p50': False, 'p95': False, 'requetes_s': True})
+        if regressions and args.strict:
+            sys.exit(1)
@@ -0,0 +1,109 @@
+"""
+Outils partagés par micro.py et charge.py
+Base de mesure générée par donnees_volume.py, percentiles, et résultats de
+référence enregistrés dans benchmarks/references/ pour comparer deux commits.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOSSIER_REFERENCES = os.path.join(RACINE, 'benchmarks', 'references')
+SEUIL_REGRESSION = 0.20  # écart relatif toléré avant de signaler une régression
+
+# Taille de la base de mesure : 1 école de 8 classes de 25 élèves, 2 années
+TAILLE_BASE = {'ecoles': 1, 'classes': 8, 'eleves': 25, 'matieres': 8,
+               'periodes': 4, 'annees': 2}
+
+
+def preparer_base(**taille):
+    """Base de démonstration complétée par le jeu de données de volume
+
+    DATABASE_URL doit désigner une base vide avant l'import de app.
+    """
+    import init_db
+    import donnees_volume
+    from app import app
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.init_database()
+    with app.app_context():
+        return donnees_volume.generer(**dict(TAILLE_BASE, **taille))
+
+
+def percentile(valeurs, rang):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(len(valeurs) * rang / 100))]
+
+
+def resume(durees, echelle=1000):
+    """Statistiques d'une série de durées en secondes (ms par défaut, µs avec
+    echelle=1e6)"""
+    return {
+        'n': len(durees),
+        'p50': round(percentile(durees, 50) * echelle, 3),
+        'p95': round(percentile(durees, 95) * echelle, 3),
+        'p99': round(percentile(durees, 99) * echelle, 3),
+        'max': round(max(durees) * echelle, 3),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RACINE,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def enregistrer_reference(nom, resultats):
+    """Écrit les résultats comme nouvelle référence (references/<nom>.json)"""
+    os.makedirs(DOSSIER_REFERENCES, exist_ok=True)
+    chemin = os.path.join(DOSSIER_REFERENCES, f'{nom}.json')
+    with open(chemin, 'w', encoding='utf-8') as fichier:
+        json.dump({
+            'commit': _commit(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'machine': f'{platform.machine()} {platform.python_version()} '
+                       f'{os.cpu_count()} cœur(s)',
+            'resultats': resultats,
+        }, fichier, ensure_ascii=False, indent=2, sort_keys=True)
+        fichier.write('\n')
+    return chemin
+
+
+def comparer_reference(nom, resultats, metriques, seuil=SEUIL_REGRESSION):
+    """Affiche l'écart à la référence et renvoie les mesures en régression
+
+    metriques : {nom de la métrique: True si plus grand est meilleur}
+    """
+    chemin = os.path.join(DOSSIER_REFERENCES, f'{nom}.json')
+    if not os.path.exists(chemin):
+        print(f"ℹ️  Pas de référence {chemin} (--enregistrer pour la créer)")
+        return []
+    with open(chemin, encoding='utf-8') as fichier:
+        reference = json.load(fichier)
+    print(f"\n📏 Comparaison à la référence {reference.get('commit') or '?'} "
+          f"du {reference['date']} ({reference['machine']})")
+
+    regressions = []
+    for mesure, valeurs in resultats.items():
+        avant = reference['resultats'].get(mesure)
+        if not avant:
+            continue
+        for metrique, plus_grand_meilleur in metriques.items():
+            if not avant.get(metrique) or metrique not in valeurs:
+                continue
+            ecart = valeurs[metrique] / avant[metrique] - 1
+            degradation = -ecart if plus_grand_meilleur else ecart
+            marque = '❌' if degradation > seuil else '  '
+            print(f"{marque} {mesure:<28} {metrique:<10} {avant[metrique]:>10.3f} → "
+                  f"{valeurs[metrique]:>10.3f} ({ecart:+.0%})")
+            if degradation > seuil:
+                regressions.append((mesure, metrique))
+    return regressions
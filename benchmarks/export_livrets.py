@@ -0,0 +1,132 @@
+"""
+Export des livrets PDF d'une école de 300 élèves : rendu séquentiel et pool
+Construit une base SQLite temporaire (12 classes, 8 matières, compétences et
+commentaires de période), puis mesure le chargement du lot, le délai avant le
+premier morceau de l'archive et la durée totale de l'export ZIP.
+
+    python benchmarks/export_livrets.py [--eleves 300] [--workers 1 2 4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+from io import BytesIO
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'export.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from datetime import date  # noqa: E402
+from app import app, db  # noqa: E402
+from models import (User, Classe, Eleve, Matiere, Evaluation,  # noqa: E402
+                    EvaluationCompetence, Commentaire)
+from budget_requetes import compter_requetes  # noqa: E402
+from export_livrets import charger_lot, generer_zip  # noqa: E402
+
+NIVEAUX = ['Insuffisant', 'Fragile', 'Satisfaisant', 'Très bien']
+CLASSES = ['CP', 'CE1', 'CE2', 'CM1', 'CM2']
+PHRASE = ("Élève investi qui progresse régulièrement ; les acquis sont solides "
+          "et la participation à l'oral s'améliore au fil de la période. ")
+
+
+def peupler(nb_eleves, eleves_par_classe=25):
+    """École de nb_eleves élèves, période P1 entièrement évaluée"""
+    aleatoire = random.Random(42)
+    nb_classes = max(1, -(-nb_eleves // eleves_par_classe))
+    with db.engine.begin() as connexion:
+        connexion.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'ens{i}', 'email': f'ens{i}@ecole-cap.fr',
+             'nom': f'Nom{i}', 'prenom': 'Prénom', 'role': 'enseignant',
+             'actif': True}
+            for i in range(1, nb_classes + 1)
+        ])
+        connexion.execute(Matiere.__table__.insert(), [
+            {'id': i, 'nom': f'Matière {i}', 'code': f'M{i}', 'actif': True}
+            for i in range(1, 9)
+        ])
+        connexion.execute(Classe.__table__.insert(), [
+            {'id': i, 'nom': CLASSES[i % 5], 'annee_scolaire': '2024-2025',
+             'enseignant_id': i}
+            for i in range(1, nb_classes + 1)
+        ])
+        connexion.execute(Eleve.__table__.insert(), [
+            {'id': i, 'nom': f'Nom{i}', 'prenom': f'Prénom{i}',
+             'date_naissance': date(2016, 1, 1),
+             'classe_id': 1 + (i - 1) // eleves_par_classe}
+            for i in range(1, nb_eleves + 1)
+        ])
+        connexion.execute(Evaluation.__table__.insert(), [
+            {'id': (eleve_id - 1) * 8 + matiere_id, 'eleve_id': eleve_id,
+             'matiere_id': matiere_id,
+             'classe_id': 1 + (eleve_id - 1) // eleves_par_classe,
+             'periode': 'P1', 'annee_scolaire': '2024-2025',
+             'niveau': aleatoire.choice(NIVEAUX), 'commentaire': PHRASE}
+            for eleve_id in range(1, nb_eleves + 1) for matiere_id in range(1, 9)
+        ])
+        connexion.execute(EvaluationCompetence.__table__.insert(), [
+            {'evaluation_id': evaluation_id, 'code': f'C{c}',
+             'niveau': aleatoire.choice(NIVEAUX)}
+            for evaluation_id in range(1, nb_eleves * 8 + 1) for c in range(1, 5)
+        ])
+        connexion.execute(Commentaire.__table__.insert(), [
+            {'eleve_id': eleve_id, 'auteur_id': 1, 'type_commentaire': type_commentaire,
+             'periode': 'P1', 'annee_scolaire': '2024-2025', 'contenu': PHRASE * 3}
+            for eleve_id in range(1, nb_eleves + 1)
+            for type_commentaire in ('bulletin', 'livret')
+        ])
+    return nb_classes
+
+
+def mesurer(classe_ids, workers):
+    """Durées de l'export (s) : chargement, premier morceau, total"""
+    debut = time.perf_counter()
+    with compter_requetes() as compteur:
+        commun, livrets = charger_lot(classe_ids, 'P1')
+    chargement = time.perf_counter() - debut
+    archive = BytesIO()
+    premier = None
+    for morceau in generer_zip(commun, livrets, workers):
+        if premier is None and morceau:
+            premier = time.perf_counter() - debut
+        archive.write(morceau)
+    total = time.perf_counter() - debut
+    with zipfile.ZipFile(archive) as zip_livrets:
+        nb_fichiers = len(zip_livrets.namelist())
+        assert zip_livrets.testzip() is None
+    return {'requetes': compteur.total, 'chargement': chargement,
+            'premier': premier, 'total': total, 'fichiers': nb_fichiers,
+            'taille': archive.tell()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--eleves', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        nb_classes = peupler(args.eleves)
+        print(f"📝 {args.eleves} élèves dans {nb_classes} classes ({FICHIER_BASE})")
+
+        reference = None
+        for workers in args.workers:
+            resultat = mesurer(list(range(1, nb_classes + 1)), workers)
+            if resultat['fichiers'] != args.eleves:
+                print(f"❌ {resultat['fichiers']} livrets au lieu de {args.eleves}")
+                sys.exit(1)
+            reference = reference or resultat['total']
+            print(f"- {workers} processus : {resultat['total']:.2f} s "
+                  f"(x{reference / resultat['total']:.1f}), "
+                  f"chargement {resultat['chargement'] * 1000:.0f} ms en "
+                  f"{resultat['requetes']} requêtes, premier morceau à "
+                  f"{resultat['premier']:.2f} s, "
+                  f"{resultat['taille'] / 1024 / 1024:.1f} Mo")
+        print("\n✅ Export complet et archive valide")
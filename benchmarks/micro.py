@@ -0,0 +1,131 @@
+"""
+Micro-benchmarks des chemins chauds de l'application
+Sur une base SQLite temporaire générée par donnees_volume.py : construction
+du prompt IA, accès aux paramètres (cache et requête directe) et requêtes ORM
+des vues dashboard, eleves et detail_eleve. Chaque mesure est répétée et
+résumée en percentiles ; --enregistrer fixe la référence, comparée ensuite
+à chaque exécution (--strict : code de sortie 1 en cas de régression).
+
+    python benchmarks/micro.py [--iterations 500] [--enregistrer] [--strict]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'micro.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from commun import (preparer_base, resume, enregistrer_reference,  # noqa: E402
+                    comparer_reference)
+from sqlalchemy.orm import joinedload, contains_eager, undefer  # noqa: E402
+from app import app, db  # noqa: E402
+from models import User, Classe, Eleve, Evaluation, Commentaire, Parametre  # noqa: E402
+from generation_ia import construire_prompt_ia  # noqa: E402
+from modeles_commentaires import evaluations_eleve  # noqa: E402
+import cache_parametres  # noqa: E402
+
+
+def mesures(enseignant_id, eleve_id):
+    """Fonctions mesurées, chacune l'équivalent d'un appel du chemin réel"""
+
+    def prompt():
+        eleve = db.session.get(Eleve, eleve_id, options=[joinedload(Eleve.classe)])
+        evaluations = evaluations_eleve(eleve, 'P1')
+        # Seule la construction est chronométrée
+        debut = time.perf_counter()
+        construire_prompt_ia(eleve, evaluations, 'bulletin',
+                             'Élève attentif, doit gagner en autonomie.', 'P1')
+        return time.perf_counter() - debut
+
+    def parametre_cache():
+        cache_parametres.valeur('max_eleves_par_classe')
+
+    def parametre_requete():
+        Parametre.query.filter_by(cle='max_eleves_par_classe').first().get_valeur()
+
+    def dashboard():
+        classes = Classe.query.options(undefer(Classe.nb_eleves)).filter_by(
+            enseignant_id=enseignant_id).all()
+        sum(classe.nb_eleves for classe in classes)
+        Evaluation.query.join(Classe).filter(
+            Classe.enseignant_id == enseignant_id
+        ).options(
+            joinedload(Evaluation.eleve), joinedload(Evaluation.matiere)
+        ).order_by(Evaluation.date_evaluation.desc()).limit(5).all()
+
+    def eleves():
+        Eleve.query.join(Classe).filter(
+            Classe.enseignant_id == enseignant_id
+        ).options(contains_eager(Eleve.classe)).order_by(
+            Eleve.nom, Eleve.prenom
+        ).all()
+
+    def detail_eleve():
+        Eleve.query.options(joinedload(Eleve.classe)).filter_by(id=eleve_id).first()
+        Evaluation.query.options(joinedload(Evaluation.matiere)).filter_by(
+            eleve_id=eleve_id).all()
+        Commentaire.query.filter_by(eleve_id=eleve_id).all()
+
+    return {
+        'prompt.construire': prompt,
+        'parametres.valeur_cache': parametre_cache,
+        'parametres.requete_directe': parametre_requete,
+        'requetes.dashboard': dashboard,
+        'requetes.eleves': eleves,
+        'requetes.detail_eleve': detail_eleve,
+    }
+
+
+def chronometrer(fonction, iterations, echauffement=20):
+    """Durées (s) de chaque appel ; session vidée entre deux appels comme
+    entre deux requêtes HTTP"""
+    durees = []
+    for i in range(echauffement + iterations):
+        debut = time.perf_counter()
+        duree = fonction()
+        duree = duree if duree is not None else time.perf_counter() - debut
+        db.session.remove()
+        if i >= echauffement:
+            durees.append(duree)
+    return durees
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--enregistrer', action='store_true',
+                        help="enregistre les résultats comme nouvelle référence")
+    parser.add_argument('--strict', action='store_true',
+                        help="code de sortie 1 si une mesure régresse")
+    args = parser.parse_args()
+
+    print(f"📦 Base de mesure ({FICHIER_BASE})...")
+    preparer_base()
+    resultats = {}
+    with app.app_context():
+        enseignant = User.query.filter_by(username='ens.e1.c1').one()
+        eleve = Eleve.query.join(Classe).filter(
+            Classe.enseignant_id == enseignant.id).order_by(Eleve.id).first()
+        db.session.remove()
+
+        print(f"\n⏱️  {args.iterations} itérations par mesure (µs)")
+        print(f"   {'mesure':<28} {'p50':>9} {'p95':>9} {'p99':>9} {'appels/s':>10}")
+        for nom, fonction in mesures(enseignant.id, eleve.id).items():
+            statistiques = resume(chronometrer(fonction, args.iterations), echelle=1e6)
+            statistiques['appels_s'] = round(1e6 / statistiques['p50'], 1)
+            resultats[nom] = statistiques
+            print(f"   {nom:<28} {statistiques['p50']:>9.1f} {statistiques['p95']:>9.1f} "
+                  f"{statistiques['p99']:>9.1f} {statistiques['appels_s']:>10.0f}")
+
+    if args.enregistrer:
+        print(f"\n💾 Référence enregistrée : {enregistrer_reference('micro', resultats)}")
+    else:
+        regressions = comparer_reference('micro', resultats, {'p50': False, 'p95': False})
+        if regressions and args.strict:
+            sys.exit(1)
@@ -0,0 +1,70 @@
+"""
+Commentaires composés par modèles : durée par classe et par élève
+Sur une base générée par donnees_volume.py, mesure la composition des
+commentaires de chaque classe (deux requêtes puis une passe en mémoire) et,
+à titre de comparaison, la construction des seuls prompts IA d'un lot
+(generation_ia.prompts_lot, sans appel au modèle).
+
+    python benchmarks/modeles_commentaires.py [--classes 40] [--periode P2]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'modeles.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from commun import preparer_base  # noqa: E402
+from app import app, db  # noqa: E402
+from models import Classe  # noqa: E402
+from generation_ia import prompts_lot  # noqa: E402
+import cache_parametres  # noqa: E402
+import modeles_commentaires  # noqa: E402
+
+
+def mesurer(classes, fonction):
+    """(ms médiane par classe, µs par élève)"""
+    durees, eleves = [], 0
+    for classe in classes:
+        debut = time.perf_counter()
+        eleves += len(fonction(classe))
+        durees.append(time.perf_counter() - debut)
+        db.session.expire_all()
+    return statistics.median(durees) * 1000, sum(durees) / max(eleves, 1) * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--classes', type=int, default=40)
+    parser.add_argument('--periode', default='P2')
+    args = parser.parse_args()
+
+    print(f"📦 Base de mesure ({FICHIER_BASE})...")
+    comptes = preparer_base(classes=args.classes, annees=1)
+    print(f"   {comptes['eleves']} élèves, {comptes['evaluations']} évaluations")
+
+    with app.app_context():
+        annee = cache_parametres.valeur('annee_scolaire_courante')
+        classes = Classe.query.filter_by(annee_scolaire=annee).order_by(Classe.id).all()
+        mesures = {
+            'modèles': mesurer(classes, lambda classe: modeles_commentaires.composer_classe(
+                classe, 'bulletin', args.periode)),
+            'prompts IA (sans appel)': mesurer(
+                classes, lambda classe: prompts_lot(classe, 'bulletin', args.periode)),
+        }
+        variantes = {resultat['commentaire'] for classe in classes
+                     for resultat in modeles_commentaires.composer_classe(
+                         classe, 'bulletin', args.periode)}
+
+        print(f"\n⏱️  {len(classes)} classes, période {args.periode}")
+        print(f"   {'génération':<26} {'ms/classe':>10} {'µs/élève':>10}")
+        for nom, (par_classe, par_eleve) in mesures.items():
+            print(f"   {nom:<26} {par_classe:>10.2f} {par_eleve:>10.1f}")
+        print(f"\n📝 {len(variantes)} commentaires distincts")
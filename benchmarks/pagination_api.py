@@ -0,0 +1,86 @@
+"""
+Pagination de l'API JSON : curseur (keyset) contre OFFSET selon la profondeur
+Sur une base générée par donnees_volume.py, mesure la durée médiane d'une
+page de /api/evaluations prise au début, au milieu et à la fin de la liste,
+pour l'administrateur (toute l'école) et pour un enseignant.
+
+    python benchmarks/pagination_api.py [--classes 40] [--annees 3] [--limite 100]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'pagination.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from commun import preparer_base  # noqa: E402
+from app import app, db  # noqa: E402
+from models import User, Evaluation  # noqa: E402
+import api  # noqa: E402
+import cache_utilisateurs  # noqa: E402
+
+
+def mediane(fonction, repetitions=15):
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+        db.session.remove()
+    return statistics.median(durees) * 1000
+
+
+def page_offset(utilisateur, decalage, limite):
+    """Équivalent OFFSET de api.page, pour comparaison"""
+    requete = db.select(Evaluation.id, Evaluation.eleve_id, Evaluation.matiere_id,
+                        Evaluation.classe_id, Evaluation.periode,
+                        Evaluation.annee_scolaire, Evaluation.niveau)
+    if utilisateur.role != 'admin':
+        requete = requete.where(Evaluation.classe_id.in_(sorted(utilisateur.classe_ids)))
+    return db.session.execute(
+        requete.order_by(Evaluation.id).offset(decalage).limit(limite)).all()
+
+
+def curseur_a(utilisateur, decalage, limite):
+    """Curseur désignant la ligne de rang decalage (calculé hors mesure)"""
+    requete = db.select(Evaluation.id)
+    if utilisateur.role != 'admin':
+        requete = requete.where(Evaluation.classe_id.in_(sorted(utilisateur.classe_ids)))
+    dernier = db.session.execute(
+        requete.order_by(Evaluation.id).offset(decalage - 1).limit(1)).scalar()
+    return api.encoder_curseur(dernier, 'asc') if decalage else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--classes', type=int, default=40)
+    parser.add_argument('--annees', type=int, default=3)
+    parser.add_argument('--limite', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"📦 Base de mesure ({FICHIER_BASE})...")
+    comptes = preparer_base(classes=args.classes, annees=args.annees)
+    print(f"   {comptes['evaluations']} évaluations")
+
+    with app.app_context():
+        for username in ('admin', 'ens.e1.c1'):
+            utilisateur = cache_utilisateurs.charger(
+                User.query.filter_by(username=username).one().id)
+            total = len(page_offset(utilisateur, 0, 10 ** 9))
+            print(f"\n⏱️  {username} : {total} évaluations, pages de {args.limite} (ms)")
+            print(f"   {'profondeur':>10} {'curseur':>9} {'offset':>9}")
+            for decalage in (0, total // 2, total - args.limite):
+                curseur = curseur_a(utilisateur, decalage, args.limite)
+                parametres = {'limite': str(args.limite)}
+                if curseur:
+                    parametres['curseur'] = curseur
+                keyset = mediane(lambda: api.page('evaluations', parametres, utilisateur))
+                offset = mediane(lambda: page_offset(utilisateur, decalage, args.limite))
+                print(f"   {decalage:>10} {keyset:>9.2f} {offset:>9.2f}")
@@ -0,0 +1,183 @@
+"""
+Plans d'exécution des requêtes critiques avant/après les index (migration 2)
+Construit une base SQLite temporaire de plus de 100 000 évaluations, affiche
+EXPLAIN QUERY PLAN et la durée médiane de chaque requête sans puis avec les
+index, et échoue si une requête parcourt encore toute sa table.
+
+    python benchmarks/plans_requetes.py [--eleves 1000] [--annees 4]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'plans.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from datetime import datetime, timedelta, date  # noqa: E402
+from app import app, db  # noqa: E402
+from models import User, Classe, Eleve, Matiere, Evaluation, Commentaire  # noqa: E402
+from migrations import appliquer_migrations  # noqa: E402
+
+NIVEAUX = ['Insuffisant', 'Fragile', 'Satisfaisant', 'Très bien']
+PERIODES = ['P1', 'P2', 'P3', 'P4']
+INDEX_MIGRATION_2 = [
+    'ix_classe_enseignant_nom', 'ix_eleve_classe', 'ix_evaluation_eleve_periode',
+    'ix_evaluation_classe_date', 'uq_evaluation_eleve_matiere_periode_annee',
+    'ix_commentaire_eleve_periode',
+]
+
+
+def peupler(nb_eleves, nb_annees, eleves_par_classe=25):
+    """Insère le jeu de données en une transaction (inserts groupés)"""
+    aleatoire = random.Random(42)
+    nb_classes = max(1, nb_eleves // eleves_par_classe)
+    nb_enseignants = max(1, nb_classes // 2)
+    with db.engine.begin() as connexion:
+        connexion.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'ens{i}', 'email': f'ens{i}@ecole-cap.fr',
+             'nom': f'Nom{i}', 'prenom': 'Prénom', 'role': 'enseignant',
+             'actif': True}
+            for i in range(1, nb_enseignants + 1)
+        ])
+        connexion.execute(Matiere.__table__.insert(), [
+            {'id': i, 'nom': f'Matière {i}', 'code': f'M{i}', 'actif': True}
+            for i in range(1, 9)
+        ])
+        connexion.execute(Classe.__table__.insert(), [
+            {'id': i, 'nom': ['CP', 'CE1', 'CE2', 'CM1', 'CM2'][i % 5],
+             'annee_scolaire': '2024-2025',
+             'enseignant_id': 1 + i % nb_enseignants}
+            for i in range(1, nb_classes + 1)
+        ])
+        connexion.execute(Eleve.__table__.insert(), [
+            {'id': i, 'nom': f'Nom{i}', 'prenom': f'Prénom{i}',
+             'date_naissance': date(2016, 1, 1),
+             'classe_id': 1 + (i - 1) // eleves_par_classe}
+            for i in range(1, nb_classes * eleves_par_classe + 1)
+        ])
+        debut = datetime(2021, 9, 1)
+        lignes = []
+        for annee in range(nb_annees):
+            annee_scolaire = f'{2021 + annee}-{2022 + annee}'
+            for eleve_id in range(1, nb_classes * eleves_par_classe + 1):
+                classe_id = 1 + (eleve_id - 1) // eleves_par_classe
+                for p, periode in enumerate(PERIODES):
+                    for matiere_id in range(1, 9):
+                        lignes.append({
+                            'eleve_id': eleve_id, 'matiere_id': matiere_id,
+                            'classe_id': classe_id, 'periode': periode,
+                            'annee_scolaire': annee_scolaire,
+                            'niveau': aleatoire.choice(NIVEAUX),
+                            'date_evaluation': debut + timedelta(
+                                days=365 * annee + 60 * p,
+                                minutes=aleatoire.randrange(100000))
+                        })
+        connexion.execute(Evaluation.__table__.insert(), lignes)
+        connexion.execute(Commentaire.__table__.insert(), [
+            {'eleve_id': 1 + i % (nb_classes * eleves_par_classe),
+             'auteur_id': 1, 'type_commentaire': 'bulletin',
+             'periode': PERIODES[i % 4], 'annee_scolaire': '2024-2025',
+             'contenu': 'Commentaire de test'}
+            for i in range(nb_classes * eleves_par_classe * 4)
+        ])
+    return len(lignes)
+
+
+def requetes_critiques():
+    """Requêtes ORM des vues et de la génération (paramètres représentatifs)"""
+    return {
+        'évaluations élève/période': Evaluation.query.filter_by(
+            eleve_id=137, periode='P2'),
+        'évaluations classe/période': Evaluation.query.filter_by(
+            classe_id=7, periode='P1'),
+        'évaluations récentes (dashboard)': Evaluation.query.join(Classe).filter(
+            Classe.enseignant_id == 3
+        ).order_by(Evaluation.date_evaluation.desc()).limit(5),
+        'commentaires élève': Commentaire.query.filter_by(eleve_id=137),
+        'classes enseignant': Classe.query.filter_by(
+            enseignant_id=3).order_by(Classe.nom),
+        'effectif classe': Eleve.query.filter_by(classe_id=7),
+    }
+
+
+def mesurer(repetitions):
+    """Plan et durée médiane (ms) de chaque requête critique"""
+    resultats = {}
+    for nom, requete in requetes_critiques().items():
+        sql = str(requete.statement.compile(
+            db.engine, compile_kwargs={'literal_binds': True}))
+        with db.engine.connect() as connexion:
+            plan = [ligne[-1] for ligne in connexion.execute(
+                db.text('EXPLAIN QUERY PLAN ' + sql))]
+            durees = []
+            for _ in range(repetitions):
+                debut = time.perf_counter()
+                connexion.execute(db.text(sql)).fetchall()
+                durees.append((time.perf_counter() - debut) * 1000)
+        resultats[nom] = (plan, statistics.median(durees))
+    return resultats
+
+
+def afficher(titre, resultats):
+    print(f"\n=== {titre} ===")
+    for nom, (plan, duree) in resultats.items():
+        print(f"- {nom} : {duree:.3f} ms")
+        for etape in plan:
+            print(f"    {etape}")
+
+
+def balayages_complets(resultats):
+    """Requêtes dont le plan contient un parcours de table sans index"""
+    return [nom for nom, (plan, _) in resultats.items()
+            if any(etape.startswith('SCAN') and 'INDEX' not in etape
+                   for etape in plan)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--eleves', type=int, default=1000)
+    parser.add_argument('--annees', type=int, default=4)
+    parser.add_argument('--repetitions', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        # Retour à l'état d'une base de production antérieure à la migration 2
+        with db.engine.begin() as connexion:
+            for index in INDEX_MIGRATION_2:
+                connexion.execute(db.text(f'DROP INDEX IF EXISTS {index}'))
+        appliquer_migrations(cible=1)
+
+        debut = time.perf_counter()
+        nb = peupler(args.eleves, args.annees)
+        print(f"📝 {nb} évaluations insérées en {time.perf_counter() - debut:.1f} s "
+              f"({FICHIER_BASE})")
+
+        avant = mesurer(args.repetitions)
+        afficher('Avant migration (sans index)', avant)
+
+        appliquer_migrations()
+        with db.engine.begin() as connexion:
+            connexion.execute(db.text('ANALYZE'))
+        apres = mesurer(args.repetitions)
+        afficher('Après migration', apres)
+
+        print("\n=== Synthèse ===")
+        for nom in avant:
+            gain = avant[nom][1] / apres[nom][1] if apres[nom][1] else float('inf')
+            print(f"- {nom} : {avant[nom][1]:.3f} ms -> {apres[nom][1]:.3f} ms "
+                  f"(x{gain:.1f})")
+
+        restants = balayages_complets(apres)
+        if restants:
+            print(f"\n❌ Parcours complets restants : {', '.join(restants)}")
+            sys.exit(1)
+        print("\n✅ Toutes les requêtes critiques utilisent un index")
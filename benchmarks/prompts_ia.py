@@ -0,0 +1,100 @@
+"""
+Prompts IA : jetons par élève selon le budget
+Sur une base générée par donnees_volume.py, dont une partie des remarques
+d'évaluation est allongée comme le sont celles saisies par les enseignants,
+mesure pour chaque budget les jetons du prompt complet (message système
+compris) par élève (moyenne, p95, maximum), la part des remarques conservées
+et la durée de construction.
+
+    python benchmarks/prompts_ia.py [--classes 20] [--periode P2]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'prompts.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from commun import preparer_base  # noqa: E402
+from app import app, db  # noqa: E402
+from models import Eleve, Evaluation  # noqa: E402
+from generation_ia import construire_prompt_ia, _messages  # noqa: E402
+from jetons import compter_jetons_messages  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+BUDGETS = (10000, 300, 200, 150)
+
+DEVELOPPEMENTS = [
+    "Les consignes sont comprises mais leur application reste hésitante lorsque "
+    "l'exercice comporte plusieurs étapes.",
+    "Un accompagnement individuel a été mis en place en fin de période et "
+    "commence à porter ses fruits.",
+    "Les productions sont soignées, la présentation et l'écriture progressent "
+    "nettement depuis la rentrée.",
+    "La participation orale est fréquente et pertinente, avec un vocabulaire "
+    "précis et des questions qui font avancer le groupe.",
+]
+
+
+def allonger_remarques(periode, part=0.5, graine=3):
+    """Une remarque sur deux devient un paragraphe de deux à quatre phrases"""
+    aleatoire = random.Random(graine)
+    for evaluation in Evaluation.query.filter(Evaluation.periode == periode,
+                                              Evaluation.commentaire.isnot(None)):
+        if aleatoire.random() < part:
+            evaluation.commentaire = ' '.join(
+                [evaluation.commentaire + '.'] +
+                aleatoire.sample(DEVELOPPEMENTS, aleatoire.randint(1, 3)))
+    db.session.commit()
+
+
+def centile(valeurs, p):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(p / 100 * len(valeurs)))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--periode', default='P2')
+    args = parser.parse_args()
+
+    print(f"📦 Base de mesure ({FICHIER_BASE})...")
+    comptes = preparer_base(classes=args.classes, annees=1)
+    print(f"   {comptes['eleves']} élèves, {comptes['evaluations']} évaluations")
+
+    with app.app_context():
+        allonger_remarques(args.periode)
+        eleves = Eleve.query.options(joinedload(Eleve.classe)).all()
+        evaluations = {}
+        for evaluation in Evaluation.query.options(joinedload(Evaluation.matiere)).filter_by(
+                periode=args.periode).order_by(Evaluation.matiere_id):
+            evaluations.setdefault(evaluation.eleve_id, []).append(evaluation)
+        remarques = sum(1 for liste in evaluations.values() for e in liste if e.commentaire)
+
+        print(f"\n⏱️  {len(eleves)} prompts, période {args.periode}")
+        print(f"   {'budget':<8} {'moyenne':>8} {'p95':>6} {'max':>6} "
+              f"{'remarques':>10} {'µs/prompt':>10}")
+        for budget in BUDGETS:
+            jetons, conservees = [], 0
+            debut = time.perf_counter()
+            prompts = [construire_prompt_ia(eleve, evaluations.get(eleve.id, []), 'bulletin',
+                                            eleve.observations or '', args.periode,
+                                            budget=budget)
+                       for eleve in eleves]
+            duree = time.perf_counter() - debut
+            for prompt in prompts:
+                jetons.append(compter_jetons_messages(_messages(prompt)))
+                conservees += prompt.count(' (')
+            libelle = 'aucun' if budget == BUDGETS[0] else str(budget)
+            print(f"   {libelle:<8} {statistics.mean(jetons):>8.1f} {centile(jetons, 95):>6} "
+                  f"{max(jetons):>6} {100 * conservees / max(remarques, 1):>9.0f}% "
+                  f"{duree / len(eleves) * 1e6:>10.1f}")
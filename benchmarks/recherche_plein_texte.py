@@ -0,0 +1,67 @@
+"""
+Recherche plein texte (FTS5) sur une base de volume
+Génère une base par donnees_volume.py puis mesure la durée médiane de
+recherches courantes (mot très fréquent, plusieurs mots, préfixe, nom
+d'élève, mot absent) pour l'administrateur et pour un enseignant, comparée
+à un LIKE sur les commentaires d'évaluation (20 premières lignes, sans
+classement : rapide pour un mot fréquent, parcours complet sinon).
+
+    python benchmarks/recherche_plein_texte.py [--ecoles 10] [--annees 3]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'recherche.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from commun import preparer_base  # noqa: E402
+from app import app, db  # noqa: E402
+from models import User, Evaluation  # noqa: E402
+import cache_utilisateurs  # noqa: E402
+import recherche  # noqa: E402
+
+RECHERCHES = ['progression', 'bonne progression', 'acquis sol', 'Emma Dub', 'introuvable']
+
+
+def mediane(fonction, repetitions=10):
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+        db.session.remove()
+    return statistics.median(durees) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ecoles', type=int, default=10)
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--annees', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"📦 Base de mesure ({FICHIER_BASE})...")
+    preparer_base(ecoles=args.ecoles, classes=args.classes, annees=args.annees)
+
+    with app.app_context():
+        lignes = db.session.execute(db.text("SELECT COUNT(*) FROM recherche")).scalar()
+        print(f"   {lignes} lignes indexées")
+        for username in ('admin', 'ens.e1.c1'):
+            utilisateur = cache_utilisateurs.charger(
+                User.query.filter_by(username=username).one().id)
+            print(f"\n⏱️  {username} (ms)")
+            print(f"   {'recherche':<20} {'fts5':>8} {'like':>9} {'résultats':>10}")
+            for texte in RECHERCHES:
+                resultats = recherche.rechercher(texte, utilisateur)
+                fts = mediane(lambda: recherche.rechercher(texte, utilisateur))
+                like = mediane(lambda: Evaluation.query.filter(
+                    Evaluation.commentaire.like(f'%{texte}%')).limit(20).all(), 3)
+                print(f"   {texte:<20} {fts:>8.2f} {like:>9.2f} {len(resultats):>10}")
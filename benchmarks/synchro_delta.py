@@ -0,0 +1,83 @@
+"""
+Synchronisation différentielle : volume et durée selon le nombre de modifications
+Sur une base générée par donnees_volume.py, compare la synchronisation complète
+(révision 0, toutes les pages) à un delta après 10, 100 et 1000 évaluations
+modifiées, pour l'administrateur et pour un enseignant : durée, octets JSON
+et octets compressés (gzip).
+
+    python benchmarks/synchro_delta.py [--classes 40] [--annees 3]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-bench-'), 'synchro.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from commun import preparer_base  # noqa: E402
+from app import app, db  # noqa: E402
+from models import User, Evaluation  # noqa: E402
+import cache_utilisateurs  # noqa: E402
+import synchro  # noqa: E402
+
+
+def synchroniser(utilisateur, depuis):
+    """Toutes les pages depuis la révision : (durée ms, octets, octets gzip, révision)"""
+    octets = compresses = 0
+    debut = time.perf_counter()
+    while True:
+        page = synchro.modifications(depuis, utilisateur)
+        corps = json.dumps(page, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        octets += len(corps)
+        compresses += len(gzip.compress(corps, compresslevel=6))
+        depuis = page['revision']
+        if not page['suite']:
+            break
+    duree = (time.perf_counter() - debut) * 1000
+    db.session.remove()
+    return duree, octets, compresses, depuis
+
+
+def modifier_evaluations(utilisateur, nombre):
+    """Change le niveau de nombre évaluations du périmètre de l'utilisateur"""
+    requete = Evaluation.query
+    if utilisateur.role != 'admin':
+        requete = requete.filter(Evaluation.classe_id.in_(sorted(utilisateur.classe_ids)))
+    for evaluation in requete.order_by(Evaluation.id.desc()).limit(nombre):
+        evaluation.niveau = 'Fragile' if evaluation.niveau == 'Très bien' else 'Très bien'
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--classes', type=int, default=40)
+    parser.add_argument('--annees', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"📦 Base de mesure ({FICHIER_BASE})...")
+    comptes = preparer_base(classes=args.classes, annees=args.annees)
+    print(f"   {comptes['eleves']} élèves, {comptes['evaluations']} évaluations, "
+          f"{comptes['commentaires']} commentaires")
+
+    with app.app_context():
+        for username in ('admin', 'ens.e1.c1'):
+            utilisateur = cache_utilisateurs.charger(
+                User.query.filter_by(username=username).one().id)
+            print(f"\n⏱️  {username}")
+            print(f"   {'synchronisation':<22} {'ms':>9} {'Ko json':>9} {'Ko gzip':>9}")
+            duree, octets, compresses, revision = synchroniser(utilisateur, 0)
+            print(f"   {'complète':<22} {duree:>9.1f} {octets / 1024:>9.1f} "
+                  f"{compresses / 1024:>9.1f}")
+            for nombre in (10, 100, 1000):
+                modifier_evaluations(utilisateur, nombre)
+                duree, octets, compresses, revision = synchroniser(utilisateur, revision)
+                print(f"   {f'{nombre} modifications':<22} {duree:>9.1f} "
+                      f"{octets / 1024:>9.1f} {compresses / 1024:>9.1f}")
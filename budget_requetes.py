@@ -0,0 +1,85 @@
+"""
+Budget de requêtes SQL par vue pour le système LSU École du Cap
+Compte les requêtes exécutées (événements du moteur SQLAlchemy) et signale
+les vues qui dépassent le nombre de requêtes déclaré.
+
+Dans une vue :
+
+    @app.route('/dashboard')
+    @login_required
+    @budget_requetes(3)
+    def dashboard(): ...
+
+Dans un test :
+
+    with compter_requetes() as compteur:
+        client.get('/dashboard')
+    assert compteur.total <= 3
+"""
+
+from app import app
+from contextlib import contextmanager
+from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import threading
+
+
+class DepassementBudgetRequetes(AssertionError):
+    """Une vue a exécuté plus de requêtes que son budget"""
+
+
+class CompteurRequetes:
+    """Requêtes SQL exécutées dans le thread courant pendant la mesure"""
+
+    def __init__(self):
+        self.total = 0
+        self.requetes = []
+
+
+_actifs = threading.local()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _compter(conn, cursor, statement, parameters, context, executemany):
+    for compteur in getattr(_actifs, 'pile', ()):
+        compteur.total += 1
+        compteur.requetes.append(statement)
+
+
+@contextmanager
+def compter_requetes():
+    """Compte les requêtes exécutées dans le bloc (mesures imbricables)"""
+    if not hasattr(_actifs, 'pile'):
+        _actifs.pile = []
+    compteur = CompteurRequetes()
+    _actifs.pile.append(compteur)
+    try:
+        yield compteur
+    finally:
+        _actifs.pile.remove(compteur)
+
+
+def budget_requetes(maximum):
+    """Décorateur de vue : nombre maximal de requêtes SQL autorisé
+
+    En mode strict (BUDGET_REQUETES_STRICT, à activer dans les tests) un
+    dépassement lève DepassementBudgetRequetes, sinon il est journalisé.
+    """
+    def decorateur(vue):
+        @wraps(vue)
+        def vue_mesuree(*args, **kwargs):
+            with compter_requetes() as compteur:
+                reponse = vue(*args, **kwargs)
+            if compteur.total > maximum:
+                message = (f"{vue.__name__} : {compteur.total} requêtes SQL "
+                           f"pour un budget de {maximum}")
+                if app.config['BUDGET_REQUETES_STRICT']:
+                    raise DepassementBudgetRequetes(
+                        message + "\n" + "\n".join(compteur.requetes)
+                    )
+                app.logger.warning(message)
+            return reponse
+        vue_mesuree.budget_requetes = maximum
+        return vue_mesuree
+    return decorateur
@@ -0,0 +1,115 @@
+"""
+Cache des générations IA pour le système LSU École du Cap
+Niveau mémoire (LRU avec expiration) et niveau persistant (table CacheIA)
+"""
+
+from app import app, db, contexte_applicatif
+from models import CacheIA
+from collections import OrderedDict
+from sqlalchemy.exc import IntegrityError
+import hashlib
+import json
+import threading
+import time
+
+
+def cle_generation(modele, message_systeme, prompt, temperature):
+    """Empreinte SHA-256 des paramètres qui déterminent la génération"""
+    contenu = json.dumps([modele, message_systeme, prompt, temperature],
+                         ensure_ascii=False)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+class CacheMemoire:
+    """Cache LRU en mémoire avec durée de vie et taille maximale"""
+
+    def __init__(self, taille_max, duree_vie):
+        self.taille_max = taille_max
+        self.duree_vie = duree_vie
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def get(self, cle):
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return None
+            expiration, valeur = entree
+            if expiration < time.monotonic():
+                del self._entrees[cle]
+                return None
+            self._entrees.move_to_end(cle)
+            return valeur
+
+    def set(self, cle, valeur):
+        with self._verrou:
+            self._entrees[cle] = (time.monotonic() + self.duree_vie, valeur)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+    def __len__(self):
+        return len(self._entrees)
+
+
+_memoire = CacheMemoire(app.config['IA_CACHE_TAILLE'], app.config['IA_CACHE_TTL'])
+_compteurs = {'hits_memoire': 0, 'hits_base': 0, 'misses': 0}
+_compteurs_verrou = threading.Lock()
+
+
+def _compter(nom):
+    with _compteurs_verrou:
+        _compteurs[nom] += 1
+
+
+def lire(cle):
+    """Recherche une génération en mémoire puis en base"""
+    contenu = _memoire.get(cle)
+    if contenu is not None:
+        _compter('hits_memoire')
+        return contenu
+
+    with contexte_applicatif():
+        entree = CacheIA.query.filter_by(cle=cle).first()
+        contenu = entree.contenu if entree else None
+
+    if contenu is None:
+        _compter('misses')
+        return None
+
+    _compter('hits_base')
+    _memoire.set(cle, contenu)
+    return contenu
+
+
+def ecrire(cle, modele, contenu):
+    """Enregistre une génération dans les deux niveaux du cache"""
+    _memoire.set(cle, contenu)
+    with contexte_applicatif():
+        try:
+            entree = CacheIA.query.filter_by(cle=cle).first()
+            if entree:
+                entree.contenu = contenu
+            else:
+                db.session.add(CacheIA(cle=cle, modele=modele, contenu=contenu))
+            db.session.commit()
+        except IntegrityError:
+            # Même clé écrite en parallèle par un autre worker
+            db.session.rollback()
+
+
+def statistiques():
+    """Compteurs de succès/échecs et taille du cache"""
+    with _compteurs_verrou:
+        stats = dict(_compteurs)
+    hits = stats['hits_memoire'] + stats['hits_base']
+    total = hits + stats['misses']
+    stats['taux_succes'] = round(hits / total, 3) if total else 0.0
+    stats['entrees_memoire'] = len(_memoire)
+    with contexte_applicatif():
+        stats['entrees_base'] = CacheIA.query.count()
+    return stats
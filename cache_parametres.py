@@ -0,0 +1,103 @@
+"""
+Cache des paramètres système (table Parametre) pour le système LSU École du Cap
+Tous les paramètres sont chargés une fois, déjà typés, dans un dictionnaire
+en mémoire : une lecture est une simple recherche. Toute modification d'un
+Parametre incrémente la version enregistrée en base (table parametre_version)
+dans la même transaction et vide le cache du processus à la validation ; les
+autres processus comparent leur version à celle de la base au plus toutes les
+PARAMETRES_VERIFICATION secondes.
+"""
+
+from app import app, db, contexte_applicatif
+from models import Parametre, VersionParametres
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import threading
+import time
+
+
+class CacheParametres:
+    """Valeurs typées de tous les paramètres, rechargées quand la version change"""
+
+    def __init__(self, intervalle_verification):
+        self.intervalle_verification = intervalle_verification
+        self._valeurs = None
+        self._version = None
+        self._prochaine_verification = 0.0
+        self._verrou = threading.Lock()
+
+    def valeurs(self):
+        maintenant = time.monotonic()
+        if self._valeurs is not None and maintenant < self._prochaine_verification:
+            return self._valeurs
+        with self._verrou:
+            if self._valeurs is None or maintenant >= self._prochaine_verification:
+                with contexte_applicatif():
+                    version = _version_base()
+                    if self._valeurs is None or version != self._version:
+                        self._valeurs = {p.cle: p.get_valeur()
+                                         for p in Parametre.query.all()}
+                        self._version = version
+                self._prochaine_verification = maintenant + self.intervalle_verification
+            return self._valeurs
+
+    def invalider(self):
+        with self._verrou:
+            self._valeurs = None
+
+
+def _version_base():
+    return db.session.query(VersionParametres.version).filter_by(id=1).scalar() or 0
+
+
+_cache = CacheParametres(app.config['PARAMETRES_VERIFICATION'])
+
+
+def valeur(cle, defaut=None):
+    """Valeur typée d'un paramètre, ou valeur par défaut s'il n'existe pas"""
+    return _cache.valeurs().get(cle, defaut)
+
+
+def tous():
+    """Copie de tous les paramètres {clé: valeur typée}"""
+    return dict(_cache.valeurs())
+
+
+def invalider():
+    """Force le rechargement au prochain accès (ce processus uniquement)"""
+    _cache.invalider()
+
+
+def definir(cle, nouvelle_valeur):
+    """Modifie un paramètre existant et valide (False s'il n'existe pas)"""
+    parametre = Parametre.query.filter_by(cle=cle).first()
+    if parametre is None:
+        return False
+    parametre.set_valeur(nouvelle_valeur)
+    db.session.commit()
+    return True
+
+
+# ----- Invalidation à l'écriture -----
+
+@event.listens_for(Session, 'after_flush')
+def _incrementer_version(session, contexte_flush):
+    if any(isinstance(objet, Parametre)
+           for objet in (*session.new, *session.dirty, *session.deleted)):
+        table = VersionParametres.__table__
+        connexion = session.connection()
+        if not connexion.execute(table.update().where(table.c.id == 1).values(
+                version=table.c.version + 1)).rowcount:
+            connexion.execute(table.insert().values(id=1, version=1))
+        session.info['parametres_modifies'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _vider_cache(session):
+    if session.info.pop('parametres_modifies', False):
+        invalider()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _oublier_modification(session, transaction_precedente):
+    session.info.pop('parametres_modifies', None)
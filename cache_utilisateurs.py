@@ -0,0 +1,139 @@
+"""
+Cache de l'utilisateur connecté pour le système LSU École du Cap
+Flask-Login recharge l'utilisateur à chaque requête : on conserve à la place,
+pendant UTILISATEURS_TTL secondes, un instantané immuable (identité, rôle,
+état et classes dont il est l'enseignant). Les vérifications de droits sur
+une classe se font sur cet instantané, sans requête. Toute modification d'un
+utilisateur ou d'une classe incrémente la version enregistrée en base (table
+utilisateur_version) dans la même transaction et invalide les entrées
+concernées du processus à la validation ; les autres processus comparent
+leur version à celle de la base au plus toutes les UTILISATEURS_VERIFICATION
+secondes et écartent alors les instantanés plus anciens.
+"""
+
+from app import app, db
+from models import User, Classe, VersionUtilisateurs
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+import threading
+import time
+
+
+class UtilisateurConnecte(UserMixin):
+    """Instantané en lecture seule d'un utilisateur et de ses classes"""
+
+    __slots__ = ('id', 'username', 'email', 'nom', 'prenom', 'role', 'actif',
+                 'date_creation', 'classe_ids')
+
+    def __init__(self, utilisateur, classe_ids):
+        for champ in self.__slots__[:-1]:
+            object.__setattr__(self, champ, getattr(utilisateur, champ))
+        object.__setattr__(self, 'classe_ids', frozenset(classe_ids))
+
+    def __setattr__(self, nom, valeur):
+        raise AttributeError("Instantané utilisateur en lecture seule")
+
+    @property
+    def is_active(self):
+        return bool(self.actif)
+
+    def possede_classe(self, classe_id):
+        """L'utilisateur est l'enseignant de cette classe"""
+        try:
+            return int(classe_id) in self.classe_ids
+        except (TypeError, ValueError):
+            return False
+
+
+_entrees = {}  # user_id -> (expiration, instantané, version)
+_verrou = threading.Lock()
+_version = None
+_prochaine_verification = 0.0
+
+
+def _version_base():
+    return db.session.query(VersionUtilisateurs.version).filter_by(id=1).scalar() or 0
+
+
+def _noter_version(version, maintenant):
+    global _version, _prochaine_verification
+    with _verrou:
+        _version = version if _version is None else max(_version, version)
+        _prochaine_verification = maintenant + app.config['UTILISATEURS_VERIFICATION']
+
+
+def charger(user_id):
+    """Instantané de l'utilisateur (None s'il n'existe pas), mis en cache"""
+    maintenant = time.monotonic()
+    if maintenant >= _prochaine_verification:
+        _noter_version(_version_base(), maintenant)
+    entree = _entrees.get(user_id)
+    if entree is not None and entree[0] > maintenant and entree[2] == _version:
+        return entree[1]
+
+    # Version lue avant l'utilisateur : l'instantané n'est jamais plus ancien qu'elle
+    version = _version_base()
+    lignes = db.session.query(User, Classe.id).outerjoin(
+        Classe, Classe.enseignant_id == User.id
+    ).filter(User.id == user_id).all()
+    _noter_version(version, maintenant)
+    if not lignes:
+        return None
+    instantane = UtilisateurConnecte(
+        lignes[0][0], [classe_id for _, classe_id in lignes if classe_id is not None])
+    with _verrou:
+        _entrees[user_id] = (maintenant + app.config['UTILISATEURS_TTL'], instantane, version)
+    return instantane
+
+
+def invalider(*user_ids):
+    """Retire des utilisateurs du cache (tous si aucun identifiant)"""
+    with _verrou:
+        if not user_ids:
+            _entrees.clear()
+        for user_id in user_ids:
+            _entrees.pop(user_id, None)
+
+
+# ----- Invalidation à l'écriture -----
+
+def incrementer_version(connexion):
+    """Nouvelle version des utilisateurs (écritures en masse hors ORM)"""
+    table = VersionUtilisateurs.__table__
+    if not connexion.execute(table.update().where(table.c.id == 1).values(
+            version=table.c.version + 1)).rowcount:
+        connexion.execute(table.insert().values(id=1, version=1))
+
+
+@event.listens_for(Session, 'before_flush')
+def _noter_utilisateurs_modifies(session, contexte_flush, instances):
+    concernes = session.info.setdefault('utilisateurs_modifies', set())
+    for objet in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(objet, User):
+            concernes.add(objet.id)
+        elif isinstance(objet, Classe):
+            # Ancien et nouvel enseignant lors d'un changement de titulaire
+            historique = inspect(objet).attrs.enseignant_id.history
+            concernes.update(historique.deleted)
+            concernes.add(objet.enseignant_id)
+    concernes.discard(None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _incrementer_version(session, contexte_flush):
+    if any(isinstance(objet, (User, Classe))
+           for objet in (*session.new, *session.dirty, *session.deleted)):
+        incrementer_version(session.connection())
+
+
+@event.listens_for(Session, 'after_commit')
+def _vider_utilisateurs_modifies(session):
+    concernes = session.info.pop('utilisateurs_modifies', None)
+    if concernes:
+        invalider(*concernes)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _oublier_utilisateurs_modifies(session, transaction_precedente):
+    session.info.pop('utilisateurs_modifies', None)
@@ -54,8 +54,14 @@ check_prerequisites() {
         exit 1
     fi
     
+    # Vérifier Python (workers de la file d'attente IA)
+    if ! command -v python3 &> /dev/null; then
+        print_error "Python 3 non trouvé"
+        exit 1
+    fi
+    
     # Vérifier les fichiers essentiels
-    REQUIRED_FILES=("package.json" "index.html" "js/app.js")
+    REQUIRED_FILES=("package.json" "index.html" "js/app.js" "file_attente.py")
     
     for file in "${REQUIRED_FILES[@]}"; do
         if [ ! -f "$file" ]; then
@@ -171,9 +177,23 @@ EOF
         print_info "Données initiales créées"
     fi
     
+    # Schéma de la base Python (file d'attente IA, index)
+    python3 migrations.py
+    
     print_info "Migrations terminées"
 }
 
+# Démarrer les workers de la file d'attente IA
+start_workers() {
+    print_message "Démarrage des workers IA (${IA_FILE_WORKERS:-4})..."
+    
+    # Sans worker, les générations acceptées (202) restent en file indéfiniment
+    python3 file_attente.py --workers "${IA_FILE_WORKERS:-4}" &
+    WORKERS_PID=$!
+    
+    print_info "Workers IA démarrés (PID $WORKERS_PID)"
+}
+
 # Vérifier les services externes
 check_external_services() {
     print_message "Vérification des services externes..."
@@ -202,31 +222,45 @@ start_application() {
     export LSU_ENVIRONMENT=$LSU_ENVIRONMENT
     export PORT=$PORT
     
-    # Démarrer l'application selon l'environnement
+    # Démarrer l'application selon l'environnement (sans exec : le script
+    # reste le processus principal pour arrêter aussi les workers IA)
     case $LSU_ENVIRONMENT in
         dev)
             print_info "Mode développement"
-            exec npm run dev
+            npm run dev &
             ;;
         staging)
             print_info "Mode staging"
-            exec npm start
+            npm start &
             ;;
         prod)
             print_info "Mode production"
-            exec npm start
+            npm start &
             ;;
         *)
             print_warning "Environnement inconnu, démarrage en mode production"
-            exec npm start
+            npm start &
             ;;
     esac
+    APP_PID=$!
+    
+    # Arrêt du conteneur si l'application ou les workers s'arrêtent
+    wait -n "$APP_PID" "$WORKERS_PID"
+    handle_signals
 }
 
 # Gestion des signaux
 handle_signals() {
     print_message "Arrêt de l'application..."
     
+    # Arrêter l'application et les workers IA (SIGTERM : fin de la tâche en cours)
+    for pid in $APP_PID $WORKERS_PID; do
+        kill -TERM "$pid" 2>/dev/null || true
+    done
+    for pid in $APP_PID $WORKERS_PID; do
+        wait "$pid" 2>/dev/null || true
+    done
+    
     # Sauvegarder les données si nécessaire
     if [ -f "/app/data/lsu_data.json" ]; then
         cp /app/data/lsu_data.json /app/backups/lsu_data_backup_$(date +%Y%m%d_%H%M%S).json
@@ -259,7 +293,8 @@ main() {
     run_migrations
     check_external_services
     
-    # Démarrer l'application
+    # Démarrer les workers IA puis l'application
+    start_workers
     start_application
 }
 
@@ -0,0 +1,193 @@
+"""
+Jeu de données synthétique à grande échelle pour le système LSU École du Cap
+Écoles × classes × élèves × matières × périodes × années, tirés avec une
+graine fixe (même graine, mêmes données). Les lignes sont insérées par
+paquets avec des INSERT groupés (Core), le tout dans une seule transaction.
+
+    python init_db.py --volume --ecoles 10 --classes 20 --eleves 25 --annees 3
+"""
+
+from app import db
+from models import (User, Classe, Eleve, Matiere, Evaluation, EvaluationCompetence,
+                    Commentaire)
+from synthese_niveaux import reconstruire as reconstruire_synthese
+import recherche
+import synchro
+from werkzeug.security import generate_password_hash
+from datetime import date, datetime, timedelta
+import random
+
+
+TAILLE_PAQUET = 50000
+NIVEAUX_CLASSES = ['CP', 'CE1', 'CE2', 'CM1', 'CM2']
+NIVEAUX = ['Insuffisant', 'Fragile', 'Satisfaisant', 'Très bien']
+POIDS_NIVEAUX = [1, 3, 5, 3]
+PERIODES = ['P1', 'P2', 'P3', 'P4', 'P5']
+PRENOMS = ['Emma', 'Lucas', 'Chloé', 'Hugo', 'Léa', 'Jules', 'Alice', 'Théo',
+           'Inès', 'Adam', 'Louise', 'Raphaël', 'Zoé', 'Nathan', 'Camille',
+           'Ethan', 'Jade', 'Louis', 'Nina', 'Paul', 'Sofia', 'Antoine', 'Mia',
+           'Gabriel', 'Eva', 'Arthur', 'Lina', 'Noé', 'Manon', 'Sacha']
+NOMS = ['Dubois', 'Leroy', 'Moreau', 'Simon', 'Michel', 'Petit', 'Robert',
+        'Richard', 'Durand', 'Lefebvre', 'Garcia', 'David', 'Bertrand', 'Roux',
+        'Vincent', 'Fournier', 'Morel', 'Girard', 'André', 'Mercier', 'Dupuis',
+        'Lambert', 'Bonnet', 'François', 'Martinez', 'Legrand', 'Garnier',
+        'Faure', 'Rousseau', 'Blanc']
+REMARQUES = ['Bonne progression', 'Travail régulier', 'Doit persévérer',
+             'Acquis solides', 'Participation active', 'Besoin de soutien', None]
+COMMENTAIRES = [
+    "{prenom} fait preuve de sérieux et de régularité dans son travail.",
+    "Les acquis de la période sont solides dans l'ensemble.",
+    "Quelques notions restent fragiles et demandent à être consolidées.",
+    "{prenom} participe volontiers et progresse à son rythme.",
+    "Il faut poursuivre les efforts engagés pour la période suivante.",
+]
+
+
+def _prochain_id(modele):
+    return (db.session.query(db.func.max(modele.id)).scalar() or 0) + 1
+
+
+def _inserer(connexion, modele, lignes):
+    """INSERT groupé par paquets de TAILLE_PAQUET lignes ; renvoie le nombre inséré"""
+    total = 0
+    paquet = []
+    for ligne in lignes:
+        paquet.append(ligne)
+        if len(paquet) >= TAILLE_PAQUET:
+            connexion.execute(modele.__table__.insert(), paquet)
+            total += len(paquet)
+            paquet = []
+    if paquet:
+        connexion.execute(modele.__table__.insert(), paquet)
+        total += len(paquet)
+    return total
+
+
+def generer(ecoles=1, classes=10, eleves=25, matieres=8, periodes=4, annees=1,
+            competences=0, commentaires=True, graine=42):
+    """Insère le jeu de données et renvoie le nombre de lignes par table
+
+    Il n'existe pas d'entité École : une école est un groupe de classes
+    (une par enseignant) nommées « CE1 B - École 3 ».
+    """
+    aleatoire = random.Random(graine)
+    periodes = PERIODES[:periodes]
+    derniere_annee = 2024
+    annees_scolaires = [f'{a}-{a + 1}'
+                        for a in range(derniere_annee - annees + 1, derniere_annee + 1)]
+    comptes = {}
+
+    # Matières : celles de la base, complétées si nécessaire
+    matiere_ids = [m.id for m in Matiere.query.order_by(Matiere.id).limit(matieres)]
+    premier = _prochain_id(Matiere)
+    nouvelles_matieres = [
+        {'id': premier + i, 'nom': f'Matière {premier + i}', 'code': f'M{premier + i}',
+         'actif': True}
+        for i in range(matieres - len(matiere_ids))
+    ]
+    matiere_ids += [m['id'] for m in nouvelles_matieres]
+
+    premier_user, premier_classe = _prochain_id(User), _prochain_id(Classe)
+    premier_eleve, premier_evaluation = _prochain_id(Eleve), _prochain_id(Evaluation)
+    premier_commentaire = _prochain_id(Commentaire)
+    # Un seul hachage (coûteux) partagé par tous les comptes générés
+    mot_de_passe = generate_password_hash('enseignant123')
+
+    enseignants, lignes_classes, lignes_eleves = [], [], []
+    for e in range(ecoles):
+        for c in range(classes):
+            numero = e * classes + c
+            user_id = premier_user + numero
+            enseignants.append({
+                'id': user_id, 'username': f'ens.e{e + 1}.c{c + 1}',
+                'email': f'ens.e{e + 1}.c{c + 1}@ecole-cap.fr',
+                'password_hash': mot_de_passe,
+                'nom': aleatoire.choice(NOMS), 'prenom': aleatoire.choice(PRENOMS),
+                'role': 'enseignant', 'actif': True,
+                'date_creation': datetime(2020, 9, 1),
+            })
+            niveau = NIVEAUX_CLASSES[c % len(NIVEAUX_CLASSES)]
+            lettre = chr(ord('A') + (c // len(NIVEAUX_CLASSES)) % 26)
+            # Élèves suivis sur toutes les années : la classe est celle de la
+            # dernière année, les évaluations des années précédentes y sont rattachées
+            classe_id = premier_classe + numero
+            lignes_classes.append({
+                'id': classe_id, 'nom': f'{niveau} {lettre} - École {e + 1}',
+                'annee_scolaire': annees_scolaires[-1], 'enseignant_id': user_id,
+                'date_creation': datetime(derniere_annee, 9, 1),
+            })
+            naissance = derniere_annee - 6 - NIVEAUX_CLASSES.index(niveau)
+            for _ in range(eleves):
+                lignes_eleves.append({
+                    'id': premier_eleve + len(lignes_eleves),
+                    'nom': aleatoire.choice(NOMS), 'prenom': aleatoire.choice(PRENOMS),
+                    'date_naissance': date(naissance, 1, 1) + timedelta(
+                        days=aleatoire.randrange(365)),
+                    'classe_id': classe_id,
+                    'date_creation': datetime(derniere_annee, 9, 1),
+                })
+
+    def evaluations():
+        evaluation_id = premier_evaluation
+        for a, annee_scolaire in enumerate(annees_scolaires):
+            debut_annee = datetime(derniere_annee - annees + 1 + a, 9, 1)
+            for eleve in lignes_eleves:
+                for p, periode in enumerate(periodes):
+                    date_evaluation = debut_annee + timedelta(
+                        days=7 * 9 * p + aleatoire.randrange(50))
+                    for matiere_id in matiere_ids:
+                        yield {
+                            'id': evaluation_id, 'eleve_id': eleve['id'],
+                            'matiere_id': matiere_id, 'classe_id': eleve['classe_id'],
+                            'periode': periode, 'annee_scolaire': annee_scolaire,
+                            'niveau': aleatoire.choices(NIVEAUX, POIDS_NIVEAUX)[0],
+                            'commentaire': aleatoire.choice(REMARQUES),
+                            'date_evaluation': date_evaluation,
+                        }
+                        evaluation_id += 1
+
+    def competences_evaluees(nb_evaluations):
+        for evaluation_id in range(premier_evaluation, premier_evaluation + nb_evaluations):
+            for numero in range(1, competences + 1):
+                yield {'evaluation_id': evaluation_id, 'code': f'C{numero}',
+                       'niveau': aleatoire.choices(NIVEAUX, POIDS_NIVEAUX)[0]}
+
+    def commentaires_periode():
+        # Un commentaire de bulletin par élève et par période de la dernière année
+        commentaire_id = premier_commentaire
+        for eleve in lignes_eleves:
+            auteur_id = premier_user + (eleve['classe_id'] - premier_classe)
+            for periode in periodes:
+                yield {
+                    'id': commentaire_id, 'eleve_id': eleve['id'], 'auteur_id': auteur_id,
+                    'type_commentaire': 'bulletin', 'periode': periode,
+                    'annee_scolaire': annees_scolaires[-1],
+                    'contenu': ' '.join(phrase.format(prenom=eleve['prenom']) for phrase
+                                        in aleatoire.sample(COMMENTAIRES, 2)),
+                    'version_ia': 'donnees-volume',
+                    'date_creation': datetime(derniere_annee, 12, 1),
+                    'modifie': False,
+                }
+                commentaire_id += 1
+
+    # Session libérée : la transaction Core ne doit pas attendre son verrou
+    db.session.commit()
+    with db.engine.begin() as connexion:
+        # Index plein texte reconstruit en une fois plutôt que ligne à ligne
+        recherche.supprimer_declencheurs(connexion)
+        comptes['matieres'] = _inserer(connexion, Matiere, nouvelles_matieres)
+        comptes['utilisateurs'] = _inserer(connexion, User, enseignants)
+        comptes['classes'] = _inserer(connexion, Classe, lignes_classes)
+        comptes['eleves'] = _inserer(connexion, Eleve, lignes_eleves)
+        comptes['evaluations'] = _inserer(connexion, Evaluation, evaluations())
+        comptes['competences'] = _inserer(connexion, EvaluationCompetence,
+                                          competences_evaluees(comptes['evaluations']))
+        comptes['commentaires'] = _inserer(connexion, Commentaire,
+                                           commentaires_periode()) if commentaires else 0
+        # Insertions hors ORM : synthèse des niveaux et journal de
+        # synchronisation recalculés
+        reconstruire_synthese(connexion)
+        recherche.creer_index(connexion)
+        synchro.initialiser_journal(connexion)
+    return comptes
+
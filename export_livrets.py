@@ -0,0 +1,223 @@
+"""
+Export des livrets scolaires en PDF pour le système LSU École du Cap
+Les données d'un lot (une classe ou toute l'école) sont chargées en quelques
+requêtes ; chaque livret est rendu (rendu_livrets.py) dans le pool de
+processus partagé du processus web, un élève par tâche, et ajouté à l'archive
+ZIP envoyée au fur et à mesure, sans garder l'ensemble des PDF en mémoire.
+
+Le pool est unique par processus et borné par EXPORT_WORKERS, quel que soit le
+nombre d'exports simultanés ; ses processus sont lancés en contexte 'spawn'
+(pas de fork d'un serveur multi-thread avec ses connexions ouvertes).
+
+    python export_livrets.py --periode P1 [--classe 3] [--workers 4] -o livrets.zip
+"""
+
+from app import app, db
+from models import User, Classe, Eleve, Matiere
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from rendu_livrets import rendre_livret
+import archivage
+import argparse
+import multiprocessing
+import threading
+import zipfile
+
+
+def charger_lot(classe_ids, periode):
+    """Données du lot : (données communes, livrets par élève), en 7 requêtes
+
+    Les matières et les classes ne sont chargées qu'une fois pour tout le lot ;
+    les livrets ne contiennent que des types simples (envoyés aux processus).
+    Les classes d'une année archivée sont lues dans les vues historiques.
+    """
+    classes = {
+        classe_id: {'nom': nom, 'annee_scolaire': annee,
+                    'enseignant': f"{prenom} {nom_enseignant}"}
+        for classe_id, nom, annee, prenom, nom_enseignant in db.session.query(
+            Classe.id, Classe.nom, Classe.annee_scolaire, User.prenom, User.nom
+        ).join(User, Classe.enseignant_id == User.id)
+        .filter(Classe.id.in_(classe_ids))
+    }
+    commun = {
+        'periode': periode,
+        'classes': classes,
+        'matieres': dict(db.session.query(Matiere.id, Matiere.nom)),
+    }
+    evaluations_source, competences_source, commentaires_source = archivage.sources(
+        bool(archivage.annees_archivees({c['annee_scolaire'] for c in classes.values()})))
+
+    livrets = {}
+    for eleve_id, nom, prenom, date_naissance, classe_id in db.session.query(
+        Eleve.id, Eleve.nom, Eleve.prenom, Eleve.date_naissance, Eleve.classe_id
+    ).filter(Eleve.classe_id.in_(classe_ids)).order_by(
+        Eleve.classe_id, Eleve.nom, Eleve.prenom
+    ):
+        livrets[eleve_id] = {
+            'eleve_id': eleve_id, 'nom': nom, 'prenom': prenom,
+            'date_naissance': date_naissance.strftime('%d/%m/%Y'),
+            'classe_id': classe_id, 'evaluations': {}, 'commentaires': {},
+        }
+
+    # Évaluations de la période, pour l'année scolaire de chaque classe
+    ev = evaluations_source.c
+    filtre_evaluations = (
+        ev.classe_id.in_(classe_ids),
+        ev.periode == periode,
+        ev.annee_scolaire == Classe.annee_scolaire,
+    )
+    for evaluation_id, eleve_id, matiere_id, niveau, commentaire in db.session.query(
+        ev.id, ev.eleve_id, ev.matiere_id, ev.niveau, ev.commentaire
+    ).join(Classe, ev.classe_id == Classe.id).filter(*filtre_evaluations):
+        if eleve_id in livrets:
+            livrets[eleve_id]['evaluations'][evaluation_id] = {
+                'matiere_id': matiere_id, 'niveau': niveau,
+                'commentaire': commentaire, 'competences': [],
+            }
+    evaluations = {evaluation_id: evaluation for livret in livrets.values()
+                   for evaluation_id, evaluation in livret['evaluations'].items()}
+    comp = competences_source.c
+    for evaluation_id, code, niveau in db.session.query(
+        comp.evaluation_id, comp.code, comp.niveau
+    ).join(evaluations_source, comp.evaluation_id == ev.id).join(
+        Classe, ev.classe_id == Classe.id
+    ).filter(*filtre_evaluations).order_by(comp.code):
+        if evaluation_id in evaluations:
+            evaluations[evaluation_id]['competences'].append((code, niveau))
+
+    # Dernier commentaire de chaque type pour la période
+    com = commentaires_source.c
+    for eleve_id, type_commentaire, contenu in db.session.query(
+        com.eleve_id, com.type_commentaire, com.contenu
+    ).join(Eleve, com.eleve_id == Eleve.id).join(
+        Classe, Eleve.classe_id == Classe.id
+    ).filter(
+        Eleve.classe_id.in_(classe_ids),
+        com.periode == periode,
+        com.annee_scolaire == Classe.annee_scolaire,
+    ).order_by(com.date_creation, com.id):
+        livrets[eleve_id]['commentaires'][type_commentaire] = contenu
+
+    for livret in livrets.values():
+        livret['evaluations'] = sorted(
+            livret['evaluations'].values(),
+            key=lambda e: commun['matieres'].get(e['matiere_id'], ''))
+    return commun, list(livrets.values())
+
+
+# Pool de rendu partagé par tous les exports du processus, créé au premier export
+_executeur = None
+_verrou_executeur = threading.Lock()
+
+
+def _pool_rendu():
+    global _executeur
+    with _verrou_executeur:
+        if _executeur is None:
+            _executeur = ProcessPoolExecutor(
+                max_workers=app.config['EXPORT_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'))
+        return _executeur
+
+
+def _abandonner_pool(executeur):
+    """Pool cassé (processus tué) : remplacé au prochain export"""
+    global _executeur
+    with _verrou_executeur:
+        if _executeur is executeur:
+            _executeur = None
+    executeur.shutdown(wait=False, cancel_futures=True)
+
+
+def _commun_livret(commun, livret):
+    """Données communes réduites à la classe du livret (envoyées avec la tâche)"""
+    classe_id = livret['classe_id']
+    return {'periode': commun['periode'], 'matieres': commun['matieres'],
+            'classes': {classe_id: commun['classes'][classe_id]}}
+
+
+def _rendre(commun, livrets, workers):
+    """Livrets rendus dans l'ordre où ils se terminent
+
+    Au plus workers livrets de cet export en cours à la fois dans le pool
+    partagé : la mémoire reste bornée quelle que soit la taille du lot.
+    """
+    if workers <= 1 or len(livrets) <= 1:
+        for livret in livrets:
+            yield rendre_livret(livret, commun)
+        return
+
+    executeur = _pool_rendu()
+    a_rendre = iter(livrets)
+    en_cours = set()
+    try:
+        for livret in islice(a_rendre, workers):
+            en_cours.add(executeur.submit(rendre_livret, livret,
+                                          _commun_livret(commun, livret)))
+        while en_cours:
+            termines, en_cours = wait(en_cours, return_when=FIRST_COMPLETED)
+            for futur in termines:
+                suivant = next(a_rendre, None)
+                if suivant is not None:
+                    en_cours.add(executeur.submit(rendre_livret, suivant,
+                                                  _commun_livret(commun, suivant)))
+                yield futur.result()
+    except BrokenProcessPool:
+        _abandonner_pool(executeur)
+        raise
+    finally:
+        # Téléchargement interrompu : les livrets restants de cet export ne
+        # sont pas rendus, le pool reste disponible pour les autres
+        for futur in en_cours:
+            futur.cancel()
+
+
+class _FluxZip:
+    """Sortie non positionnable de ZipFile, vidée après chaque livret"""
+
+    def __init__(self):
+        self.morceaux = []
+
+    def write(self, donnees):
+        self.morceaux.append(bytes(donnees))
+        return len(donnees)
+
+    def flush(self):
+        pass
+
+    def vider(self):
+        morceaux, self.morceaux = self.morceaux, []
+        return b''.join(morceaux)
+
+
+def generer_zip(commun, livrets, workers=None):
+    """Archive ZIP des livrets, produite morceau par morceau"""
+    workers = workers or app.config['EXPORT_WORKERS']
+    flux = _FluxZip()
+    # Les PDF sont déjà compressés : stockage sans recompression
+    with zipfile.ZipFile(flux, 'w', zipfile.ZIP_STORED) as archive:
+        for nom_fichier, pdf in _rendre(commun, livrets, workers):
+            archive.writestr(nom_fichier, pdf)
+            yield flux.vider()
+    yield flux.vider()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export des livrets PDF")
+    parser.add_argument('--periode', required=True)
+    parser.add_argument('--classe', type=int, action='append',
+                        help="classe à exporter (toutes par défaut, option répétable)")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('-o', '--sortie', default='livrets.zip')
+    args = parser.parse_args()
+
+    if args.workers:
+        app.config['EXPORT_WORKERS'] = args.workers
+    with app.app_context():
+        classe_ids = args.classe or [c.id for c in Classe.query.all()]
+        commun, livrets = charger_lot(classe_ids, args.periode)
+        with open(args.sortie, 'wb') as sortie:
+            for morceau in generer_zip(commun, livrets, args.workers):
+                sortie.write(morceau)
+        print(f"✅ {len(livrets)} livret(s) exporté(s) dans {args.sortie}")
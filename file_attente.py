@@ -0,0 +1,307 @@
+"""
+File d'attente durable des générations IA pour le système LSU École du Cap
+Les tâches sont stockées dans la base (table TacheIA) : aucun broker externe,
+et les tâches survivent aux redémarrages. Les tâches d'un même lot (une
+classe) sont réservées par groupes de IA_LOT_WORKERS : leurs appels au modèle
+partent en parallèle dans un pool de threads borné et les commentaires du
+groupe sont enregistrés en une seule transaction. Les workers sont lancés en
+contexte 'spawn' (pas de fork d'un processus dont le moteur a déjà servi) :
+
+    python file_attente.py --workers 4
+"""
+
+from app import app, db
+from models import TacheIA, Commentaire
+from generation_ia import fournisseur_actif, generer_texte, prompts_lot
+from photos import generer_variantes, associer_photo
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import json
+import multiprocessing
+import random
+import signal
+import time
+import uuid
+
+
+DUREE_BAIL = 300  # secondes avant qu'une tâche en cours soit reprise
+ATTENTE_VIDE = 1.0  # secondes entre deux interrogations d'une file vide
+
+
+def enfiler(type_tache, auteur_id, parametres, max_tentatives=5):
+    """Ajoute une tâche à la file et renvoie son identifiant"""
+    tache = TacheIA(type_tache=type_tache, auteur_id=auteur_id,
+                    max_tentatives=max_tentatives)
+    tache.set_parametres(parametres)
+    db.session.add(tache)
+    db.session.commit()
+    return tache.id
+
+
+def enfiler_lot(classe, type_commentaire, periode, auteur_id, forcer=False):
+    """Une tâche commentaire par élève de la classe, sous un même lot_id
+
+    Chaque commentaire est enregistré dès que sa tâche aboutit : un lot
+    interrompu (redémarrage, worker arrêté) reprend là où il s'était arrêté.
+    Renvoie None si la classe n'a aucun élève (aucune tâche créée).
+    """
+    lot_id = uuid.uuid4().hex
+    taches = []
+    for tache in prompts_lot(classe, type_commentaire, periode):
+        tache_ia = TacheIA(type_tache='commentaire', auteur_id=auteur_id, lot_id=lot_id)
+        tache_ia.set_parametres({
+            'eleve_id': tache['eleve_id'],
+            'eleve': tache['eleve'],
+            'type_commentaire': type_commentaire,
+            'periode': periode,
+            'annee_scolaire': classe.annee_scolaire,
+            'prompt': tache['prompt'],
+            'regenerer': forcer
+        })
+        taches.append(tache_ia)
+    if not taches:
+        return None
+    db.session.add_all(taches)
+    db.session.commit()
+    return lot_id
+
+
+def progression_lot(lot_id, auteur_id):
+    """État d'un lot d'après ses tâches (None s'il est inconnu pour cet auteur)"""
+    taches = TacheIA.query.filter_by(lot_id=lot_id, auteur_id=auteur_id).order_by(
+        TacheIA.id).all()
+    if not taches:
+        return None
+
+    resultats = []
+    for tache in taches:
+        if tache.statut not in ('terminee', 'echec'):
+            continue
+        parametres = tache.get_parametres()
+        resultat = {'eleve_id': parametres['eleve_id'], 'eleve': parametres['eleve']}
+        if tache.statut == 'terminee':
+            resultat.update(tache.get_resultat())
+        else:
+            resultat['error'] = tache.erreur
+        resultats.append(resultat)
+    return {
+        'statut': 'termine' if len(resultats) == len(taches) else 'en_cours',
+        'total': len(taches),
+        'termines': len(resultats),
+        'erreurs': sum(1 for tache in taches if tache.statut == 'echec'),
+        'resultats': resultats
+    }
+
+
+def _reserver_parmi(candidates, maintenant):
+    """Réserve les candidates encore libres ; renvoie les tâches obtenues"""
+    obtenues = []
+    for tache in candidates:
+        # La mise à jour conditionnelle garantit qu'un seul worker l'obtient
+        if TacheIA.query.filter(
+            TacheIA.id == tache.id,
+            TacheIA.statut == tache.statut,
+            TacheIA.date_modification == tache.date_modification
+        ).update({
+            'statut': 'en_cours',
+            'verrou_jusqua': maintenant + timedelta(seconds=DUREE_BAIL),
+            'date_modification': maintenant
+        }, synchronize_session=False):
+            obtenues.append(tache.id)
+    db.session.commit()
+    return obtenues
+
+
+def _pretes(maintenant):
+    return db.or_(
+        db.and_(TacheIA.statut == 'en_attente',
+                TacheIA.prochaine_tentative <= maintenant),
+        # Tâche abandonnée par un worker arrêté en cours de traitement
+        db.and_(TacheIA.statut == 'en_cours',
+                TacheIA.verrou_jusqua < maintenant)
+    )
+
+
+def reserver():
+    """Réserve atomiquement la prochaine tâche prête (ou None)"""
+    maintenant = datetime.utcnow()
+    candidates = TacheIA.query.filter(_pretes(maintenant)).order_by(
+        TacheIA.prochaine_tentative, TacheIA.id).limit(5).all()
+    for tache in candidates:
+        if _reserver_parmi([tache], maintenant):
+            return db.session.get(TacheIA, tache.id)
+    return None
+
+
+def reserver_lot(tache, nombre):
+    """La tâche réservée et jusqu'à nombre - 1 autres tâches prêtes de son lot"""
+    maintenant = datetime.utcnow()
+    candidates = TacheIA.query.filter(
+        TacheIA.lot_id == tache.lot_id, TacheIA.id != tache.id, _pretes(maintenant)
+    ).order_by(TacheIA.id).limit(nombre - 1).all()
+    ids = _reserver_parmi(candidates, maintenant)
+    return [tache] + TacheIA.query.filter(TacheIA.id.in_(ids)).order_by(TacheIA.id).all()
+
+
+def _generer_commentaire(parametres, fournisseur):
+    """Appel au modèle seul (sans session) : utilisable depuis un thread"""
+    return generer_texte(parametres['prompt'], forcer=parametres.get('regenerer', False),
+                         fournisseur=fournisseur)
+
+
+def _enregistrer_commentaire(tache, parametres, fournisseur, generation):
+    """Ajoute le commentaire généré à la session ; renvoie le résultat de la tâche"""
+    contenu, depuis_cache, jetons = generation
+    commentaire = Commentaire(
+        eleve_id=parametres['eleve_id'],
+        auteur_id=tache.auteur_id,
+        type_commentaire=parametres['type_commentaire'],
+        periode=parametres['periode'],
+        annee_scolaire=parametres['annee_scolaire'],
+        contenu=contenu,
+        version_ia=fournisseur.version,
+        prompt_utilise=parametres['prompt'],
+        jetons_prompt=jetons[0],
+        jetons_reponse=jetons[1]
+    )
+    db.session.add(commentaire)
+    db.session.flush()
+    return {'commentaire': contenu, 'id_commentaire': commentaire.id,
+            'cache': depuis_cache}
+
+
+def _traiter_commentaire(tache):
+    """Génère et enregistre un commentaire à partir des paramètres de la tâche"""
+    parametres = tache.get_parametres()
+    fournisseur = fournisseur_actif()
+    return _enregistrer_commentaire(tache, parametres, fournisseur,
+                                    _generer_commentaire(parametres, fournisseur))
+
+
+def _traiter_photo(tache):
+    """Produit les versions web d'une photo et les associe à la classe ou à l'élève"""
+    parametres = tache.get_parametres()
+    chemin = generer_variantes(parametres['empreinte'])
+    associer_photo(parametres['cible'], parametres['cible_id'], chemin)
+    return {'photo': chemin}
+
+
+TRAITEMENTS = {
+    'commentaire': _traiter_commentaire,
+    'photo': _traiter_photo,
+}
+
+
+def _replanifier(tache, erreur):
+    """Échec d'une tâche : nouvelle tentative plus tard (attente exponentielle) ou abandon"""
+    tache.tentatives += 1
+    tache.erreur = str(erreur)
+    if tache.tentatives >= tache.max_tentatives:
+        tache.statut = 'echec'
+    else:
+        delai = min(2 ** tache.tentatives, 300) * random.uniform(0.5, 1.0)
+        tache.statut = 'en_attente'
+        tache.prochaine_tentative = datetime.utcnow() + timedelta(seconds=delai)
+
+
+def _terminer(tache, resultat):
+    tache.resultat = json.dumps(resultat, ensure_ascii=False)
+    tache.statut = 'terminee'
+    tache.erreur = None
+
+
+def executer(tache):
+    """Exécute une tâche réservée ; replanifie avec attente exponentielle en cas d'échec"""
+    try:
+        _terminer(tache, TRAITEMENTS[tache.type_tache](tache))
+    except Exception as e:
+        db.session.rollback()
+        tache = db.session.get(TacheIA, tache.id)
+        _replanifier(tache, e)
+    tache.verrou_jusqua = None
+    tache.date_modification = datetime.utcnow()
+    db.session.commit()
+
+
+def executer_lot(taches):
+    """Tâches commentaire d'un même lot, enregistrées en une transaction
+
+    Les appels au modèle partent en parallèle (au plus IA_LOT_WORKERS) ; une
+    tâche en échec est replanifiée sans empêcher l'enregistrement des autres.
+    """
+    fournisseur = fournisseur_actif()
+    parametres = [tache.get_parametres() for tache in taches]
+    with ThreadPoolExecutor(max_workers=app.config['IA_LOT_WORKERS']) as pool:
+        futurs = [pool.submit(_generer_commentaire, p, fournisseur) for p in parametres]
+    maintenant = datetime.utcnow()
+    for tache, parametres_tache, futur in zip(taches, parametres, futurs):
+        try:
+            generation = futur.result()
+            with db.session.begin_nested():
+                resultat = _enregistrer_commentaire(tache, parametres_tache,
+                                                    fournisseur, generation)
+            _terminer(tache, resultat)
+        except Exception as e:
+            _replanifier(tache, e)
+        tache.verrou_jusqua = None
+        tache.date_modification = maintenant
+    db.session.commit()
+
+
+def travailler():
+    """Boucle d'un worker : vide la file jusqu'à réception de SIGTERM/SIGINT"""
+    arret = {'demande': False}
+
+    def demander_arret(signum, frame):
+        arret['demande'] = True
+
+    signal.signal(signal.SIGTERM, demander_arret)
+    signal.signal(signal.SIGINT, demander_arret)
+
+    with app.app_context():
+        # Connexions éventuellement héritées du parent : jamais réutilisées ici
+        db.engine.dispose(close=False)
+        while not arret['demande']:
+            tache = reserver()
+            if tache is None:
+                db.session.remove()
+                time.sleep(ATTENTE_VIDE)
+                continue
+            if tache.lot_id and tache.type_tache == 'commentaire':
+                executer_lot(reserver_lot(tache, app.config['IA_LOT_WORKERS']))
+            else:
+                executer(tache)
+
+
+def lancer_workers(nombre):
+    """Démarre un pool de processus workers et attend leur arrêt"""
+    contexte = multiprocessing.get_context('spawn')
+    processus = [
+        contexte.Process(target=travailler, name=f"worker-ia-{i}")
+        for i in range(nombre)
+    ]
+    for p in processus:
+        p.start()
+
+    def arreter(signum, frame):
+        for p in processus:
+            p.terminate()
+
+    signal.signal(signal.SIGTERM, arreter)
+    signal.signal(signal.SIGINT, arreter)
+    for p in processus:
+        p.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Workers de la file d'attente IA")
+    parser.add_argument('-w', '--workers', type=int,
+                        default=app.config['IA_FILE_WORKERS'],
+                        help="nombre de processus workers")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+    print(f"🧵 Démarrage de {args.workers} worker(s) de la file d'attente IA")
+    lancer_workers(args.workers)
@@ -0,0 +1,212 @@
+"""
+Fournisseurs de modèles IA pour le système LSU École du Cap
+OpenAI, modèle local compatible Ollama et bouchon déterministe hors ligne
+"""
+
+from jetons import compter_jetons, compter_jetons_messages
+import hashlib
+import json
+import time
+import httpx
+import openai
+
+
+# Fonctions appelées avec (fournisseur, jetons du prompt, jetons de la réponse)
+# après chaque génération (ex. métriques)
+observateurs_jetons = []
+
+
+def _signaler_jetons(fournisseur, jetons_prompt, jetons_reponse):
+    for observateur in observateurs_jetons:
+        observateur(fournisseur, jetons_prompt, jetons_reponse)
+
+
+class FournisseurIA:
+    """Interface commune des fournisseurs : génération complète ou en flux"""
+
+    nom = None
+
+    def __init__(self, modele, timeout, connexions=10):
+        self.modele = modele
+        self.timeout = timeout
+        # Client HTTP propre au fournisseur : connexions conservées (keep-alive)
+        self.http = httpx.Client(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=connexions,
+                                max_keepalive_connections=connexions)
+        )
+
+    @property
+    def version(self):
+        """Valeur enregistrée dans Commentaire.version_ia (20 caractères)"""
+        return self.modele[:20]
+
+    def generer(self, messages, max_tokens, temperature):
+        raise NotImplementedError
+
+    def flux(self, messages, max_tokens, temperature):
+        raise NotImplementedError
+
+    def fermer(self):
+        self.http.close()
+
+
+class FournisseurOpenAI(FournisseurIA):
+    """API OpenAI (ou compatible) via le client officiel"""
+
+    nom = 'openai'
+
+    def __init__(self, modele, timeout, api_key=None, base_url=None,
+                 connexions=10):
+        super().__init__(modele, timeout, connexions)
+        # Les nouvelles tentatives sont gérées par generation_ia.appeler_ia
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url,
+                                    timeout=timeout, max_retries=0,
+                                    http_client=self.http)
+
+    def generer(self, messages, max_tokens, temperature):
+        response = self.client.chat.completions.create(
+            model=self.modele,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        if response.usage:
+            _signaler_jetons(self.nom, response.usage.prompt_tokens,
+                             response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    def flux(self, messages, max_tokens, temperature):
+        response = self.client.chat.completions.create(
+            model=self.modele,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        try:
+            for morceau in response:
+                if morceau.choices and morceau.choices[0].delta.content:
+                    yield morceau.choices[0].delta.content
+        finally:
+            response.response.close()
+
+
+class FournisseurLocal(FournisseurIA):
+    """Modèle local exposant l'API HTTP d'Ollama (/api/chat)"""
+
+    nom = 'local'
+
+    def __init__(self, modele, timeout, url, connexions=10):
+        super().__init__(modele, timeout, connexions)
+        self.url = url.rstrip('/') + '/api/chat'
+
+    def _corps(self, messages, max_tokens, temperature, stream):
+        return {
+            'model': self.modele,
+            'messages': messages,
+            'stream': stream,
+            'options': {'temperature': temperature, 'num_predict': max_tokens}
+        }
+
+    def generer(self, messages, max_tokens, temperature):
+        response = self.http.post(
+            self.url, json=self._corps(messages, max_tokens, temperature, False)
+        )
+        response.raise_for_status()
+        resultat = response.json()
+        _signaler_jetons(self.nom, resultat.get('prompt_eval_count'),
+                         resultat.get('eval_count'))
+        return resultat['message']['content']
+
+    def flux(self, messages, max_tokens, temperature):
+        corps = self._corps(messages, max_tokens, temperature, True)
+        # Fermer le contexte (client déconnecté) coupe la connexion au modèle
+        with self.http.stream('POST', self.url, json=corps) as response:
+            response.raise_for_status()
+            for ligne in response.iter_lines():
+                if not ligne:
+                    continue
+                morceau = json.loads(ligne)
+                fragment = morceau.get('message', {}).get('content')
+                if fragment:
+                    yield fragment
+                if morceau.get('done'):
+                    _signaler_jetons(self.nom, morceau.get('prompt_eval_count'),
+                                     morceau.get('eval_count'))
+                    break
+
+
+class FournisseurBouchon(FournisseurIA):
+    """Fournisseur hors ligne et déterministe pour les tests et benchmarks"""
+
+    nom = 'bouchon'
+
+    PHRASES = [
+        "{prenom} fait preuve de sérieux et de régularité dans son travail.",
+        "Les acquis de la période sont solides dans l'ensemble.",
+        "Quelques notions restent fragiles et demandent à être consolidées.",
+        "{prenom} participe volontiers et progresse à son rythme.",
+        "Il faut poursuivre les efforts engagés pour la période suivante.",
+        "Les résultats sont encourageants, bravo pour cet investissement.",
+    ]
+
+    def __init__(self, modele, timeout, latence=0.0):
+        super().__init__(modele, timeout, connexions=1)
+        self.latence = latence
+
+    def _texte(self, messages):
+        prompt = messages[-1]['content']
+        graine = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16)
+        prenom = 'L\'élève'
+        for ligne in prompt.splitlines():
+            ligne = ligne.strip()
+            if ligne.startswith('Élève:'):
+                prenom = ligne[len('Élève:'):].split()[0]
+                break
+        indices = [(graine >> (8 * i)) % len(self.PHRASES) for i in range(3)]
+        phrases = []
+        for indice in indices:
+            phrase = self.PHRASES[indice].format(prenom=prenom)
+            if phrase not in phrases:
+                phrases.append(phrase)
+        return ' '.join(phrases)
+
+    def generer(self, messages, max_tokens, temperature):
+        if self.latence:
+            time.sleep(self.latence)
+        texte = self._texte(messages)
+        _signaler_jetons(self.nom, compter_jetons_messages(messages), compter_jetons(texte))
+        return texte
+
+    def flux(self, messages, max_tokens, temperature):
+        mots = self._texte(messages).split(' ')
+        for i, mot in enumerate(mots):
+            if self.latence:
+                time.sleep(self.latence / len(mots))
+            yield mot if i == 0 else ' ' + mot
+
+
+FOURNISSEURS = {
+    FournisseurOpenAI.nom: FournisseurOpenAI,
+    FournisseurLocal.nom: FournisseurLocal,
+    FournisseurBouchon.nom: FournisseurBouchon,
+}
+
+
+def creer_fournisseur(nom, modele, config):
+    """Instancie un fournisseur à partir de son nom et de la configuration"""
+    timeout = config['IA_TIMEOUT']
+    connexions = config['IA_LOT_WORKERS']
+    if nom == FournisseurOpenAI.nom:
+        return FournisseurOpenAI(modele, timeout,
+                                 api_key=config.get('OPENAI_API_KEY'),
+                                 base_url=config.get('OPENAI_BASE_URL'),
+                                 connexions=connexions)
+    if nom == FournisseurLocal.nom:
+        return FournisseurLocal(modele, timeout, config['IA_URL_LOCALE'],
+                                connexions=connexions)
+    if nom == FournisseurBouchon.nom:
+        return FournisseurBouchon(modele, timeout,
+                                  latence=config['IA_BOUCHON_LATENCE'])
+    raise ValueError(f"Fournisseur IA inconnu : {nom}")
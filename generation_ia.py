@@ -0,0 +1,283 @@
+"""
+Génération IA des commentaires pour le système LSU École du Cap
+Construction des prompts (élève ou classe entière) et appel au modèle
+"""
+
+from app import app
+from models import Eleve, Evaluation, NIVEAUX
+from fournisseurs_ia import creer_fournisseur, observateurs_jetons
+from jetons import compter_jetons, compter_jetons_messages, tronquer
+from sqlalchemy.orm import joinedload
+from contextlib import contextmanager
+from datetime import datetime
+import functools
+import random
+import re
+import threading
+import time
+import cache_ia
+import cache_parametres
+import metriques
+
+
+TEMPERATURE_IA = 0.7
+MAX_TOKENS_IA = 500
+
+# Consignes communes à tous les prompts : une seule fois, dans le message système
+MESSAGE_SYSTEME = (
+    "Tu es un enseignant expérimenté qui rédige des commentaires d'évaluation "
+    "pour le Livret Scolaire Unique. Tes commentaires sont bienveillants, "
+    "précis sur les acquis et les difficultés, et constructifs avec des pistes "
+    "d'amélioration. Réponds en 3 à 5 phrases adaptées au niveau de la classe."
+)
+
+# Remarques d'évaluation raccourcies en dessous de ce nombre de jetons : omises
+JETONS_MIN_REMARQUE = 3
+
+
+def _compacter(texte):
+    """Texte sur une ligne, sans espaces superflus"""
+    return ' '.join((texte or '').split())
+
+
+def _resumer(texte, jetons_max):
+    """Première phrase du texte si elle tient dans le budget, sinon son début"""
+    phrase = re.split(r'(?<=[.!?])\s', texte, maxsplit=1)[0]
+    if compter_jetons(phrase) <= jetons_max:
+        return phrase
+    return tronquer(phrase, jetons_max)
+
+
+# Jetons par ligne : matières, niveaux et remarques se répètent d'un élève à l'autre
+_jetons_ligne = functools.lru_cache(maxsize=4096)(compter_jetons)
+
+
+def _jetons_prompt(prompt):
+    """Jetons d'un prompt en lignes (un jeton par saut de ligne)"""
+    return sum(map(_jetons_ligne, prompt)) + len(prompt) - 1
+
+
+def _lignes_prompt(eleve, lignes, remarques, type_commentaire, observations, periode):
+    prompt = [f"Élève: {eleve.prenom} {eleve.nom}",
+              f"Classe: {eleve.classe.nom}",
+              f"Période: {periode}",
+              f"Commentaire: {type_commentaire}"]
+    if observations:
+        prompt.append(f"Observations: {observations}")
+    prompt.append("Évaluations:" if lignes else "Évaluations: aucune")
+    for index, (matiere, niveau, _) in enumerate(lignes):
+        remarque = remarques.get(index)
+        prompt.append(f"{matiere}: {niveau} ({remarque})" if remarque else f"{matiere}: {niveau}")
+    return prompt
+
+
+def construire_prompt_ia(eleve, evaluations, type_commentaire, observations,
+                        periode, budget=None):
+    """Prompt compact de l'élève, limité à budget jetons (IA_BUDGET_PROMPT)
+
+    evaluations : celles de la période pour l'année scolaire de la classe,
+    déjà filtrées par l'appelant (modeles_commentaires.evaluations_eleve,
+    prompts_lot), les mêmes que pour le mode modèles. Les niveaux de toutes
+    les matières sont toujours conservés. Si le budget est dépassé, les
+    remarques d'évaluation sont raccourcies puis omises, en commençant par
+    celles des meilleurs niveaux puis des plus anciennes ; les observations
+    de l'enseignant ne sont tronquées qu'en dernier recours.
+    """
+    if budget is None:
+        budget = app.config['IA_BUDGET_PROMPT']
+    observations = _compacter(observations)
+    lignes = [
+        (evaluation.matiere.nom, evaluation.niveau or 'non évalué',
+         _compacter(evaluation.commentaire))
+        for evaluation in evaluations
+    ]
+
+    # Cas courant : tout tient dans le budget
+    remarques = {index: remarque for index, (_, _, remarque) in enumerate(lignes) if remarque}
+    prompt = _lignes_prompt(eleve, lignes, remarques, type_commentaire, observations, periode)
+    if _jetons_prompt(prompt) <= budget:
+        return '\n'.join(prompt)
+
+    reste = budget - _jetons_prompt(
+        _lignes_prompt(eleve, lignes, {}, type_commentaire, observations, periode))
+    if reste < 0 and observations:
+        observations = tronquer(observations, max(0, compter_jetons(observations) + reste))
+        reste = budget - _jetons_prompt(
+            _lignes_prompt(eleve, lignes, {}, type_commentaire, observations, periode))
+
+    # Remarques par priorité : niveaux les plus faibles, puis les plus récentes
+    ordre = [index for index, (_, _, remarque) in enumerate(lignes) if remarque]
+    ordre.sort(key=lambda index: evaluations[index].date_evaluation or datetime.min,
+               reverse=True)
+    ordre.sort(key=lambda index: NIVEAUX.index(evaluations[index].niveau)
+               if evaluations[index].niveau in NIVEAUX else len(NIVEAUX))
+    remarques = {}
+    for index in ordre:
+        remarque = lignes[index][2]
+        # « (remarque) » : deux jetons de parenthèses
+        if _jetons_ligne(remarque) + 2 > reste:
+            remarque = _resumer(remarque, reste - 2)
+            if compter_jetons(remarque) < JETONS_MIN_REMARQUE:
+                continue
+        remarques[index] = remarque
+        reste -= _jetons_ligne(remarque) + 2
+
+    return '\n'.join(
+        _lignes_prompt(eleve, lignes, remarques, type_commentaire, observations, periode))
+
+
+# ===== FOURNISSEURS =====
+
+MODELES_PAR_DEFAUT = {
+    'openai': 'gpt-3.5-turbo',
+    'local': 'llama2',
+    'bouchon': 'bouchon-lsu',
+}
+
+# Une instance par configuration : ses connexions HTTP sont réutilisées
+_fournisseurs = {}
+_fournisseurs_verrou = threading.Lock()
+
+
+def fournisseur_actif():
+    """Fournisseur choisi par les paramètres ia_fournisseur / ia_modele"""
+    nom = cache_parametres.valeur('ia_fournisseur', app.config['IA_FOURNISSEUR'])
+    modele = cache_parametres.valeur('ia_modele', app.config['IA_MODELE']) or \
+        MODELES_PAR_DEFAUT.get(nom)
+
+    with _fournisseurs_verrou:
+        fournisseur = _fournisseurs.get((nom, modele))
+        if fournisseur is None:
+            fournisseur = creer_fournisseur(nom, modele, app.config)
+            _fournisseurs[(nom, modele)] = fournisseur
+        return fournisseur
+
+
+def _messages(prompt):
+    return [
+        {"role": "system", "content": MESSAGE_SYSTEME},
+        {"role": "user", "content": prompt}
+    ]
+
+
+# Jetons signalés par le fournisseur pendant un appel, par thread
+_releves = threading.local()
+
+
+def _relever_jetons(fournisseur, jetons_prompt, jetons_reponse):
+    releve = getattr(_releves, 'courant', None)
+    if releve is not None:
+        releve['prompt'] = jetons_prompt
+        releve['reponse'] = jetons_reponse
+
+
+observateurs_jetons.append(_relever_jetons)
+
+
+@contextmanager
+def relever_jetons(releve=None):
+    """Dictionnaire rempli avec les jetons signalés par le fournisseur dans le bloc"""
+    releve = {} if releve is None else releve
+    precedent = getattr(_releves, 'courant', None)
+    _releves.courant = releve
+    try:
+        yield releve
+    finally:
+        _releves.courant = precedent
+
+
+def jetons_generation(prompt, contenu, releve=None):
+    """(jetons du prompt, jetons de la réponse) : ceux du fournisseur, sinon estimés"""
+    releve = releve or {}
+    return (releve.get('prompt') or compter_jetons_messages(_messages(prompt)),
+            releve.get('reponse') or compter_jetons(contenu))
+
+
+def appeler_ia(prompt, fournisseur=None, tentatives=None):
+    """Appel au modèle avec nouvelles tentatives (délai maximal par fournisseur)"""
+    fournisseur = fournisseur or fournisseur_actif()
+    tentatives = tentatives or app.config['IA_TENTATIVES']
+
+    for tentative in range(1, tentatives + 1):
+        try:
+            with metriques.mesurer_appel_ia(fournisseur):
+                return fournisseur.generer(_messages(prompt), MAX_TOKENS_IA,
+                                           TEMPERATURE_IA)
+        except Exception:
+            if tentative == tentatives:
+                raise
+            # Attente exponentielle avec gigue avant la tentative suivante
+            time.sleep(min(2 ** tentative, 30) * random.uniform(0.5, 1.0))
+
+
+def flux_ia(prompt, fournisseur=None, releve=None):
+    """Appel au modèle en streaming : produit les fragments au fil de l'eau
+
+    Pas de nouvelle tentative ici : un flux déjà commencé ne peut pas être
+    rejoué. La fermeture du générateur (client déconnecté) ferme la
+    connexion vers le modèle. releve reçoit les jetons signalés par le
+    fournisseur (voir relever_jetons).
+    """
+    fournisseur = fournisseur or fournisseur_actif()
+    source = fournisseur.flux(_messages(prompt), MAX_TOKENS_IA, TEMPERATURE_IA)
+    try:
+        with metriques.mesurer_appel_ia(fournisseur, 'flux'), relever_jetons(releve):
+            yield from source
+    finally:
+        source.close()
+
+
+def cle_prompt(prompt, fournisseur=None):
+    """Clé de cache d'un prompt pour le modèle et les réglages courants"""
+    fournisseur = fournisseur or fournisseur_actif()
+    return cache_ia.cle_generation(fournisseur.modele, MESSAGE_SYSTEME, prompt,
+                                   TEMPERATURE_IA)
+
+
+def generer_texte(prompt, forcer=False, fournisseur=None):
+    """Génération avec cache : renvoie (contenu, depuis_cache, (jetons prompt, réponse))"""
+    fournisseur = fournisseur or fournisseur_actif()
+    cle = cle_prompt(prompt, fournisseur)
+    if not forcer:
+        contenu = cache_ia.lire(cle)
+        if contenu is not None:
+            return contenu, True, jetons_generation(prompt, contenu)
+
+    with relever_jetons() as releve:
+        contenu = appeler_ia(prompt, fournisseur)
+    cache_ia.ecrire(cle, fournisseur.modele, contenu)
+    return contenu, False, jetons_generation(prompt, contenu, releve)
+
+
+# ===== GÉNÉRATION PAR LOT =====
+
+def prompts_lot(classe, type_commentaire, periode):
+    """Prompts de tous les élèves d'une classe : [{'eleve_id', 'eleve', 'prompt'}]
+
+    Les appels au modèle sont confiés à la file d'attente (file_attente.enfiler_lot).
+    """
+    eleves = Eleve.query.filter_by(classe_id=classe.id).order_by(
+        Eleve.nom, Eleve.prenom
+    ).all()
+
+    # Une seule requête pour toutes les évaluations de la classe, année de la
+    # classe et ordre des matières comme pour un élève seul
+    evaluations_par_eleve = {}
+    for evaluation in Evaluation.query.options(
+        joinedload(Evaluation.matiere)
+    ).filter_by(
+        classe_id=classe.id, periode=periode, annee_scolaire=classe.annee_scolaire
+    ).order_by(Evaluation.matiere_id, Evaluation.id).all():
+        evaluations_par_eleve.setdefault(evaluation.eleve_id, []).append(evaluation)
+
+    return [
+        {
+            'eleve_id': eleve.id,
+            'eleve': f"{eleve.prenom} {eleve.nom}",
+            'prompt': construire_prompt_ia(
+                eleve, evaluations_par_eleve.get(eleve.id, []),
+                type_commentaire, eleve.observations or '', periode
+            )
+        }
+        for eleve in eleves
+    ]
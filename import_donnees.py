@@ -0,0 +1,345 @@
+"""
+Import en masse des élèves et des évaluations (CSV, exports type ONDE, JSON
+Lines ou tableau JSON)
+Le fichier est lu ligne à ligne sans être chargé en mémoire ; chaque ligne est
+validée puis insérée par paquets (une transaction par paquet). Le résultat est
+un rapport des erreurs ligne par ligne.
+
+    python import_donnees.py eleves eleves.csv --utilisateur admin
+    python import_donnees.py evaluations notes.jsonl --utilisateur dupont.marie
+"""
+
+from app import app, db
+from models import User, Classe, Eleve, Matiere, Evaluation, NIVEAUX
+from synthese_niveaux import appliquer_deltas, CHAMPS_CLE
+from versions_donnees import incrementer as incrementer_versions
+from synchro import journaliser
+from sqlalchemy.dialects import postgresql, sqlite
+from collections import Counter
+from datetime import datetime
+import argparse
+import cache_parametres
+import csv
+import io
+import itertools
+import json
+import unicodedata
+
+
+TAILLE_PAQUET = 1000
+TAILLE_LECTURE_JSON = 65536  # caractères lus à la fois dans un tableau JSON
+MAX_ERREURS_RAPPORTEES = 1000
+
+# En-têtes acceptés (normalisés : minuscules, sans accents ni séparateurs)
+ALIAS_COLONNES = {
+    'nom': 'nom', 'nomeleve': 'nom', 'nomdefamille': 'nom', 'nomdusage': 'nom',
+    'prenom': 'prenom', 'prenomeleve': 'prenom', 'prenom1': 'prenom',
+    'datenaissance': 'date_naissance', 'datedenaissance': 'date_naissance',
+    'nele': 'date_naissance', 'nee': 'date_naissance',
+    'classe': 'classe', 'classeid': 'classe_id', 'idclasse': 'classe_id',
+    'anneescolaire': 'annee_scolaire', 'annee': 'annee_scolaire',
+    'observations': 'observations',
+    'eleveid': 'eleve_id', 'ideleve': 'eleve_id',
+    'matiere': 'matiere', 'codematiere': 'matiere',
+    'periode': 'periode', 'niveau': 'niveau', 'commentaire': 'commentaire',
+}
+
+
+class ErreurLigne(ValueError):
+    """Ligne invalide : le message est reporté dans le rapport d'import"""
+
+
+def _normaliser_entete(entete):
+    sans_accents = unicodedata.normalize('NFKD', entete or '').encode(
+        'ascii', 'ignore').decode('ascii')
+    return ''.join(c for c in sans_accents.lower() if c.isalnum())
+
+
+def _ligne_json(objet):
+    if not isinstance(objet, dict):
+        return ErreurLigne("objet JSON attendu")
+    return {ALIAS_COLONNES.get(_normaliser_entete(k), k):
+            v if v is None else str(v).strip()
+            for k, v in objet.items()}
+
+
+def _elements_tableau(texte, numero):
+    """(numéro de ligne, élément) d'un tableau JSON (après son « [ », situé
+    ligne numero), décodés au fil de la lecture"""
+    decodeur = json.JSONDecoder()
+    tampon, fin = '', False
+    while True:
+        reste = tampon.lstrip(' \t\r\n,')
+        numero += tampon.count('\n', 0, len(tampon) - len(reste))
+        tampon = reste
+        if tampon.startswith(']'):
+            return
+        if tampon:
+            try:
+                objet, position = decodeur.raw_decode(tampon)
+            except ValueError as e:
+                if fin:
+                    yield numero, ErreurLigne(f"JSON invalide : {e}")
+                    return
+            else:
+                yield numero, objet
+                numero += tampon.count('\n', 0, position)
+                tampon = tampon[position:]
+                continue
+        elif fin:
+            yield numero, ErreurLigne("tableau JSON non terminé (« ] » manquant)")
+            return
+        # Élément coupé en fin de tampon (ou tampon vide) : lecture de la suite
+        morceau = texte.read(TAILLE_LECTURE_JSON)
+        fin = not morceau
+        tampon += morceau
+
+
+def lire_lignes(flux_binaire, format_fichier, encodage='utf-8-sig'):
+    """Produit (numéro de ligne, dict) pour chaque ligne du fichier, une à la fois
+
+    Le numéro est celui de la ligne du fichier source où commence
+    l'enregistrement. Une ligne illisible est produite sous forme d'ErreurLigne.
+    """
+    texte = io.TextIOWrapper(flux_binaire, encoding=encodage, newline='')
+    if format_fichier in ('jsonl', 'ndjson', 'json'):
+        numero = 1
+        debut = texte.read(1)
+        while debut.isspace():
+            numero += debut == '\n'
+            debut = texte.read(1)
+        if debut == '[':
+            # Tableau JSON (export .json classique)
+            for numero, objet in _elements_tableau(texte, numero):
+                yield numero, (objet if isinstance(objet, ErreurLigne)
+                               else _ligne_json(objet))
+            return
+        # JSON Lines : un objet par ligne, lignes vides comprises dans la numérotation
+        for numero, ligne in enumerate(
+                itertools.chain([debut + texte.readline()], texte), start=numero):
+            if not ligne.strip():
+                continue
+            try:
+                objet = json.loads(ligne)
+            except ValueError as e:
+                yield numero, ErreurLigne(f"JSON invalide : {e}")
+                continue
+            yield numero, _ligne_json(objet)
+        return
+
+    # CSV : séparateur « ; » des exports ONDE ou « , »
+    premiere = texte.readline()
+    separateur = ';' if premiere.count(';') >= premiere.count(',') else ','
+    entetes = [ALIAS_COLONNES.get(_normaliser_entete(e), e)
+               for e in next(csv.reader([premiere], delimiter=separateur))]
+    lecteur = csv.reader(texte, delimiter=separateur)
+    fin_precedente = 1  # ligne 1 : en-têtes
+    for valeurs in lecteur:
+        # Un champ entre guillemets peut s'étendre sur plusieurs lignes
+        numero, fin_precedente = fin_precedente + 1, 1 + lecteur.line_num
+        if any(v.strip() for v in valeurs):
+            yield numero, dict(zip(entetes, (v.strip() for v in valeurs)))
+
+
+def _date(valeur):
+    for format_date in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(valeur, format_date).date()
+        except (TypeError, ValueError):
+            continue
+    raise ErreurLigne(f"date invalide : {valeur!r}")
+
+
+def _obligatoire(ligne, champ):
+    valeur = ligne.get(champ)
+    if valeur in (None, ''):
+        raise ErreurLigne(f"{champ} manquant")
+    return valeur
+
+
+class ImportDonnees:
+    """Import d'un fichier pour un utilisateur (droits limités à ses classes)"""
+
+    def __init__(self, utilisateur):
+        self.utilisateur = utilisateur
+        requete = Classe.query
+        if utilisateur.role != 'admin':
+            requete = requete.filter_by(enseignant_id=utilisateur.id)
+        # Index préchargés : aucune requête par ligne pour les droits
+        self.classes = {c.id: c for c in requete.all()}
+        self.classes_par_nom = {(c.nom, c.annee_scolaire): c.id
+                                for c in self.classes.values()}
+        self.annee_courante = cache_parametres.valeur('annee_scolaire_courante')
+        self.rapport = {'lignes': 0, 'importees': 0, 'erreurs': 0, 'details': []}
+
+    def _erreur(self, numero, message):
+        self.rapport['erreurs'] += 1
+        if len(self.rapport['details']) < MAX_ERREURS_RAPPORTEES:
+            self.rapport['details'].append({'ligne': numero, 'erreur': message})
+
+    def _par_paquets(self, lignes, valider, inserer):
+        paquet = []
+        for numero, ligne in lignes:
+            self.rapport['lignes'] += 1
+            try:
+                if isinstance(ligne, ErreurLigne):
+                    raise ligne
+                paquet.append(valider(ligne))
+            except ErreurLigne as e:
+                self._erreur(numero, str(e))
+            if len(paquet) >= TAILLE_PAQUET:
+                inserer(paquet)
+                paquet = []
+        if paquet:
+            inserer(paquet)
+        return self.rapport
+
+    def _enseignants(self, paquet):
+        return {self.classes[ligne['classe_id']].enseignant_id for ligne in paquet}
+
+    # ----- Élèves -----
+
+    def _valider_eleve(self, ligne):
+        if ligne.get('classe_id'):
+            try:
+                classe_id = int(ligne['classe_id'])
+            except ValueError:
+                raise ErreurLigne(f"classe_id invalide : {ligne['classe_id']!r}")
+        else:
+            annee = ligne.get('annee_scolaire') or self.annee_courante
+            classe_id = self.classes_par_nom.get(
+                (_obligatoire(ligne, 'classe'), annee))
+        if classe_id not in self.classes:
+            raise ErreurLigne("classe inconnue ou non autorisée")
+        return {
+            'nom': _obligatoire(ligne, 'nom')[:100],
+            'prenom': _obligatoire(ligne, 'prenom')[:100],
+            'date_naissance': _date(_obligatoire(ligne, 'date_naissance')),
+            'classe_id': classe_id,
+            'observations': ligne.get('observations') or None,
+            'date_creation': datetime.utcnow(),
+        }
+
+    def _inserer_eleves(self, paquet):
+        with db.engine.begin() as connexion:
+            table = Eleve.__table__
+            inserees = connexion.execute(
+                table.insert().returning(table.c.id, table.c.classe_id), paquet).all()
+            journaliser(connexion, 'eleves', inserees)
+            incrementer_versions(connexion, self._enseignants(paquet))
+        self.rapport['importees'] += len(inserees)
+
+    def importer_eleves(self, lignes):
+        return self._par_paquets(lignes, self._valider_eleve,
+                                 self._inserer_eleves)
+
+    # ----- Évaluations -----
+
+    def _preparer_evaluations(self):
+        self.matieres = {m.code: m.id for m in Matiere.query.all()}
+        self.eleves = dict(
+            db.session.query(Eleve.id, Eleve.classe_id)
+            .filter(Eleve.classe_id.in_(list(self.classes))).all()
+        ) if self.classes else {}
+
+    def _valider_evaluation(self, ligne):
+        eleve_id = _obligatoire(ligne, 'eleve_id')
+        try:
+            eleve_id = int(eleve_id)
+        except ValueError:
+            raise ErreurLigne(f"eleve_id invalide : {eleve_id!r}")
+        if eleve_id not in self.eleves:
+            raise ErreurLigne("élève inconnu ou non autorisé")
+        matiere_id = self.matieres.get(_obligatoire(ligne, 'matiere'))
+        if matiere_id is None:
+            raise ErreurLigne(f"matière inconnue : {ligne['matiere']!r}")
+        niveau = ligne.get('niveau') or None
+        if niveau is not None and niveau not in NIVEAUX:
+            raise ErreurLigne(f"niveau invalide : {niveau!r}")
+        classe_id = self.eleves[eleve_id]
+        return {
+            'eleve_id': eleve_id,
+            'matiere_id': matiere_id,
+            'classe_id': classe_id,
+            'periode': _obligatoire(ligne, 'periode')[:20],
+            'annee_scolaire': (ligne.get('annee_scolaire')
+                               or self.classes[classe_id].annee_scolaire),
+            'niveau': niveau,
+            'commentaire': ligne.get('commentaire') or None,
+            'date_evaluation': datetime.utcnow(),
+        }
+
+    def _inserer_evaluations(self, paquet):
+        # Doublons dans un même paquet : la dernière ligne l'emporte
+        uniques = {}
+        for ligne in paquet:
+            uniques[(ligne['eleve_id'], ligne['matiere_id'], ligne['periode'],
+                     ligne['annee_scolaire'])] = ligne
+        table = Evaluation.__table__
+        with db.engine.begin() as connexion:
+            # Niveaux existants, pour tenir la synthèse à jour lors de l'upsert
+            existantes = {
+                (r.eleve_id, r.matiere_id, r.periode, r.annee_scolaire):
+                    tuple(getattr(r, champ) for champ in CHAMPS_CLE)
+                for r in connexion.execute(db.select(
+                    table.c.eleve_id, *[table.c[c] for c in CHAMPS_CLE]
+                ).where(table.c.eleve_id.in_({k[0] for k in uniques})))
+            }
+            deltas = Counter()
+            for cle, ligne in uniques.items():
+                if cle in existantes and existantes[cle][-1] is not None:
+                    deltas[existantes[cle]] -= 1
+                if ligne['niveau'] is not None:
+                    deltas[tuple(ligne[c] for c in CHAMPS_CLE)] += 1
+
+            insert = postgresql.insert if connexion.dialect.name == 'postgresql' \
+                else sqlite.insert
+            instruction = insert(table)
+            ecrites = connexion.execute(instruction.on_conflict_do_update(
+                index_elements=['eleve_id', 'matiere_id', 'periode',
+                                'annee_scolaire'],
+                set_={c: instruction.excluded[c] for c in
+                      ('classe_id', 'niveau', 'commentaire', 'date_evaluation')}
+            ).returning(table.c.id, table.c.classe_id), list(uniques.values())).all()
+            journaliser(connexion, 'evaluations', ecrites)
+            appliquer_deltas(connexion, deltas)
+            incrementer_versions(connexion, self._enseignants(paquet))
+        # Lignes réellement écrites : les doublons d'un même paquet comptent une fois
+        self.rapport['importees'] += len(ecrites)
+
+    def importer_evaluations(self, lignes):
+        self._preparer_evaluations()
+        return self._par_paquets(lignes, self._valider_evaluation,
+                                 self._inserer_evaluations)
+
+    def importer(self, type_import, lignes):
+        if type_import == 'eleves':
+            return self.importer_eleves(lignes)
+        if type_import == 'evaluations':
+            return self.importer_evaluations(lignes)
+        raise ValueError(f"Type d'import inconnu : {type_import}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import en masse LSU")
+    parser.add_argument('type_import', choices=['eleves', 'evaluations'])
+    parser.add_argument('fichier')
+    parser.add_argument('--utilisateur', required=True,
+                        help="identifiant du compte dont les droits s'appliquent")
+    parser.add_argument('--encodage', default='utf-8-sig')
+    args = parser.parse_args()
+
+    format_fichier = args.fichier.rsplit('.', 1)[-1].lower()
+    with app.app_context():
+        utilisateur = User.query.filter_by(username=args.utilisateur).first()
+        if utilisateur is None:
+            parser.error(f"utilisateur inconnu : {args.utilisateur}")
+        debut = datetime.utcnow()
+        with open(args.fichier, 'rb') as flux:
+            rapport = ImportDonnees(utilisateur).importer(
+                args.type_import, lire_lignes(flux, format_fichier, args.encodage))
+        duree = (datetime.utcnow() - debut).total_seconds()
+        print(f"✅ {rapport['importees']} ligne(s) importée(s) sur "
+              f"{rapport['lignes']} en {duree:.1f} s")
+        for detail in rapport['details']:
+            print(f"   ⚠️  ligne {detail['ligne']} : {detail['erreur']}")
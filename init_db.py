@@ -1,13 +1,20 @@
 """
 Script d'initialisation de la base de données LSU École du Cap
 Crée les tables et ajoute des données de test
+
+    python init_db.py                      # données de démonstration
+    python init_db.py --volume --ecoles 10 --classes 20 --annees 3
 """
 
 from app import app, db
 from models import User, Classe, Eleve, Matiere, Evaluation, Commentaire, Parametre
+from migrations import appliquer_migrations
 from werkzeug.security import generate_password_hash
 from datetime import datetime, date
+import argparse
+import donnees_volume
 import json
+import time
 
 
 def init_database():
@@ -16,6 +23,9 @@ def init_database():
     with app.app_context():
         # Création des tables
         db.create_all()
+        for version, description, rapport in appliquer_migrations():
+            if rapport:
+                print(f"⚠️  Migration {version} : {rapport}")
         
         print("✅ Tables créées avec succès")
         
@@ -243,6 +253,18 @@ def init_database():
                 'description': 'Activation du générateur IA',
                 'type_valeur': 'bool'
             },
+            {
+                'cle': 'ia_fournisseur',
+                'valeur': 'openai',
+                'description': 'Fournisseur IA : openai, local (Ollama) ou bouchon (hors ligne)',
+                'type_valeur': 'string'
+            },
+            {
+                'cle': 'ia_modele',
+                'valeur': '',
+                'description': 'Modèle IA (vide : modèle par défaut du fournisseur)',
+                'type_valeur': 'string'
+            },
             {
                 'cle': 'max_eleves_par_classe',
                 'valeur': '25',
@@ -272,4 +294,31 @@ def init_database():
 
 
 if __name__ == '__main__':
-    init_database() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Initialisation de la base LSU")
+    parser.add_argument('--volume', action='store_true',
+                        help="ajoute un jeu de données synthétique à grande échelle")
+    parser.add_argument('--ecoles', type=int, default=1)
+    parser.add_argument('--classes', type=int, default=10, help="classes par école")
+    parser.add_argument('--eleves', type=int, default=25, help="élèves par classe")
+    parser.add_argument('--matieres', type=int, default=8)
+    parser.add_argument('--periodes', type=int, default=4, choices=range(1, 6))
+    parser.add_argument('--annees', type=int, default=1, help="années scolaires évaluées")
+    parser.add_argument('--competences', type=int, default=0,
+                        help="compétences évaluées par évaluation")
+    parser.add_argument('--sans-commentaires', action='store_true')
+    parser.add_argument('--graine', type=int, default=42)
+    args = parser.parse_args()
+
+    init_database()
+    if args.volume:
+        print("\n📦 Génération des données de volume...")
+        debut = time.perf_counter()
+        with app.app_context():
+            comptes = donnees_volume.generer(
+                ecoles=args.ecoles, classes=args.classes, eleves=args.eleves,
+                matieres=args.matieres, periodes=args.periodes, annees=args.annees,
+                competences=args.competences,
+                commentaires=not args.sans_commentaires, graine=args.graine)
+        print(f"✅ Données de volume générées en {time.perf_counter() - debut:.1f} s")
+        for table, nombre in comptes.items():
+            print(f"   {table}: {nombre}") 
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""
+Estimation locale du nombre de jetons (tokens) pour le système LSU École du Cap
+Sans appel au fournisseur ni tokenizer externe : approximation d'un tokenizer
+BPE de type GPT sur du texte français (un mot court = un jeton, un jeton de
+plus par tranche de quatre caractères et pour les accents, un jeton par
+ponctuation, par saut de ligne et par espace superflu). Sert au budget des
+prompts (generation_ia) et au relevé des jetons quand le fournisseur n'en
+donne pas.
+"""
+
+import re
+
+
+# Mots, nombres, ponctuation isolée, sauts de ligne et suites d'espaces
+_MORCEAUX = re.compile(r"\w+|[^\w\s]|\n| {2,}|\t+")
+# Mêmes morceaux, mots et autres comptés séparément par compter_jetons
+_MOTS = re.compile(r"\w+")
+_AUTRES = re.compile(r"[^\w\s]|\n| {2,}|\t+")
+
+# Jetons ajoutés par message dans le format de conversation (rôle, séparateurs)
+JETONS_PAR_MESSAGE = 4
+JETONS_REPONSE = 3
+
+
+def _jetons_morceau(morceau):
+    if morceau[0].isalnum() or morceau[0] == '_':
+        jetons = 1 + (len(morceau) - 1) // 4
+        if not morceau.isascii():
+            jetons += 1
+        return jetons
+    return 1
+
+
+def compter_jetons(texte):
+    """Nombre de jetons estimé d'un texte"""
+    if not texte:
+        return 0
+    return (sum((len(mot) + 3) // 4 + (not mot.isascii()) for mot in _MOTS.findall(texte))
+            + len(_AUTRES.findall(texte)))
+
+
+def compter_jetons_messages(messages):
+    """Jetons du prompt complet (messages système et utilisateur)"""
+    return JETONS_REPONSE + sum(JETONS_PAR_MESSAGE + compter_jetons(m['content'])
+                                for m in messages)
+
+
+def tronquer(texte, jetons_max, suite='…'):
+    """Début du texte tenant en jetons_max jetons, coupé entre deux mots
+
+    Renvoie '' si même le premier mot ne tient pas.
+    """
+    if compter_jetons(texte) <= jetons_max:
+        return texte
+    jetons_max -= compter_jetons(suite)
+    total, fin = 0, 0
+    for morceau in _MORCEAUX.finditer(texte):
+        total += _jetons_morceau(morceau.group())
+        if total > jetons_max:
+            break
+        if morceau.group()[0].isalnum():
+            fin = morceau.end()
+    resultat = texte[:fin].rstrip(' ,;:-')
+    return resultat + suite if resultat else ''
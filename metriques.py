@@ -0,0 +1,234 @@
+"""
+Métriques Prometheus du système LSU École du Cap
+- /metrics : latence des requêtes par vue et statut, requêtes en cours,
+  requêtes SQL par requête HTTP, appels IA (latence, jetons, erreurs),
+  taille des fichiers envoyés ;
+- /api/metrics : indicateurs métier (effectifs, évaluations, file IA),
+  recalculés au plus une fois par METRIQUES_TTL secondes.
+
+Les deux points d'accès sont réservés au collecteur : jeton
+(Authorization: Bearer METRIQUES_JETON) ou adresse dans METRIQUES_IPS
+(par défaut la seule boucle locale).
+
+Avec plusieurs processus (gunicorn, workers de file_attente.py), définir
+PROMETHEUS_MULTIPROC_DIR vers un dossier partagé et vidé au démarrage.
+"""
+
+from app import app, db
+from models import Classe, Eleve, Evaluation, Commentaire, TacheIA, CacheIA
+from flask import g, request
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram,
+                               REGISTRY, generate_latest, CONTENT_TYPE_LATEST,
+                               multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import fournisseurs_ia
+import hmac
+import ipaddress
+import os
+import threading
+import time
+
+
+DUREES_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DUREES_IA = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+TAILLES_UPLOAD = (10e3, 100e3, 500e3, 1e6, 2e6, 5e6, 10e6, 16e6)
+
+REQUETES_HTTP = Histogram(
+    'lsu_http_requete_duree_secondes', "Durée des requêtes HTTP",
+    ['vue', 'methode', 'statut'], buckets=DUREES_HTTP)
+REQUETES_EN_COURS = Gauge(
+    'lsu_http_requetes_en_cours', "Requêtes HTTP en cours de traitement",
+    multiprocess_mode='livesum')
+SQL_PAR_REQUETE = Histogram(
+    'lsu_sql_requetes_par_requete_http', "Requêtes SQL exécutées par requête HTTP",
+    ['vue'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100))
+SQL_DUREE = Histogram(
+    'lsu_sql_duree_par_requete_http_secondes',
+    "Temps passé en base par requête HTTP", ['vue'], buckets=DUREES_HTTP)
+IA_DUREE = Histogram(
+    'lsu_ia_appel_duree_secondes', "Durée des appels au modèle IA",
+    ['fournisseur', 'mode'], buckets=DUREES_IA)
+IA_ERREURS = Counter(
+    'lsu_ia_erreurs', "Appels au modèle IA en échec", ['fournisseur', 'mode'])
+IA_JETONS = Counter(
+    'lsu_ia_jetons', "Jetons consommés par les appels IA", ['fournisseur', 'type'])
+UPLOADS = Histogram(
+    'lsu_upload_taille_octets', "Taille des fichiers envoyés", ['vue'],
+    buckets=TAILLES_UPLOAD)
+
+
+# ----- Accès -----
+
+_reseaux_autorises = [ipaddress.ip_network(reseau.strip(), strict=False)
+                      for reseau in app.config['METRIQUES_IPS'].split(',')
+                      if reseau.strip()]
+
+
+def acces_autorise():
+    """Requête du collecteur : jeton valide ou adresse autorisée"""
+    jeton = app.config['METRIQUES_JETON']
+    if jeton:
+        entete = request.headers.get('Authorization', '')
+        if entete.startswith('Bearer ') and hmac.compare_digest(
+                entete[len('Bearer '):].encode(), jeton.encode()):
+            return True
+    try:
+        adresse = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return any(adresse in reseau for reseau in _reseaux_autorises)
+
+
+# ----- Requêtes HTTP et SQL -----
+
+_requete_http = threading.local()
+
+
+@app.before_request
+def _debut_requete():
+    REQUETES_EN_COURS.inc()
+    g.metriques_debut = time.perf_counter()
+    _requete_http.sql = [0, 0.0]  # nombre, durée
+    if request.mimetype == 'multipart/form-data' and request.content_length:
+        UPLOADS.labels(request.endpoint or 'aucune').observe(request.content_length)
+
+
+@app.after_request
+def _statut_requete(response):
+    g.metriques_statut = response.status_code
+    return response
+
+
+@app.teardown_request
+def _fin_requete(exception):
+    debut = g.pop('metriques_debut', None)
+    if debut is None:
+        return
+    REQUETES_EN_COURS.dec()
+    vue = request.endpoint or 'aucune'  # 404 : une seule série
+    REQUETES_HTTP.labels(vue, request.method,
+                         g.pop('metriques_statut', 500)).observe(
+        time.perf_counter() - debut)
+    sql = getattr(_requete_http, 'sql', None)
+    if sql is not None:
+        SQL_PAR_REQUETE.labels(vue).observe(sql[0])
+        SQL_DUREE.labels(vue).observe(sql[1])
+        _requete_http.sql = None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _debut_sql(conn, cursor, statement, parameters, context, executemany):
+    context.metriques_debut = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _fin_sql(conn, cursor, statement, parameters, context, executemany):
+    sql = getattr(_requete_http, 'sql', None)
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += time.perf_counter() - getattr(context, 'metriques_debut',
+                                                time.perf_counter())
+
+
+# ----- Appels IA -----
+
+def mesurer_appel_ia(fournisseur, mode='generation'):
+    """Chronomètre d'un appel au modèle : with mesurer_appel_ia(f): ..."""
+    return _AppelIA(fournisseur.nom, mode)
+
+
+class _AppelIA:
+
+    def __init__(self, fournisseur, mode):
+        self.etiquettes = (fournisseur, mode)
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, type_exception, exception, trace):
+        IA_DUREE.labels(*self.etiquettes).observe(time.perf_counter() - self.debut)
+        if exception is not None and not isinstance(exception, GeneratorExit):
+            IA_ERREURS.labels(*self.etiquettes).inc()
+        return False
+
+
+def _compter_jetons(fournisseur, jetons_prompt, jetons_reponse):
+    if jetons_prompt:
+        IA_JETONS.labels(fournisseur, 'prompt').inc(jetons_prompt)
+    if jetons_reponse:
+        IA_JETONS.labels(fournisseur, 'reponse').inc(jetons_reponse)
+
+
+fournisseurs_ia.observateurs_jetons.append(_compter_jetons)
+
+
+# ----- Indicateurs métier (/api/metrics) -----
+
+INDICATEURS = [
+    ('lsu_classes', "Classes enregistrées", Classe),
+    ('lsu_eleves', "Élèves enregistrés", Eleve),
+    ('lsu_evaluations', "Évaluations enregistrées", Evaluation),
+    ('lsu_commentaires', "Commentaires enregistrés", Commentaire),
+    ('lsu_cache_ia_entrees', "Entrées du cache IA persistant", CacheIA),
+]
+
+
+class IndicateursMetier:
+    """Comptages en base, gardés METRIQUES_TTL secondes entre deux collectes"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._valeurs = None  # (instant, comptes, tâches)
+
+    def describe(self):
+        # Évite une collecte (et des requêtes) à l'enregistrement
+        return []
+
+    def _compter(self):
+        with app.app_context():
+            comptes = [db.session.query(modele).count() for _, _, modele in INDICATEURS]
+            taches = db.session.query(
+                TacheIA.type_tache, TacheIA.statut, db.func.count()
+            ).group_by(TacheIA.type_tache, TacheIA.statut).all()
+        return comptes, taches
+
+    def valeurs(self):
+        """(comptes, tâches), recalculés une fois le délai écoulé"""
+        with self._verrou:
+            maintenant = time.monotonic()
+            if (self._valeurs is None
+                    or maintenant - self._valeurs[0] >= app.config['METRIQUES_TTL']):
+                self._valeurs = (maintenant, *self._compter())
+            return self._valeurs[1:]
+
+    def collect(self):
+        comptes, lignes_taches = self.valeurs()
+        for (nom, description, _), valeur in zip(INDICATEURS, comptes):
+            yield GaugeMetricFamily(nom, description, value=valeur)
+        taches = GaugeMetricFamily('lsu_taches_ia', "Tâches de la file IA par statut",
+                                   labels=['type', 'statut'])
+        for type_tache, statut, nombre in lignes_taches:
+            taches.add_metric([type_tache, statut], nombre)
+        yield taches
+
+
+_registre_metier = CollectorRegistry()
+_registre_metier.register(IndicateursMetier())
+
+
+def exposer():
+    """Corps et type de la réponse /metrics"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registre = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registre)
+    else:
+        registre = REGISTRY
+    return generate_latest(registre), CONTENT_TYPE_LATEST
+
+
+def exposer_metier():
+    """Corps et type de la réponse /api/metrics"""
+    return generate_latest(_registre_metier), CONTENT_TYPE_LATEST
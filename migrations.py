@@ -0,0 +1,286 @@
+"""
+Migrations du schéma de la base LSU École du Cap
+db.create_all() ne crée que les tables absentes : les index et contraintes
+ajoutés aux tables existantes passent par ces migrations numérotées. La
+version appliquée est enregistrée dans la table schema_version.
+
+    python migrations.py            # applique les migrations en attente
+    python migrations.py --statut   # affiche la version courante
+"""
+
+from app import app, db
+from models import (CacheIA, TacheIA, EvaluationCompetence, SyntheseNiveaux,
+                    VersionParametres, VersionDonnees, VersionUtilisateurs,
+                    JournalSynchro, EvaluationArchive, EvaluationCompetenceArchive,
+                    CommentaireArchive, AnneeArchivee)
+from synthese_niveaux import reconstruire as reconstruire_synthese
+from datetime import datetime
+import archivage
+import argparse
+import json
+import recherche
+import synchro
+
+
+def _creer_tables_ia(connexion):
+    """Tables du cache et de la file d'attente IA"""
+    CacheIA.__table__.create(connexion, checkfirst=True)
+    TacheIA.__table__.create(connexion, checkfirst=True)
+
+
+def _index_chemins_critiques(connexion):
+    """Index composites des requêtes d'évaluation, de commentaires et de classes"""
+    # Doublons éventuels : l'évaluation la plus récente reste en place, les
+    # autres sont mises de côté dans evaluation_doublon (à revoir à la main)
+    # avant de poser l'index unique
+    doublons = """
+        SELECT id FROM evaluation WHERE id NOT IN (
+            SELECT MAX(id) FROM evaluation
+            GROUP BY eleve_id, matiere_id, periode, annee_scolaire
+        )
+    """
+    nombre = connexion.execute(db.text(f"SELECT COUNT(*) FROM ({doublons}) d")).scalar()
+    if nombre:
+        connexion.execute(db.text(
+            "CREATE TABLE IF NOT EXISTS evaluation_doublon AS "
+            "SELECT evaluation.*, CURRENT_TIMESTAMP AS date_mise_de_cote "
+            "FROM evaluation WHERE 1 = 0"))
+        connexion.execute(db.text(
+            f"INSERT INTO evaluation_doublon SELECT evaluation.*, CURRENT_TIMESTAMP "
+            f"FROM evaluation WHERE id IN ({doublons})"))
+        connexion.execute(db.text(f"DELETE FROM evaluation WHERE id IN ({doublons})"))
+    for instruction in [
+        "CREATE INDEX IF NOT EXISTS ix_classe_enseignant_nom "
+        "ON classe (enseignant_id, nom)",
+        "CREATE INDEX IF NOT EXISTS ix_eleve_classe ON eleve (classe_id)",
+        "CREATE INDEX IF NOT EXISTS ix_evaluation_eleve_periode "
+        "ON evaluation (eleve_id, periode)",
+        "CREATE INDEX IF NOT EXISTS ix_evaluation_classe_date "
+        "ON evaluation (classe_id, date_evaluation)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_evaluation_eleve_matiere_periode_annee "
+        "ON evaluation (eleve_id, matiere_id, periode, annee_scolaire)",
+        "CREATE INDEX IF NOT EXISTS ix_commentaire_eleve_periode "
+        "ON commentaire (eleve_id, periode)",
+    ]:
+        connexion.execute(db.text(instruction))
+    if nombre:
+        return (f"{nombre} évaluation(s) en double copiée(s) dans evaluation_doublon "
+                f"puis retirée(s) (la plus récente de chaque groupe est conservée)")
+
+
+def _competences_normalisees(connexion, taille_lot=5000):
+    """Table EvaluationCompetence alimentée depuis l'ancien JSON des évaluations
+
+    Seul le JSON des évaluations reprises est effacé : celles dont le JSON est
+    illisible, n'est pas un objet ou contient un code ou un niveau trop long
+    gardent leur JSON intact et sont listées dans le rapport.
+    """
+    EvaluationCompetence.__table__.create(connexion, checkfirst=True)
+    table = EvaluationCompetence.__table__
+    longueur_code = table.c.code.type.length
+    longueur_niveau = table.c.niveau.type.length
+    ignorees = []
+    dernier_id = 0
+    while True:
+        lignes = connexion.execute(db.text(
+            "SELECT id, competences FROM evaluation "
+            "WHERE id > :dernier AND competences IS NOT NULL "
+            "ORDER BY id LIMIT :taille"
+        ), {'dernier': dernier_id, 'taille': taille_lot}).fetchall()
+        if not lignes:
+            break
+        valeurs, reprises = [], []
+        for evaluation_id, contenu in lignes:
+            try:
+                competences = json.loads(contenu) or {}
+            except ValueError:
+                ignorees.append(evaluation_id)
+                continue
+            if not isinstance(competences, dict):
+                ignorees.append(evaluation_id)
+                continue
+            lignes_evaluation = [
+                {'evaluation_id': evaluation_id, 'code': str(code),
+                 'niveau': niveau if isinstance(niveau, str) else json.dumps(niveau)}
+                for code, niveau in competences.items() if niveau is not None
+            ]
+            if any(len(ligne['code']) > longueur_code or
+                   len(ligne['niveau']) > longueur_niveau for ligne in lignes_evaluation):
+                ignorees.append(evaluation_id)
+                continue
+            valeurs += lignes_evaluation
+            reprises.append(evaluation_id)
+        if valeurs:
+            connexion.execute(table.insert(), valeurs)
+        if reprises:
+            connexion.execute(
+                db.text("UPDATE evaluation SET competences = NULL WHERE id IN :ids")
+                .bindparams(db.bindparam('ids', expanding=True)), {'ids': reprises})
+        dernier_id = lignes[-1][0]
+    if ignorees:
+        return (f"{len(ignorees)} évaluation(s) non reprise(s), JSON des compétences "
+                f"conservé (illisible, pas un objet ou valeur trop longue) : "
+                f"id {', '.join(map(str, ignorees))}")
+
+
+def _synthese_niveaux(connexion):
+    """Table de synthèse des niveaux, calculée depuis les évaluations existantes"""
+    SyntheseNiveaux.__table__.create(connexion, checkfirst=True)
+    reconstruire_synthese(connexion)
+
+
+def _version_parametres(connexion):
+    """Compteur de version des paramètres, partagé par tous les processus"""
+    VersionParametres.__table__.create(connexion, checkfirst=True)
+    if connexion.execute(db.text("SELECT COUNT(*) FROM parametre_version")).scalar() == 0:
+        connexion.execute(db.text(
+            "INSERT INTO parametre_version (id, version) VALUES (1, 0)"))
+
+
+def _index_pagination_api(connexion):
+    """Index (classe, id) des pages d'évaluations de l'API JSON"""
+    connexion.execute(db.text(
+        "CREATE INDEX IF NOT EXISTS ix_evaluation_classe_id ON evaluation (classe_id, id)"))
+
+
+def _index_recherche(connexion):
+    """Index plein texte FTS5 (SQLite) des commentaires, évaluations et élèves"""
+    recherche.creer_index(connexion)
+
+
+def _version_donnees(connexion):
+    """Version des données par enseignant (requêtes conditionnelles, fragments)"""
+    VersionDonnees.__table__.create(connexion, checkfirst=True)
+
+
+def _journal_synchro(connexion):
+    """Journal de synchronisation, rempli avec les lignes existantes"""
+    JournalSynchro.__table__.create(connexion, checkfirst=True)
+    synchro.initialiser_journal(connexion)
+
+
+def _archives(connexion):
+    """Tables d'archive des années closes et vues historiques (courant + archive)"""
+    for modele in (EvaluationArchive, EvaluationCompetenceArchive,
+                   CommentaireArchive, AnneeArchivee):
+        modele.__table__.create(connexion, checkfirst=True)
+    archivage.creer_vues(connexion)
+
+
+def _jetons_commentaires(connexion):
+    """Colonnes jetons_prompt / jetons_reponse des commentaires (et archives)"""
+    for table in ('commentaire', 'commentaire_archive'):
+        colonnes = {c['name'] for c in db.inspect(connexion).get_columns(table)}
+        for colonne in ('jetons_prompt', 'jetons_reponse'):
+            if colonne not in colonnes:
+                connexion.execute(db.text(
+                    f"ALTER TABLE {table} ADD COLUMN {colonne} INTEGER"))
+    archivage.creer_vues(connexion)
+
+
+def _lots_file_attente(connexion):
+    """Colonne lot_id des tâches IA : génération d'une classe par la file d'attente"""
+    colonnes = {c['name'] for c in db.inspect(connexion).get_columns('tache_ia')}
+    if 'lot_id' not in colonnes:
+        connexion.execute(db.text("ALTER TABLE tache_ia ADD COLUMN lot_id VARCHAR(32)"))
+    connexion.execute(db.text(
+        "CREATE INDEX IF NOT EXISTS ix_tache_ia_lot_id ON tache_ia (lot_id)"))
+
+
+def _version_utilisateurs(connexion):
+    """Compteur de version des utilisateurs et classes, partagé par tous les processus"""
+    VersionUtilisateurs.__table__.create(connexion, checkfirst=True)
+    if connexion.execute(db.text("SELECT COUNT(*) FROM utilisateur_version")).scalar() == 0:
+        connexion.execute(db.text(
+            "INSERT INTO utilisateur_version (id, version) VALUES (1, 0)"))
+
+
+def _recherche_archives(connexion):
+    """Commentaires et évaluations déjà archivés remis dans l'index de recherche"""
+    recherche.reconstruire(connexion)
+
+
+# Liste ordonnée : ne jamais modifier une migration déjà publiée, en ajouter une
+MIGRATIONS = [
+    (1, "Tables du cache et de la file d'attente IA", _creer_tables_ia),
+    (2, "Index des chemins critiques et unicité des évaluations",
+     _index_chemins_critiques),
+    (3, "Compétences normalisées (table evaluation_competence)",
+     _competences_normalisees),
+    (4, "Synthèse des niveaux par classe, matière et période",
+     _synthese_niveaux),
+    (5, "Version des paramètres (cache multi-processus)", _version_parametres),
+    (6, "Index de pagination de l'API JSON", _index_pagination_api),
+    (7, "Recherche plein texte (FTS5)", _index_recherche),
+    (8, "Version des données par enseignant (ETag)", _version_donnees),
+    (9, "Journal de synchronisation du client hors ligne", _journal_synchro),
+    (10, "Archives des années scolaires closes", _archives),
+    (11, "Jetons du prompt et de la réponse des commentaires", _jetons_commentaires),
+    (12, "Génération par lot confiée à la file d'attente", _lots_file_attente),
+    (13, "Version des utilisateurs (cache multi-processus)", _version_utilisateurs),
+    (14, "Années archivées dans la recherche plein texte", _recherche_archives),
+]
+
+
+def _table_version(connexion):
+    connexion.execute(db.text("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            date_application TIMESTAMP NOT NULL
+        )
+    """))
+
+
+def version_courante():
+    """Dernière migration appliquée (0 pour une base jamais migrée)"""
+    with db.engine.begin() as connexion:
+        _table_version(connexion)
+        return connexion.execute(
+            db.text("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        ).scalar()
+
+
+def appliquer_migrations(cible=None):
+    """Applique les migrations en attente, chacune dans sa propre transaction
+
+    Renvoie [(version, description, rapport)] ; rapport est le texte
+    éventuellement renvoyé par la migration (lignes mises de côté, ...).
+    """
+    appliquees = []
+    depart = version_courante()
+    for version, description, migration in MIGRATIONS:
+        if version <= depart or (cible is not None and version > cible):
+            continue
+        with db.engine.begin() as connexion:
+            rapport = migration(connexion)
+            connexion.execute(
+                db.text("INSERT INTO schema_version (version, description, "
+                        "date_application) VALUES (:v, :d, :t)"),
+                {'v': version, 'd': description, 't': datetime.utcnow()}
+            )
+        appliquees.append((version, description, rapport))
+    return appliquees
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Migrations du schéma LSU")
+    parser.add_argument('--statut', action='store_true',
+                        help="affiche la version du schéma sans migrer")
+    parser.add_argument('--cible', type=int,
+                        help="s'arrête à cette version")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.statut:
+            print(f"📐 Schéma en version {version_courante()} "
+                  f"(dernière disponible : {MIGRATIONS[-1][0]})")
+        else:
+            db.create_all()
+            appliquees = appliquer_migrations(args.cible)
+            for version, description, rapport in appliquees:
+                print(f"✅ Migration {version} : {description}")
+                if rapport:
+                    print(f"   ⚠️  {rapport}")
+            if not appliquees:
+                print("✅ Schéma déjà à jour")
@@ -0,0 +1,338 @@
+"""
+Commentaires composés à partir de modèles pour le système LSU École du Cap
+Alternative instantanée et hors ligne au modèle IA : le commentaire est
+assemblé à partir des niveaux d'évaluation par matière et des observations de
+l'enseignant, avec des banques de phrases adaptées au niveau de la classe
+(CP à CM2). Les variantes sont choisies de façon déterministe à partir d'une
+graine : même élève, même période, même graine, même texte.
+
+Une classe entière est traitée en une passe : deux requêtes (élèves,
+évaluations de la période), puis composition en mémoire.
+
+    python modeles_commentaires.py --classe 3 --periode P1 [--graine 7]
+"""
+
+from app import app, db
+from models import Classe, Eleve, Evaluation, Matiere
+from sqlalchemy.orm import joinedload
+import argparse
+import hashlib
+
+
+VERSION = 'modeles-1'  # enregistrée dans Commentaire.version_ia
+
+NIVEAUX_CLASSE = ('CP', 'CE1', 'CE2', 'CM1', 'CM2')
+NIVEAU_CLASSE_DEFAUT = 'CE2'
+
+SCORES = {'Insuffisant': 1, 'Fragile': 2, 'Satisfaisant': 3, 'Très bien': 4}
+NIVEAU_PAR_SCORE = {score: niveau for niveau, score in SCORES.items()}
+
+PERIODES = {
+    'P1': 'cette première période', 'P2': 'cette deuxième période',
+    'P3': 'cette troisième période', 'P4': 'cette quatrième période',
+    'P5': 'cette dernière période',
+    'T1': 'ce premier trimestre', 'T2': 'ce deuxième trimestre',
+    'T3': 'ce troisième trimestre',
+}
+
+# ----- Banques de phrases -----
+
+OUVERTURES = {
+    'Très bien': [
+        "Excellent travail de {prenom} durant {periode}.",
+        "{prenom} a réalisé un très beau parcours durant {periode}.",
+        "Durant {periode}, {prenom} a fourni un travail remarquable.",
+        "Très bon bilan pour {prenom} sur {periode}.",
+    ],
+    'Satisfaisant': [
+        "Bon travail de {prenom} durant {periode}.",
+        "{prenom} a fourni un travail sérieux durant {periode}.",
+        "Le bilan de {periode} est satisfaisant pour {prenom}.",
+        "Durant {periode}, {prenom} a progressé de façon régulière.",
+    ],
+    'Fragile': [
+        "Le bilan de {periode} reste fragile pour {prenom}.",
+        "{prenom} a fourni des efforts durant {periode}, mais les acquis restent fragiles.",
+        "Durant {periode}, le travail de {prenom} a été irrégulier.",
+        "{prenom} progresse durant {periode}, mais certaines notions sont encore fragiles.",
+    ],
+    'Insuffisant': [
+        "{prenom} a rencontré des difficultés importantes durant {periode}.",
+        "Le bilan de {periode} est insuffisant pour {prenom}.",
+        "Durant {periode}, {prenom} a eu du mal à entrer dans les apprentissages.",
+        "Les résultats de {prenom} sur {periode} sont insuffisants.",
+    ],
+}
+
+SANS_EVALUATION = [
+    "Les évaluations de {periode} ne sont pas encore renseignées pour {prenom}.",
+]
+
+REUSSITES = {
+    'Très bien': [
+        "{prenom} obtient de très bons résultats {domaines}.",
+        "Les réussites sont nettes {domaines}.",
+        "{prenom} se montre très à l'aise {domaines}.",
+    ],
+    'Satisfaisant': [
+        "Les acquis sont solides {domaines}.",
+        "{prenom} progresse bien {domaines}.",
+        "Le travail est sérieux et régulier {domaines}.",
+    ],
+}
+
+DIFFICULTES = {
+    'Fragile': [
+        "Les acquis restent à consolider {domaines}.",
+        "Des efforts sont encore nécessaires {domaines}.",
+        "{prenom} doit encore gagner en assurance {domaines}.",
+    ],
+    'Insuffisant': [
+        "Des difficultés importantes persistent {domaines}.",
+        "Les bases ne sont pas encore acquises {domaines}.",
+        "Un travail de fond reste nécessaire {domaines}.",
+    ],
+}
+
+# Conseil final selon le niveau de la classe, en réussite ou en difficulté
+CONSEILS = {
+    'CP': {
+        'reussite': [
+            "Il faut continuer à lire un peu chaque jour à la maison.",
+            "Bravo pour ces belles premières étapes au CP !",
+        ],
+        'difficulte': [
+            "La lecture quotidienne à voix haute, à la maison, aidera {prenom} à progresser.",
+            "Un entraînement régulier au déchiffrage et au tracé des lettres est conseillé.",
+        ],
+    },
+    'CE1': {
+        'reussite': [
+            "Il faut poursuivre ainsi et continuer à lire régulièrement.",
+            "Bravo, il faut garder ce bel élan pour la suite du CE1.",
+        ],
+        'difficulte': [
+            "Un entraînement régulier à la lecture et au calcul mental est conseillé.",
+            "Il faut persévérer : un travail régulier permettra de progresser.",
+        ],
+    },
+    'CE2': {
+        'reussite': [
+            "Bravo, il faut poursuivre dans cette voie.",
+            "Ce sérieux est un atout pour terminer le cycle 2 sereinement.",
+        ],
+        'difficulte': [
+            "Il faut revoir régulièrement les tables de multiplication et les leçons.",
+            "Un suivi régulier des leçons à la maison aidera {prenom} à progresser.",
+        ],
+    },
+    'CM1': {
+        'reussite': [
+            "Il faut poursuivre ainsi en gagnant encore en autonomie.",
+            "Bravo, ce travail régulier porte ses fruits.",
+        ],
+        'difficulte': [
+            "Il faut apprendre les leçons avec plus de régularité.",
+            "Une lecture plus attentive des consignes permettra de progresser.",
+        ],
+    },
+    'CM2': {
+        'reussite': [
+            "Tous les atouts sont réunis pour une bonne entrée en sixième.",
+            "Bravo, il faut garder cet investissement jusqu'à la fin de l'année.",
+        ],
+        'difficulte': [
+            "Les efforts doivent s'intensifier pour préparer l'entrée au collège.",
+            "Il faut gagner en méthode et en autonomie pour préparer la sixième.",
+        ],
+    },
+}
+
+# Nom du domaine (après « en ») par code de matière, au cycle 2 et au cycle 3
+DOMAINES = {
+    'FR': {'CP': 'lecture', 'CE1': 'lecture', 'CE2': 'français'},
+    'MA': {'CP': 'numération', 'CE1': 'calcul', 'CE2': 'mathématiques'},
+    'HG': {'CP': 'découverte du monde', 'CM1': 'histoire-géographie'},
+    'SC': {'CP': 'découverte du monde', 'CM1': 'sciences'},
+    'AP': {'CP': 'arts plastiques'},
+    'EM': {'CP': 'musique'},
+    'EPS': {'CP': 'EPS'},
+    'LV': {'CP': 'anglais', 'CM1': 'langue vivante'},
+}
+
+MAX_DOMAINES = 3  # matières citées par phrase
+
+
+def niveau_classe(nom_classe):
+    """CP, CE1, CE2, CM1 ou CM2 d'après le nom de la classe (« CM1 B », ...)"""
+    nom = (nom_classe or '').upper()
+    for niveau in sorted(NIVEAUX_CLASSE, key=len, reverse=True):
+        if nom.startswith(niveau):
+            return niveau
+    return NIVEAU_CLASSE_DEFAUT
+
+
+def _domaine(code, nom_matiere, niveau):
+    """Nom de la matière pour le niveau : le plus proche défini en dessous"""
+    par_niveau = DOMAINES.get(code)
+    if par_niveau:
+        for candidat in reversed(NIVEAUX_CLASSE[:NIVEAUX_CLASSE.index(niveau) + 1]):
+            if candidat in par_niveau:
+                return par_niveau[candidat]
+    return nom_matiere.lower()
+
+
+def _liste(domaines):
+    """« en lecture, en calcul et en musique »"""
+    termes = [f'en {domaine}' for domaine in domaines]
+    if len(termes) == 1:
+        return termes[0]
+    return f"{', '.join(termes[:-1])} et {termes[-1]}"
+
+
+def _phrase_observations(observations):
+    texte = ' '.join((observations or '').split())
+    if not texte:
+        return None
+    texte = texte[0].upper() + texte[1:]
+    return texte if texte[-1] in '.!?' else texte + '.'
+
+
+class _Choix:
+    """Choix déterministes d'un commentaire (graine, élève, période, type)"""
+
+    def __init__(self, *cle):
+        self.empreinte = int.from_bytes(hashlib.blake2b(
+            repr(cle).encode('utf-8'), digest_size=16).digest(), 'big')
+
+    def __call__(self, phrases):
+        phrase = phrases[self.empreinte % len(phrases)]
+        self.empreinte //= len(phrases)
+        return phrase
+
+
+def composer(prenom, evaluations, periode, niveau, observations='',
+             type_commentaire='bulletin', graine=0, eleve_id=None):
+    """Commentaire d'un élève
+
+    evaluations : [(code matière, nom matière, niveau d'acquisition)] ;
+    niveau : niveau de la classe (CP à CM2).
+    """
+    choix = _Choix(graine, eleve_id if eleve_id is not None else prenom,
+                   periode, type_commentaire)
+    valeurs = {'prenom': prenom, 'periode': PERIODES.get(periode, 'cette période')}
+    # Dernière évaluation de chaque matière, dans l'ordre des matières
+    par_matiere = {}
+    for code, nom_matiere, niveau_acquis in evaluations:
+        if niveau_acquis in SCORES:
+            par_matiere[code] = (nom_matiere, SCORES[niveau_acquis])
+
+    if not par_matiere:
+        phrases = [choix(SANS_EVALUATION).format(**valeurs)]
+        observations = _phrase_observations(observations)
+        if observations:
+            phrases.append(observations)
+        return ' '.join(phrases)
+
+    scores = [score for _, score in par_matiere.values()]
+    global_ = NIVEAU_PAR_SCORE[min(4, max(1, round(sum(scores) / len(scores))))]
+    phrases = [choix(OUVERTURES[global_]).format(**valeurs)]
+
+    # Points forts : les « Très bien », à défaut les « Satisfaisant »
+    for niveau_cite, banque in ((4, REUSSITES['Très bien']), (3, REUSSITES['Satisfaisant'])):
+        domaines = [_domaine(code, nom_matiere, niveau)
+                    for code, (nom_matiere, score) in par_matiere.items()
+                    if score == niveau_cite]
+        if domaines:
+            domaines = list(dict.fromkeys(domaines))[:MAX_DOMAINES]
+            phrases.append(choix(banque).format(domaines=_liste(domaines), **valeurs))
+            break
+
+    # Difficultés : les plus faibles d'abord
+    faibles = sorted((score, code) for code, (_, score) in par_matiere.items() if score <= 2)
+    if faibles:
+        domaines = list(dict.fromkeys(
+            _domaine(code, par_matiere[code][0], niveau) for _, code in faibles))
+        banque = DIFFICULTES[NIVEAU_PAR_SCORE[faibles[0][0]]]
+        phrases.append(choix(banque).format(
+            domaines=_liste(domaines[:MAX_DOMAINES]), **valeurs))
+
+    observations = _phrase_observations(observations)
+    if observations:
+        phrases.append(observations)
+
+    tendance = 'reussite' if SCORES[global_] >= 3 else 'difficulte'
+    phrases.append(choix(CONSEILS[niveau][tendance]).format(**valeurs))
+    return ' '.join(phrases)
+
+
+# Ordre des évaluations d'un élève, identique pour un élève seul et pour sa
+# classe : une même graine donne le même texte
+ORDRE_EVALUATIONS = (Evaluation.matiere_id, Evaluation.id)
+
+
+def evaluations_eleve(eleve, periode):
+    """Évaluations de l'élève (matière chargée) pour la période, année de sa classe"""
+    return Evaluation.query.options(joinedload(Evaluation.matiere)).filter(
+        Evaluation.eleve_id == eleve.id,
+        Evaluation.periode == periode,
+        Evaluation.annee_scolaire == eleve.classe.annee_scolaire,
+    ).order_by(*ORDRE_EVALUATIONS).all()
+
+
+def composer_eleve(eleve, evaluations, type_commentaire, periode, observations='', graine=0):
+    """Commentaire d'un élève chargé avec sa classe et ses évaluations (evaluations_eleve)"""
+    return composer(
+        eleve.prenom,
+        [(e.matiere.code, e.matiere.nom, e.niveau) for e in evaluations],
+        periode, niveau_classe(eleve.classe.nom), observations,
+        type_commentaire, graine, eleve.id)
+
+
+def composer_classe(classe, type_commentaire, periode, graine=0):
+    """Commentaires de toute la classe : [{'eleve_id', 'eleve', 'commentaire'}]
+
+    Deux requêtes pour la classe entière, quel que soit son effectif.
+    """
+    eleves = db.session.execute(
+        db.select(Eleve.id, Eleve.nom, Eleve.prenom, Eleve.observations)
+        .where(Eleve.classe_id == classe.id)
+        .order_by(Eleve.nom, Eleve.prenom)).all()
+
+    evaluations = {}
+    for eleve_id, code, nom_matiere, niveau_acquis in db.session.execute(
+        db.select(Evaluation.eleve_id, Matiere.code, Matiere.nom, Evaluation.niveau)
+        .join(Matiere, Evaluation.matiere_id == Matiere.id)
+        .where(Evaluation.classe_id == classe.id, Evaluation.periode == periode,
+               Evaluation.annee_scolaire == classe.annee_scolaire)
+        .order_by(*ORDRE_EVALUATIONS)
+    ):
+        evaluations.setdefault(eleve_id, []).append((code, nom_matiere, niveau_acquis))
+
+    niveau = niveau_classe(classe.nom)
+    return [
+        {
+            'eleve_id': eleve.id,
+            'eleve': f"{eleve.prenom} {eleve.nom}",
+            'commentaire': composer(eleve.prenom, evaluations.get(eleve.id, []),
+                                    periode, niveau, eleve.observations,
+                                    type_commentaire, graine, eleve.id),
+        }
+        for eleve in eleves
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Commentaires d'une classe composés par modèles")
+    parser.add_argument('--classe', type=int, required=True)
+    parser.add_argument('--periode', required=True)
+    parser.add_argument('--type', default='bulletin', dest='type_commentaire')
+    parser.add_argument('--graine', type=int, default=0)
+    args = parser.parse_args()
+
+    with app.app_context():
+        classe = db.session.get(Classe, args.classe)
+        if classe is None:
+            parser.error(f"Classe {args.classe} introuvable")
+        for resultat in composer_classe(classe, args.type_commentaire, args.periode, args.graine):
+            print(f"👤 {resultat['eleve']}\n   {resultat['commentaire']}\n")
@@ -9,6 +9,15 @@ from datetime import datetime
 import json
 
 
+def colonne_suivie(*args, **kwargs):
+    """Colonne dont l'ancienne valeur est chargée avant modification, même expirée
+
+    Son historique (synthese_niveaux, versions_donnees, cache_utilisateurs)
+    donne ainsi toujours l'ancienne valeur, y compris après un commit.
+    """
+    return db.column_property(db.Column(*args, **kwargs), active_history=True)
+
+
 class User(UserMixin, db.Model):
     """Modèle utilisateur pour les enseignants"""
     id = db.Column(db.Integer, primary_key=True)
@@ -38,10 +47,14 @@ class User(UserMixin, db.Model):
 
 class Classe(db.Model):
     """Modèle pour les classes (CP à CM2)"""
+    __table_args__ = (
+        db.Index('ix_classe_enseignant_nom', 'enseignant_id', 'nom'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     nom = db.Column(db.String(50), nullable=False)  # CP, CE1, CE2, CM1, CM2
     annee_scolaire = db.Column(db.String(9), nullable=False)  # 2024-2025
-    enseignant_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    enseignant_id = colonne_suivie(db.Integer, db.ForeignKey('user.id'), nullable=False)
     photo_classe = db.Column(db.String(255))  # Chemin vers la photo
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -52,11 +65,15 @@ class Classe(db.Model):
 
 class Eleve(db.Model):
     """Modèle pour les élèves"""
+    __table_args__ = (
+        db.Index('ix_eleve_classe', 'classe_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     nom = db.Column(db.String(100), nullable=False)
     prenom = db.Column(db.String(100), nullable=False)
     date_naissance = db.Column(db.Date, nullable=False)
-    classe_id = db.Column(db.Integer, db.ForeignKey('classe.id'), nullable=False)
+    classe_id = colonne_suivie(db.Integer, db.ForeignKey('classe.id'), nullable=False)
     photo = db.Column(db.String(255))  # Chemin vers la photo
     observations = db.Column(db.Text)  # Observations générales
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
@@ -66,6 +83,17 @@ class Eleve(db.Model):
     commentaires = db.relationship('Commentaire', backref='eleve', lazy=True)
 
 
+# Nombre d'élèves d'une classe par sous-requête COUNT, sans charger les élèves
+# (différé : à activer avec undefer(Classe.nb_eleves) dans les listes)
+Classe.nb_eleves = db.column_property(
+    db.select(db.func.count(Eleve.id))
+    .where(Eleve.classe_id == Classe.id)
+    .correlate_except(Eleve)
+    .scalar_subquery(),
+    deferred=True
+)
+
+
 class Matiere(db.Model):
     """Modèle pour les matières scolaires"""
     id = db.Column(db.Integer, primary_key=True)
@@ -79,36 +107,102 @@ class Matiere(db.Model):
     evaluations = db.relationship('Evaluation', backref='matiere', lazy=True)
 
 
+# Niveaux d'acquisition, du plus faible au plus élevé
+NIVEAUX = ('Insuffisant', 'Fragile', 'Satisfaisant', 'Très bien')
+
+# Niveaux indiquant une compétence non encore atteinte
+NIVEAUX_NON_ATTEINTS = ('Insuffisant', 'Fragile')
+
+
 class Evaluation(db.Model):
     """Modèle pour les évaluations"""
+    __table_args__ = (
+        db.Index('ix_evaluation_eleve_periode', 'eleve_id', 'periode'),
+        db.Index('ix_evaluation_classe_date', 'classe_id', 'date_evaluation'),
+        # Pagination par curseur de l'API (api.py) dans les classes d'un enseignant
+        db.Index('ix_evaluation_classe_id', 'classe_id', 'id'),
+        # Une seule évaluation par élève, matière et période : permet l'upsert
+        db.Index('uq_evaluation_eleve_matiere_periode_annee', 'eleve_id',
+                 'matiere_id', 'periode', 'annee_scolaire', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     eleve_id = db.Column(db.Integer, db.ForeignKey('eleve.id'), nullable=False)
-    matiere_id = db.Column(db.Integer, db.ForeignKey('matiere.id'), nullable=False)
-    classe_id = db.Column(db.Integer, db.ForeignKey('classe.id'), nullable=False)
-    periode = db.Column(db.String(20), nullable=False)  # P1, P2, P3, P4
-    annee_scolaire = db.Column(db.String(9), nullable=False)
-    niveau = db.Column(db.String(20))  # Insuffisant, Fragile, Satisfaisant, Très bien
+    matiere_id = colonne_suivie(db.Integer, db.ForeignKey('matiere.id'), nullable=False)
+    classe_id = colonne_suivie(db.Integer, db.ForeignKey('classe.id'), nullable=False)
+    periode = colonne_suivie(db.String(20), nullable=False)  # P1, P2, P3, P4
+    annee_scolaire = colonne_suivie(db.String(9), nullable=False)
+    niveau = colonne_suivie(db.String(20))  # Insuffisant, Fragile, Satisfaisant, Très bien
     commentaire = db.Column(db.Text)
     date_evaluation = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Compétences spécifiques (stockées en JSON)
-    competences = db.Column(db.Text)  # JSON des compétences évaluées
+    # Ancien stockage JSON des compétences, vidé par la migration 3
+    competences = db.Column(db.Text)
+    
+    # Relations
+    competences_evaluees = db.relationship('EvaluationCompetence',
+                                           backref='evaluation', lazy=True,
+                                           cascade='all, delete-orphan')
     
     def get_competences(self):
         """Récupère les compétences en format dict"""
-        if self.competences:
-            return json.loads(self.competences)
-        return {}
+        return {c.code: c.niveau for c in self.competences_evaluees}
     
     def set_competences(self, competences_dict):
-        """Définit les compétences en format JSON"""
-        self.competences = json.dumps(competences_dict)
+        """Définit les compétences (une ligne EvaluationCompetence par code)"""
+        # Mise à jour en place : la contrainte (evaluation_id, code) interdit
+        # de supprimer puis réinsérer un même code dans un seul flush
+        existantes = {c.code: c for c in self.competences_evaluees}
+        for code, niveau in competences_dict.items():
+            if code in existantes:
+                existantes.pop(code).niveau = niveau
+            else:
+                self.competences_evaluees.append(
+                    EvaluationCompetence(code=code, niveau=niveau)
+                )
+        for competence in existantes.values():
+            self.competences_evaluees.remove(competence)
+
+
+class EvaluationCompetence(db.Model):
+    """Niveau atteint sur une compétence lors d'une évaluation"""
+    __table_args__ = (
+        db.UniqueConstraint('evaluation_id', 'code',
+                            name='uq_evaluation_competence_code'),
+        # Requêtes « qui n'a pas atteint la compétence X »
+        db.Index('ix_evaluation_competence_code_niveau', 'code', 'niveau'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    evaluation_id = db.Column(db.Integer, db.ForeignKey('evaluation.id'), nullable=False)
+    code = db.Column(db.String(50), nullable=False)  # Code de la compétence
+    niveau = db.Column(db.String(20), nullable=False)  # Insuffisant, Fragile, Satisfaisant, Très bien
+
+
+class SyntheseNiveaux(db.Model):
+    """Répartition des niveaux par classe, matière et période (tenue par synthese_niveaux.py)"""
+    __table_args__ = (
+        db.Index('uq_synthese_niveaux', 'classe_id', 'matiere_id', 'periode',
+                 'annee_scolaire', 'niveau', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    classe_id = db.Column(db.Integer, db.ForeignKey('classe.id'), nullable=False)
+    matiere_id = db.Column(db.Integer, db.ForeignKey('matiere.id'), nullable=False)
+    periode = db.Column(db.String(20), nullable=False)
+    annee_scolaire = db.Column(db.String(9), nullable=False)
+    niveau = db.Column(db.String(20), nullable=False)
+    nombre = db.Column(db.Integer, nullable=False, default=0)
 
 
 class Commentaire(db.Model):
     """Modèle pour les commentaires générés par IA"""
+    __table_args__ = (
+        db.Index('ix_commentaire_eleve_periode', 'eleve_id', 'periode'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    eleve_id = db.Column(db.Integer, db.ForeignKey('eleve.id'), nullable=False)
+    eleve_id = colonne_suivie(db.Integer, db.ForeignKey('eleve.id'), nullable=False)
     auteur_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     type_commentaire = db.Column(db.String(50), nullable=False)  # bulletin, livret, observation
     periode = db.Column(db.String(20), nullable=False)
@@ -116,10 +210,85 @@ class Commentaire(db.Model):
     contenu = db.Column(db.Text, nullable=False)
     version_ia = db.Column(db.String(20))  # Version de l'IA utilisée
     prompt_utilise = db.Column(db.Text)  # Prompt utilisé pour la génération
+    # Jetons du prompt et de la réponse (fournisseur, sinon estimation locale)
+    jetons_prompt = db.Column(db.Integer)
+    jetons_reponse = db.Column(db.Integer)
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
     modifie = db.Column(db.Boolean, default=False)  # Si modifié manuellement
 
 
+# ----- Archives des années scolaires closes (archivage.py) -----
+# Mêmes colonnes et mêmes identifiants que les tables courantes ; lues au
+# travers des vues *_historique (courant + archive)
+
+class EvaluationArchive(db.Model):
+    """Évaluation d'une année scolaire close"""
+    __tablename__ = 'evaluation_archive'
+    __table_args__ = (
+        db.Index('ix_evaluation_archive_classe_periode', 'classe_id', 'periode'),
+        db.Index('ix_evaluation_archive_annee', 'annee_scolaire'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    eleve_id = db.Column(db.Integer, db.ForeignKey('eleve.id'), nullable=False)
+    matiere_id = db.Column(db.Integer, db.ForeignKey('matiere.id'), nullable=False)
+    classe_id = db.Column(db.Integer, db.ForeignKey('classe.id'), nullable=False)
+    periode = db.Column(db.String(20), nullable=False)
+    annee_scolaire = db.Column(db.String(9), nullable=False)
+    niveau = db.Column(db.String(20))
+    commentaire = db.Column(db.Text)
+    date_evaluation = db.Column(db.DateTime)
+    competences = db.Column(db.Text)
+
+
+class EvaluationCompetenceArchive(db.Model):
+    """Compétence évaluée d'une évaluation archivée"""
+    __tablename__ = 'evaluation_competence_archive'
+    __table_args__ = (
+        db.Index('ix_evaluation_competence_archive_evaluation', 'evaluation_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    evaluation_id = db.Column(db.Integer, db.ForeignKey('evaluation_archive.id'), nullable=False)
+    code = db.Column(db.String(50), nullable=False)
+    niveau = db.Column(db.String(20), nullable=False)
+
+
+class CommentaireArchive(db.Model):
+    """Commentaire d'une année scolaire close"""
+    __tablename__ = 'commentaire_archive'
+    __table_args__ = (
+        db.Index('ix_commentaire_archive_eleve_periode', 'eleve_id', 'periode'),
+        db.Index('ix_commentaire_archive_annee', 'annee_scolaire'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    eleve_id = db.Column(db.Integer, db.ForeignKey('eleve.id'), nullable=False)
+    auteur_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    type_commentaire = db.Column(db.String(50), nullable=False)
+    periode = db.Column(db.String(20), nullable=False)
+    annee_scolaire = db.Column(db.String(9), nullable=False)
+    contenu = db.Column(db.Text, nullable=False)
+    version_ia = db.Column(db.String(20))
+    prompt_utilise = db.Column(db.Text)
+    jetons_prompt = db.Column(db.Integer)
+    jetons_reponse = db.Column(db.Integer)
+    date_creation = db.Column(db.DateTime)
+    modifie = db.Column(db.Boolean)
+
+
+class AnneeArchivee(db.Model):
+    """Année scolaire archivée (ou en cours d'archivage)"""
+    __tablename__ = 'annee_archivee'
+    
+    annee_scolaire = db.Column(db.String(9), primary_key=True)
+    statut = db.Column(db.String(20), nullable=False, default='en_cours')  # en_cours, terminee
+    evaluations = db.Column(db.Integer, nullable=False, default=0)
+    commentaires = db.Column(db.Integer, nullable=False, default=0)
+    date_debut = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date_fin = db.Column(db.DateTime)
+
+
 class Parametre(db.Model):
     """Modèle pour les paramètres du système"""
     id = db.Column(db.Integer, primary_key=True)
@@ -153,4 +322,87 @@ class Parametre(db.Model):
         else:
             self.valeur = str(valeur)
             self.type_valeur = 'string'
-        self.date_modification = datetime.utcnow() 
\ No newline at end of file
+        self.date_modification = datetime.utcnow()
+
+
+class VersionParametres(db.Model):
+    """Compteur incrémenté à chaque modification des paramètres (cache_parametres.py)"""
+    __tablename__ = 'parametre_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class VersionUtilisateurs(db.Model):
+    """Compteur incrémenté à chaque modification d'utilisateur ou de classe (cache_utilisateurs.py)"""
+    __tablename__ = 'utilisateur_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class VersionDonnees(db.Model):
+    """Version des données d'un enseignant : ETag et fragments (versions_donnees.py)"""
+    __tablename__ = 'donnees_version'
+    
+    enseignant_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    date_modification = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class JournalSynchro(db.Model):
+    """Dernière révision de chaque ligne synchronisée avec le client hors ligne (synchro.py)"""
+    __tablename__ = 'journal_synchro'
+    __table_args__ = (
+        db.Index('uq_journal_synchro_ligne', 'ressource', 'ligne_id', unique=True),
+        {'sqlite_autoincrement': True},  # révisions jamais réutilisées
+    )
+    
+    revision = db.Column(db.Integer, primary_key=True)
+    ressource = db.Column(db.String(20), nullable=False)  # eleves, evaluations, commentaires
+    ligne_id = db.Column(db.Integer, nullable=False)
+    classe_id = db.Column(db.Integer, nullable=False)  # périmètre de la ligne
+    classe_precedente = db.Column(db.Integer)  # avant un changement de classe
+    supprime = db.Column(db.Boolean, nullable=False, default=False)
+    date_modification = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class CacheIA(db.Model):
+    """Cache persistant des générations IA, adressé par le contenu du prompt"""
+    id = db.Column(db.Integer, primary_key=True)
+    cle = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 hexadécimal
+    modele = db.Column(db.String(50), nullable=False)
+    contenu = db.Column(db.Text, nullable=False)
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class TacheIA(db.Model):
+    """File d'attente durable des générations IA (traitée par file_attente.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    type_tache = db.Column(db.String(50), nullable=False)  # commentaire, photo
+    statut = db.Column(db.String(20), default='en_attente', index=True)  # en_attente, en_cours, terminee, echec
+    auteur_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    parametres = db.Column(db.Text, nullable=False)  # JSON des paramètres
+    resultat = db.Column(db.Text)  # JSON du résultat
+    erreur = db.Column(db.Text)
+    tentatives = db.Column(db.Integer, default=0)
+    max_tentatives = db.Column(db.Integer, default=5)
+    prochaine_tentative = db.Column(db.DateTime, default=datetime.utcnow)
+    verrou_jusqua = db.Column(db.DateTime)  # Bail du worker qui traite la tâche
+    lot_id = db.Column(db.String(32), index=True)  # Génération d'une classe entière
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def get_parametres(self):
+        """Récupère les paramètres en format dict"""
+        return json.loads(self.parametres)
+    
+    def set_parametres(self, parametres_dict):
+        """Définit les paramètres en format JSON"""
+        self.parametres = json.dumps(parametres_dict)
+    
+    def get_resultat(self):
+        """Récupère le résultat en format dict"""
+        if self.resultat:
+            return json.loads(self.resultat)
+        return {}
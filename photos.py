@@ -0,0 +1,154 @@
+"""
+Traitement des photos de classe et d'élèves pour le système LSU École du Cap
+L'original est enregistré sous l'empreinte SHA-256 de son contenu (un même
+fichier envoyé deux fois n'est stocké qu'une fois). Les versions web
+(miniature, liste, plein écran) sont produites en WebP et en JPEG progressif
+par la file d'attente (tâche « photo »), hors de la requête d'envoi.
+"""
+
+from app import app, db
+from models import Classe, Eleve
+from flask import url_for
+from PIL import Image, ImageOps
+import hashlib
+import os
+import re
+import tempfile
+
+
+DOSSIER_PHOTOS = os.path.join(app.config['UPLOAD_FOLDER'], 'photos')
+DOSSIER_ORIGINAUX = os.path.join(DOSSIER_PHOTOS, 'originaux')
+DOSSIER_VARIANTES = os.path.join(DOSSIER_PHOTOS, 'variantes')
+URL_VARIANTES = 'uploads/photos/variantes'
+
+LARGEURS = (160, 480, 1280)  # miniature, liste, plein écran
+LARGEUR_AFFICHAGE = 480  # version enregistrée dans Classe.photo_classe / Eleve.photo
+FORMATS_SORTIE = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'progressive': True, 'optimize': True}),
+}
+FORMATS_ACCEPTES = {'JPEG': 'jpg', 'MPO': 'jpg', 'PNG': 'png', 'WEBP': 'webp',
+                    'GIF': 'gif'}
+TAILLE_BLOC = 1024 * 1024
+MOTIF_VARIANTE = re.compile(
+    rf'^{URL_VARIANTES}/(?P<empreinte>[0-9a-f]{{64}})_\d+\.(webp|jpg)$')
+
+
+def chemin_original(empreinte):
+    """Fichier original d'une photo (quelle que soit son extension)"""
+    for extension in set(FORMATS_ACCEPTES.values()):
+        chemin = os.path.join(DOSSIER_ORIGINAUX, f"{empreinte}.{extension}")
+        if os.path.exists(chemin):
+            return chemin
+    return None
+
+
+def chemin_variante(empreinte, largeur, extension):
+    """Chemin d'une version web, relatif au dossier static"""
+    return f"{URL_VARIANTES}/{empreinte}_{largeur}.{extension}"
+
+
+def _fichier_variante(empreinte, largeur, extension):
+    return os.path.join(DOSSIER_VARIANTES, f"{empreinte}_{largeur}.{extension}")
+
+
+def photo_affichee(empreinte):
+    """Valeur à enregistrer dans Classe.photo_classe / Eleve.photo"""
+    return chemin_variante(empreinte, LARGEUR_AFFICHAGE, 'jpg')
+
+
+def enregistrer_original(fichier):
+    """Enregistre le fichier envoyé sous son empreinte et la renvoie
+
+    Le contenu est haché pendant la copie, par blocs ; seule l'en-tête de
+    l'image est lue pour en vérifier le format. Lève ValueError si le fichier
+    n'est pas une image acceptée.
+    """
+    empreinte = hashlib.sha256()
+    descripteur, temporaire = tempfile.mkstemp(dir=DOSSIER_ORIGINAUX, suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as sortie:
+            for bloc in iter(lambda: fichier.stream.read(TAILLE_BLOC), b''):
+                empreinte.update(bloc)
+                sortie.write(bloc)
+        try:
+            with Image.open(temporaire) as image:
+                format_image = image.format
+        except (OSError, Image.DecompressionBombError):
+            format_image = None
+        if format_image not in FORMATS_ACCEPTES:
+            raise ValueError("Format d'image non supporté (JPEG, PNG, WebP ou GIF)")
+
+        empreinte = empreinte.hexdigest()
+        if chemin_original(empreinte) is None:
+            os.replace(temporaire, os.path.join(
+                DOSSIER_ORIGINAUX, f"{empreinte}.{FORMATS_ACCEPTES[format_image]}"))
+        return empreinte
+    finally:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+
+
+def variantes_pretes(empreinte):
+    """Toutes les versions web de la photo existent déjà (doublon)"""
+    return all(
+        os.path.exists(_fichier_variante(empreinte, largeur, extension))
+        for largeur in LARGEURS for extension in FORMATS_SORTIE
+    )
+
+
+def generer_variantes(empreinte):
+    """Produit les versions web d'une photo et renvoie le chemin à afficher"""
+    original = chemin_original(empreinte)
+    if original is None:
+        raise FileNotFoundError(f"Original introuvable : {empreinte}")
+
+    with Image.open(original) as image:
+        # Décodage JPEG directement à une résolution réduite
+        image.draft('RGB', (max(LARGEURS), max(LARGEURS)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            fond = Image.new('RGB', image.size, 'white')
+            fond.paste(image, mask=image.getchannel('A'))
+            image = fond
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # Du plus grand au plus petit : chaque réduction repart de la précédente
+        for largeur in sorted(LARGEURS, reverse=True):
+            if image.width > largeur:
+                image = image.resize(
+                    (largeur, round(image.height * largeur / image.width)),
+                    Image.LANCZOS)
+            for extension, (format_image, options) in FORMATS_SORTIE.items():
+                destination = _fichier_variante(empreinte, largeur, extension)
+                temporaire = destination + '.tmp'
+                image.save(temporaire, format_image, **options)
+                os.replace(temporaire, destination)
+    return photo_affichee(empreinte)
+
+
+def associer_photo(cible, cible_id, chemin):
+    """Enregistre la photo d'une classe ou d'un élève (sans valider la session)"""
+    modele = {'classe': Classe, 'eleve': Eleve}[cible]
+    objet = db.session.get(modele, cible_id)
+    if objet is None:
+        raise ValueError(f"{cible} {cible_id} introuvable")
+    if cible == 'classe':
+        objet.photo_classe = chemin
+    else:
+        objet.photo = chemin
+
+
+@app.template_filter('srcset')
+def srcset(chemin, extension='jpg'):
+    """Attribut srcset des versions web d'une photo ('' pour une ancienne photo)"""
+    correspondance = MOTIF_VARIANTE.match(chemin or '')
+    if correspondance is None:
+        return ''
+    return ', '.join(
+        url_for('static', filename=chemin_variante(
+            correspondance['empreinte'], largeur, extension)) + f' {largeur}w'
+        for largeur in LARGEURS
+    )
@@ -0,0 +1,306 @@
+"""
+Recherche plein texte dans les commentaires, évaluations et élèves (SQLite FTS5)
+La table virtuelle « recherche » indexe les commentaires de période, les
+remarques des évaluations ainsi que le nom et les observations des élèves,
+sans accents (tokenizer unicode61 remove_diacritics 2). Elle est tenue à jour
+par des déclencheurs SQL, y compris pour les insertions groupées qui
+contournent l'ORM. Les commentaires et évaluations d'une année archivée
+restent indexés : archivage.py les réindexe depuis les tables *_archive (même
+identifiant) après leur retrait des tables courantes. Le rowid encode la
+source : id * 4 + code du type ; la
+colonne portee (« e<élève> c<classe> ») restreint la recherche aux classes
+d'un enseignant à l'intérieur même de l'index. Toutes les correspondances sont
+classées (bm25) ; les pages suivantes reprennent après le dernier résultat
+(score, rowid) de la précédente.
+
+    python recherche.py --reconstruire
+    python recherche.py "lecture fluide" --utilisateur dupont.marie
+"""
+
+from app import app, db
+from models import User, Eleve, Evaluation, Commentaire
+import argparse
+import html
+import re
+
+
+TYPES = {'commentaire': 1, 'evaluation': 2, 'eleve': 3}
+LIMITE_MAX = 100
+POIDS_NOM = 10.0  # un nom d'élève compte plus qu'un mot du texte
+DEBUT_MARQUE, FIN_MARQUE = '\x02', '\x03'
+
+_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS recherche USING fts5(
+        nom, texte, portee,
+        eleve_id UNINDEXED, periode UNINDEXED, annee_scolaire UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+# Lignes indexées de chaque source :
+# (rowid, nom, texte, portee, eleve_id, periode, annee_scolaire)
+_PORTEE = ("'e' || {s}.eleve_id || ' c' || "
+           "(SELECT classe_id FROM eleve WHERE eleve.id = {s}.eleve_id)")
+_SOURCES = {
+    'commentaire': (
+        "SELECT {s}.id * 4 + 1, '', {s}.contenu, " + _PORTEE + ", {s}.eleve_id, "
+        "{s}.periode, {s}.annee_scolaire", "commentaire", "1"),
+    'evaluation': (
+        "SELECT {s}.id * 4 + 2, '', {s}.commentaire, " + _PORTEE + ", {s}.eleve_id, "
+        "{s}.periode, {s}.annee_scolaire", "evaluation",
+        "{s}.commentaire IS NOT NULL AND {s}.commentaire <> ''"),
+    'eleve': (
+        "SELECT {s}.id * 4 + 3, {s}.prenom || ' ' || {s}.nom, "
+        "COALESCE({s}.observations, ''), 'e' || {s}.id || ' c' || {s}.classe_id, "
+        "{s}.id, NULL, NULL", "eleve", "1"),
+}
+# Tables d'archive des années closes (archivage.py), mêmes colonnes que la source
+ARCHIVES = {'commentaire': 'commentaire_archive', 'evaluation': 'evaluation_archive'}
+_COLONNES_MODIFIEES = {
+    'commentaire': 'contenu, eleve_id, periode, annee_scolaire',
+    'evaluation': 'commentaire, eleve_id, periode, annee_scolaire',
+    'eleve': 'nom, prenom, observations, classe_id',
+}
+_INSERTION = ("INSERT INTO recherche (rowid, nom, texte, portee, eleve_id, periode, "
+              "annee_scolaire) ")
+
+
+def _declencheurs():
+    for type_source, (selection, table, condition) in _SOURCES.items():
+        code = TYPES[type_source]
+        inserer = (_INSERTION + selection.format(s='new') +
+                   f" WHERE {condition.format(s='new')};")
+        supprimer = f"DELETE FROM recherche WHERE rowid = old.id * 4 + {code};"
+        yield (f"CREATE TRIGGER IF NOT EXISTS recherche_{table}_ajout "
+               f"AFTER INSERT ON {table} BEGIN {inserer} END")
+        yield (f"CREATE TRIGGER IF NOT EXISTS recherche_{table}_modification "
+               f"AFTER UPDATE OF {_COLONNES_MODIFIEES[type_source]} ON {table} "
+               f"BEGIN {supprimer} {inserer} END")
+        yield (f"CREATE TRIGGER IF NOT EXISTS recherche_{table}_suppression "
+               f"AFTER DELETE ON {table} BEGIN {supprimer} END")
+    # Changement de classe : portée des commentaires et évaluations de l'élève
+    yield ("CREATE TRIGGER IF NOT EXISTS recherche_eleve_changement_classe "
+           "AFTER UPDATE OF classe_id ON eleve WHEN old.classe_id IS NOT new.classe_id "
+           "BEGIN UPDATE recherche SET portee = 'e' || new.id || ' c' || new.classe_id "
+           "WHERE rowid IN (SELECT rowid FROM recherche "
+           "WHERE recherche MATCH ('portee : e' || new.id)); END")
+
+
+def disponible(connexion):
+    """FTS5 n'existe que sous SQLite (recherche par LIKE ailleurs)"""
+    return connexion.dialect.name == 'sqlite'
+
+
+def creer_index(connexion):
+    """Table FTS5 et déclencheurs, puis indexation des données existantes"""
+    if not disponible(connexion):
+        return
+    connexion.execute(db.text(_TABLE))
+    for instruction in _declencheurs():
+        connexion.execute(db.text(instruction))
+    reconstruire(connexion)
+
+
+def supprimer_declencheurs(connexion):
+    """Avant un chargement massif : l'index sera reconstruit par creer_index()"""
+    if not disponible(connexion):
+        return
+    for (nom,) in connexion.execute(db.text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND name LIKE 'recherche_%'")).fetchall():
+        connexion.execute(db.text(f"DROP TRIGGER {nom}"))
+
+
+def reconstruire(connexion):
+    """Réindexe entièrement les trois sources et leurs archives"""
+    if not disponible(connexion):
+        return
+    connexion.execute(db.text("DELETE FROM recherche"))
+    inspecteur = db.inspect(connexion)
+    for type_source, (selection, table, condition) in _SOURCES.items():
+        tables = [table]
+        if type_source in ARCHIVES and inspecteur.has_table(ARCHIVES[type_source]):
+            tables.append(ARCHIVES[type_source])
+        for source in tables:
+            connexion.execute(db.text(
+                _INSERTION + selection.format(s=source) +
+                f" FROM {source} WHERE {condition.format(s=source)}"))
+    connexion.execute(db.text("INSERT INTO recherche (recherche) VALUES ('optimize')"))
+
+
+def indexer_archives(connexion, type_source, annee, premier_id, dernier_id):
+    """Réindexe les lignes archivées de l'année dont l'id est dans l'intervalle
+
+    Le retrait des tables courantes les a désindexées (déclencheur de
+    suppression) : elles restent ainsi trouvables, sous le même identifiant.
+    """
+    if not disponible(connexion):
+        return
+    selection, _, condition = _SOURCES[type_source]
+    archive = ARCHIVES[type_source]
+    filtre = (f"{archive}.annee_scolaire = :annee "
+              f"AND {archive}.id BETWEEN :premier AND :dernier")
+    parametres = {'annee': annee, 'premier': premier_id, 'dernier': dernier_id}
+    connexion.execute(db.text(
+        f"DELETE FROM recherche WHERE rowid IN (SELECT {archive}.id * 4 + "
+        f"{TYPES[type_source]} FROM {archive} WHERE {filtre})"), parametres)
+    connexion.execute(db.text(
+        _INSERTION + selection.format(s=archive) + f" FROM {archive} "
+        f"WHERE {condition.format(s=archive)} AND {filtre}"), parametres)
+
+
+def _termes(texte):
+    return re.findall(r'\w+', texte or '')[:10]
+
+
+def _extrait_html(extrait):
+    """Extrait échappé, termes trouvés entourés de <mark>"""
+    return html.escape(extrait).replace(DEBUT_MARQUE, '<mark>').replace(FIN_MARQUE, '</mark>')
+
+
+def rechercher(texte, utilisateur, types=None, limite=20, apres=None):
+    """Résultats classés par pertinence, limités aux classes de l'utilisateur
+
+    Chaque mot doit apparaître, sans tenir compte des accents ni de la casse ;
+    le dernier est un préfixe (« lecture flu » trouve « lecture fluide »).
+    apres : curseur (chaîne 'curseur' du dernier résultat de la page précédente).
+    """
+    termes = _termes(texte)
+    types = [t for t in (types or TYPES) if t in TYPES]
+    if not termes or not types:
+        return []
+    limite = max(1, min(int(limite), LIMITE_MAX))
+    connexion = db.session.connection()
+    if not disponible(connexion):
+        return _rechercher_sans_fts(termes, utilisateur, types, limite)
+
+    # Mots cherchés dans le nom et le texte uniquement, jamais dans la portée
+    # (un préfixe sur chaque mot fusionnerait trop de listes de documents)
+    requete = '{nom texte} : (' + ' '.join('"' + terme + '"' for terme in termes) + '*)'
+    perimetre = ''
+    if utilisateur.role != 'admin':
+        classes = ' OR '.join(f'"c{classe_id}"' for classe_id in
+                              sorted(utilisateur.classe_ids)) or '"c0"'
+        requete = f'({requete}) AND portee : ({classes})'
+        # Filtre de sécurité : une portée périmée ne peut qu'omettre un résultat
+        perimetre = 'AND e.classe_id IN :classes'
+    parametres = {'requete': requete, 'types': [TYPES[t] for t in types],
+                  'limite': limite, 'debut': DEBUT_MARQUE, 'fin': FIN_MARQUE}
+    suite = ''
+    if apres is not None:
+        parametres['score'], parametres['rowid'] = _lire_curseur(apres)
+        suite = 'AND (rank > :score OR (rank = :score AND rowid > :rowid))'
+
+    # Classement de toutes les correspondances sur l'index seul, puis extraits
+    # et élèves pour la page retenue uniquement
+    instruction = db.text(f"""
+        WITH page AS (
+            SELECT rowid, rank FROM recherche
+            WHERE recherche MATCH :requete
+              AND rank MATCH 'bm25({POIDS_NOM}, 1.0, 0.0)'
+              AND rowid % 4 IN :types {suite}
+            ORDER BY rank, rowid
+            LIMIT :limite)
+        SELECT recherche.rowid, recherche.periode, recherche.annee_scolaire,
+               CASE WHEN recherche.rowid % 4 = 3
+                    THEN highlight(recherche, 0, :debut, :fin) ||
+                         CASE WHEN recherche.texte <> '' THEN ' — ' ||
+                              snippet(recherche, 1, :debut, :fin, '…', 16) ELSE '' END
+                    ELSE snippet(recherche, 1, :debut, :fin, '…', 16) END AS extrait,
+               page.rank AS score,
+               e.id AS eleve_id, e.nom, e.prenom, e.classe_id
+        FROM recherche JOIN page ON page.rowid = recherche.rowid
+        JOIN eleve e ON e.id = recherche.eleve_id
+        WHERE recherche MATCH :requete
+          AND recherche.rowid IN (SELECT rowid FROM page) {perimetre}
+        ORDER BY page.rank, page.rowid
+    """).bindparams(db.bindparam('types', expanding=True))
+    if perimetre:
+        instruction = instruction.bindparams(db.bindparam('classes', expanding=True))
+        parametres['classes'] = sorted(utilisateur.classe_ids) or [0]
+    lignes = connexion.execute(instruction, parametres)
+
+    noms_types = {code: nom for nom, code in TYPES.items()}
+    return [{
+        'type': noms_types[ligne.rowid % 4],
+        'id': ligne.rowid // 4,
+        'eleve': {'id': ligne.eleve_id, 'nom': ligne.nom, 'prenom': ligne.prenom,
+                  'classe_id': ligne.classe_id},
+        'periode': ligne.periode,
+        'annee_scolaire': ligne.annee_scolaire,
+        'extrait': _extrait_html(ligne.extrait),
+        'score': round(-ligne.score, 3),
+        'curseur': f"{ligne.score!r}:{ligne.rowid}",
+    } for ligne in lignes]
+
+
+def _lire_curseur(curseur):
+    """(score, rowid) d'un curseur de pagination ; ValueError s'il est invalide"""
+    score, _, rowid = str(curseur).rpartition(':')
+    return float(score), int(rowid)
+
+
+def _rechercher_sans_fts(termes, utilisateur, types, limite):
+    """Repli sans FTS5 (PostgreSQL) : LIKE insensible à la casse, non classé
+
+    Tables courantes seulement : les années archivées n'y sont pas cherchées.
+    """
+    sources = {
+        'commentaire': (Commentaire, Commentaire.contenu, Commentaire.periode,
+                        Commentaire.annee_scolaire),
+        'evaluation': (Evaluation, Evaluation.commentaire, Evaluation.periode,
+                       Evaluation.annee_scolaire),
+        'eleve': (Eleve, Eleve.prenom + ' ' + Eleve.nom + ' ' +
+                  db.func.coalesce(Eleve.observations, ''), db.null(), db.null()),
+    }
+    resultats = []
+    for type_source in types:
+        modele, colonne, periode, annee_scolaire = sources[type_source]
+        requete = db.session.query(modele.id, colonne, periode, annee_scolaire, Eleve)
+        if modele is not Eleve:
+            requete = requete.join(Eleve, Eleve.id == modele.eleve_id)
+        if utilisateur.role != 'admin':
+            requete = requete.filter(Eleve.classe_id.in_(sorted(utilisateur.classe_ids)))
+        for terme in termes:
+            requete = requete.filter(colonne.ilike(f'%{terme}%'))
+        for objet_id, texte, periode_objet, annee_objet, eleve in \
+                requete.limit(limite - len(resultats)):
+            debut = max(0, texte.lower().find(termes[0].lower()) - 60)
+            resultats.append({
+                'type': type_source,
+                'id': objet_id,
+                'eleve': {'id': eleve.id, 'nom': eleve.nom, 'prenom': eleve.prenom,
+                          'classe_id': eleve.classe_id},
+                'periode': periode_objet,
+                'annee_scolaire': annee_objet,
+                'extrait': html.escape(('…' if debut else '') + texte[debut:debut + 160]),
+                'score': None,
+                'curseur': None,
+            })
+        if len(resultats) >= limite:
+            break
+    return resultats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recherche plein texte LSU")
+    parser.add_argument('texte', nargs='?')
+    parser.add_argument('--reconstruire', action='store_true',
+                        help="réindexe commentaires, évaluations et élèves")
+    parser.add_argument('--utilisateur', default='admin')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.reconstruire:
+            with db.engine.begin() as connexion:
+                reconstruire(connexion)
+            print("✅ Index de recherche reconstruit")
+        if args.texte:
+            import cache_utilisateurs
+            utilisateur = cache_utilisateurs.charger(
+                User.query.filter_by(username=args.utilisateur).one().id)
+            for resultat in rechercher(args.texte, utilisateur):
+                print(f"{resultat['score']:>8} {resultat['type']:<12} "
+                      f"{resultat['eleve']['prenom']} {resultat['eleve']['nom']} : "
+                      f"{resultat['extrait']}")
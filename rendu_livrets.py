@@ -0,0 +1,101 @@
+"""
+Rendu PDF des livrets scolaires pour le système LSU École du Cap
+Module sans dépendance à l'application ni à la base : il est importé seul par
+les processus de rendu (contexte 'spawn') d'export_livrets.py, qui ne
+rechargent ni Flask ni SQLAlchemy. Un livret et ses données communes ne
+contiennent que des types simples.
+"""
+
+from io import BytesIO
+from xml.sax.saxutils import escape
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from werkzeug.utils import secure_filename
+
+
+NOM_ECOLE = 'École du Cap'
+TYPES_COMMENTAIRE = {
+    'bulletin': 'Appréciation du bulletin',
+    'livret': 'Appréciation du livret',
+    'observation': 'Observations',
+}
+COULEURS_NIVEAUX = {
+    'Insuffisant': colors.HexColor('#f8d7da'),
+    'Fragile': colors.HexColor('#fff3cd'),
+    'Satisfaisant': colors.HexColor('#d1e7dd'),
+    'Très bien': colors.HexColor('#cfe2ff'),
+}
+STYLES = getSampleStyleSheet()
+
+
+def nom_fichier_livret(livret, commun):
+    """Chemin du livret dans l'archive : classe/NOM_Prenom_id.pdf"""
+    classe = commun['classes'][livret['classe_id']]
+    dossier = secure_filename(f"{classe['nom']}_{classe['annee_scolaire']}")
+    fichier = secure_filename(f"{livret['nom']}_{livret['prenom']}")
+    return f"{dossier}/{fichier}_{livret['eleve_id']}.pdf"
+
+
+def rendre_livret(livret, commun):
+    """Rend le livret PDF d'un élève : (nom dans l'archive, contenu)"""
+    classe = commun['classes'][livret['classe_id']]
+    texte = STYLES['BodyText']
+    contenu = BytesIO()
+    document = SimpleDocTemplate(
+        contenu, pagesize=A4, leftMargin=2 * cm, rightMargin=2 * cm,
+        topMargin=1.5 * cm, bottomMargin=1.5 * cm,
+        title=f"Livret scolaire - {livret['prenom']} {livret['nom']}",
+        author=NOM_ECOLE,
+    )
+
+    elements = [
+        Paragraph(f"Livret Scolaire Unique — {escape(NOM_ECOLE)}", STYLES['Title']),
+        Paragraph(f"<b>{escape(livret['prenom'])} {escape(livret['nom'])}</b>, "
+                  f"né(e) le {livret['date_naissance']}", STYLES['Heading2']),
+        Paragraph(f"Classe : {escape(classe['nom'])} — Année scolaire "
+                  f"{escape(classe['annee_scolaire'])} — Période "
+                  f"{escape(commun['periode'])}<br/>Enseignant(e) : "
+                  f"{escape(classe['enseignant'])}", texte),
+        Spacer(1, 0.5 * cm),
+    ]
+
+    if livret['evaluations']:
+        lignes = [['Matière', 'Niveau', 'Compétences et remarques']]
+        style = [
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e9ecef')),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]
+        for i, evaluation in enumerate(livret['evaluations'], start=1):
+            details = [f"{escape(code)} : {escape(niveau)}"
+                       for code, niveau in evaluation['competences']]
+            if evaluation['commentaire']:
+                details.append(f"<i>{escape(evaluation['commentaire'])}</i>")
+            lignes.append([
+                Paragraph(escape(commun['matieres'].get(evaluation['matiere_id'], '')), texte),
+                evaluation['niveau'] or '-',
+                Paragraph('<br/>'.join(details), texte),
+            ])
+            if evaluation['niveau'] in COULEURS_NIVEAUX:
+                style.append(('BACKGROUND', (1, i), (1, i),
+                              COULEURS_NIVEAUX[evaluation['niveau']]))
+        tableau = Table(lignes, colWidths=[4.5 * cm, 3 * cm, 9.5 * cm], repeatRows=1)
+        tableau.setStyle(TableStyle(style))
+        elements.append(tableau)
+    else:
+        elements.append(Paragraph("Aucune évaluation pour cette période.", texte))
+
+    for type_commentaire, titre in TYPES_COMMENTAIRE.items():
+        if livret['commentaires'].get(type_commentaire):
+            elements += [
+                Spacer(1, 0.4 * cm),
+                Paragraph(titre, STYLES['Heading3']),
+                Paragraph(escape(livret['commentaires'][type_commentaire])
+                          .replace('\n', '<br/>'), texte),
+            ]
+
+    document.build(elements)
+    return nom_fichier_livret(livret, commun), contenu.getvalue()
@@ -3,15 +3,37 @@ Routes principales du système LSU École du Cap
 Gestion de toutes les fonctionnalités de l'application
 """
 
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask import (render_template, request, redirect, url_for, flash, jsonify,
+                   Response, stream_with_context)
 from flask_login import login_required, current_user, login_user, logout_user
 from werkzeug.utils import secure_filename
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, contains_eager, undefer
 from app import app, db
-from models import User, Classe, Eleve, Matiere, Evaluation, Commentaire, Parametre
+from models import (User, Classe, Eleve, Matiere, Evaluation, Commentaire,
+                    Parametre, TacheIA, EvaluationCompetence,
+                    NIVEAUX_NON_ATTEINTS)
 import os
 import json
+import functools
 from datetime import datetime
-import openai
+from generation_ia import (fournisseur_actif, construire_prompt_ia, cle_prompt,
+                           flux_ia, jetons_generation)
+from file_attente import enfiler, enfiler_lot, progression_lot
+from budget_requetes import budget_requetes
+from synthese_niveaux import synthese_classe
+from modeles_commentaires import composer_eleve, composer_classe, evaluations_eleve
+from import_donnees import ImportDonnees, lire_lignes
+from export_livrets import charger_lot, generer_zip
+from photos import enregistrer_original, variantes_pretes, photo_affichee, associer_photo
+from versions_donnees import reponse_conditionnelle, fragment
+import api
+import cache_ia
+import cache_parametres
+import metriques
+import modeles_commentaires
+import recherche
+import synchro
 
 
 # ===== ROUTES D'AUTHENTIFICATION =====
@@ -47,33 +69,56 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@reponse_conditionnelle
+@budget_requetes(2)
 def dashboard():
     """Tableau de bord principal"""
-    # Statistiques pour l'enseignant
-    classes = Classe.query.filter_by(enseignant_id=current_user.id).all()
-    total_eleves = sum(len(classe.eleves) for classe in classes)
-    
-    # Évaluations récentes
-    evaluations_recentes = Evaluation.query.join(Classe).filter(
-        Classe.enseignant_id == current_user.id
-    ).order_by(Evaluation.date_evaluation.desc()).limit(5).all()
-    
-    return render_template('dashboard.html', 
-                         classes=classes,
-                         total_eleves=total_eleves,
-                         evaluations_recentes=evaluations_recentes)
+    @functools.cache
+    def donnees():
+        # Statistiques pour l'enseignant (effectifs comptés par sous-requête)
+        classes = Classe.query.options(undefer(Classe.nb_eleves)).filter_by(
+            enseignant_id=current_user.id
+        ).all()
+        total_eleves = sum(classe.nb_eleves for classe in classes)
+
+        # Évaluations récentes
+        evaluations_recentes = Evaluation.query.join(Classe).filter(
+            Classe.enseignant_id == current_user.id
+        ).options(
+            joinedload(Evaluation.eleve), joinedload(Evaluation.matiere)
+        ).order_by(Evaluation.date_evaluation.desc()).limit(5).all()
+        return {'classes': classes, 'total_eleves': total_eleves,
+                'evaluations_recentes': evaluations_recentes}
+
+    # Fragments rendus une fois par version des données de l'enseignant
+    return render_template(
+        'dashboard.html',
+        statistiques=fragment('dashboard_statistiques',
+                              'fragments/dashboard_statistiques.html', donnees),
+        mes_classes=fragment('dashboard_classes',
+                             'fragments/dashboard_classes.html', donnees),
+        evaluations_recentes=fragment('evaluations_recentes',
+                                      'fragments/evaluations_recentes.html', donnees))
 
 
 # ===== GESTION DES CLASSES =====
 
 @app.route('/classes')
 @login_required
+@reponse_conditionnelle
+@budget_requetes(1)
 def classes():
     """Liste des classes de l'enseignant"""
-    classes_list = Classe.query.filter_by(
-        enseignant_id=current_user.id
-    ).order_by(Classe.nom).all()
-    return render_template('classes/liste.html', classes=classes_list)
+    def donnees():
+        classes_list = Classe.query.options(
+            undefer(Classe.nb_eleves), joinedload(Classe.enseignant)
+        ).filter_by(
+            enseignant_id=current_user.id
+        ).order_by(Classe.nom).all()
+        return {'classes': classes_list}
+    return render_template(
+        'classes/liste.html',
+        cartes=fragment('classes_cartes', 'fragments/classes_cartes.html', donnees))
 
 
 @app.route('/classes/nouvelle', methods=['GET', 'POST'])
@@ -114,22 +159,44 @@ def detail_classe(classe_id):
     classe = Classe.query.get_or_404(classe_id)
     
     # Vérification des droits
-    if classe.enseignant_id != current_user.id:
+    if not current_user.possede_classe(classe.id):
         flash('Accès non autorisé', 'error')
         return redirect(url_for('classes'))
     
-    return render_template('classes/detail.html', classe=classe)
+    synthese = synthese_classe(classe.id, classe.annee_scolaire)
+    return render_template('classes/detail.html', classe=classe,
+                           synthese=synthese)
+
+
+@app.route('/classes/<int:classe_id>/synthese')
+@login_required
+@budget_requetes(2)
+def synthese_niveaux_classe(classe_id):
+    """Répartition des niveaux par matière et période (table de synthèse)"""
+    classe = Classe.query.get_or_404(classe_id)
+    if not current_user.possede_classe(classe.id):
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    return jsonify({
+        'classe_id': classe.id,
+        'annee_scolaire': classe.annee_scolaire,
+        'synthese': synthese_classe(classe.id, classe.annee_scolaire)
+    })
 
 
 # ===== GESTION DES ÉLÈVES =====
 
 @app.route('/eleves')
 @login_required
+@reponse_conditionnelle
+@budget_requetes(1)
 def eleves():
     """Liste des élèves de l'enseignant"""
     eleves_list = Eleve.query.join(Classe).filter(
         Classe.enseignant_id == current_user.id
-    ).order_by(Eleve.nom, Eleve.prenom).all()
+    ).options(contains_eager(Eleve.classe)).order_by(
+        Eleve.nom, Eleve.prenom
+    ).all()
     return render_template('eleves/liste.html', eleves=eleves_list)
 
 
@@ -147,8 +214,7 @@ def nouvel_eleve():
         observations = request.form.get('observations', '')
         
         # Vérification des droits sur la classe
-        classe = Classe.query.get(classe_id)
-        if not classe or classe.enseignant_id != current_user.id:
+        if not current_user.possede_classe(classe_id):
             flash('Classe non autorisée', 'error')
             return redirect(url_for('eleves'))
         
@@ -170,16 +236,21 @@ def nouvel_eleve():
 
 @app.route('/eleves/<int:eleve_id>')
 @login_required
+@budget_requetes(3)
 def detail_eleve(eleve_id):
     """Détails d'un élève"""
-    eleve = Eleve.query.get_or_404(eleve_id)
+    eleve = Eleve.query.options(joinedload(Eleve.classe)).filter_by(
+        id=eleve_id
+    ).first_or_404()
     
     # Vérification des droits
-    if eleve.classe.enseignant_id != current_user.id:
+    if not current_user.possede_classe(eleve.classe_id):
         flash('Accès non autorisé', 'error')
         return redirect(url_for('eleves'))
     
-    evaluations = Evaluation.query.filter_by(eleve_id=eleve_id).all()
+    evaluations = Evaluation.query.options(
+        joinedload(Evaluation.matiere)
+    ).filter_by(eleve_id=eleve_id).all()
     commentaires = Commentaire.query.filter_by(eleve_id=eleve_id).all()
     
     return render_template('eleves/detail.html', 
@@ -190,57 +261,113 @@ def detail_eleve(eleve_id):
 
 # ===== GÉNÉRATEUR IA DE COMMENTAIRES =====
 
+MODES_GENERATION = ('ia', 'modele')
+
+
+def mode_generation(data):
+    """(mode, graine, réponse d'erreur) : 'ia' (par défaut) ou 'modele'"""
+    mode = data.get('mode') or 'ia'
+    if mode not in MODES_GENERATION:
+        return mode, 0, (jsonify({'error': f'Mode de génération inconnu : {mode}'}), 400)
+    try:
+        graine = int(data.get('graine') or 0)
+    except (TypeError, ValueError):
+        return mode, 0, (jsonify({'error': 'Graine invalide'}), 400)
+    return mode, graine, None
+
+
 @app.route('/generateur')
 @login_required
+@budget_requetes(2)
 def generateur():
     """Page du générateur IA de commentaires"""
     eleves = Eleve.query.join(Classe).filter(
         Classe.enseignant_id == current_user.id
-    ).order_by(Eleve.nom, Eleve.prenom).all()
+    ).options(contains_eager(Eleve.classe)).order_by(
+        Eleve.nom, Eleve.prenom
+    ).all()
+    classes = Classe.query.filter_by(
+        enseignant_id=current_user.id
+    ).order_by(Classe.nom).all()
     
-    return render_template('generateur/index.html', eleves=eleves)
+    return render_template('generateur/index.html', eleves=eleves,
+                           classes=classes)
 
 
 @app.route('/generateur/commentaire', methods=['POST'])
 @login_required
 def generer_commentaire():
-    """Génération d'un commentaire par IA"""
+    """Génération d'un commentaire par IA ou par modèles (mode 'modele')"""
+    data = request.get_json() or {}
+    mode, graine, erreur = mode_generation(data)
+    if erreur:
+        return erreur
     try:
-        data = request.get_json()
         eleve_id = data.get('eleve_id')
         type_commentaire = data.get('type_commentaire')
         periode = data.get('periode')
         observations = data.get('observations', '')
+        regenerer = bool(data.get('regenerer', False))
         
         # Vérification des droits
-        eleve = Eleve.query.get_or_404(eleve_id)
-        if eleve.classe.enseignant_id != current_user.id:
+        eleve = Eleve.query.options(joinedload(Eleve.classe)).filter_by(
+            id=eleve_id
+        ).first_or_404()
+        if not current_user.possede_classe(eleve.classe_id):
             return jsonify({'error': 'Accès non autorisé'}), 403
         
-        # Récupération des évaluations de l'élève
-        evaluations = Evaluation.query.filter_by(
-            eleve_id=eleve_id,
-            periode=periode
-        ).all()
+        # Évaluations de l'élève pour l'année de sa classe (mêmes données
+        # pour les deux modes et pour la génération de la classe entière)
+        evaluations = evaluations_eleve(eleve, periode)
+        
+        # Mode modèles : composé et enregistré immédiatement, sans appel IA
+        if mode == 'modele':
+            contenu = composer_eleve(eleve, evaluations, type_commentaire,
+                                     periode, observations, graine)
+            nouveau_commentaire = Commentaire(
+                eleve_id=eleve_id,
+                auteur_id=current_user.id,
+                type_commentaire=type_commentaire,
+                periode=periode,
+                annee_scolaire=eleve.classe.annee_scolaire,
+                contenu=contenu,
+                version_ia=modeles_commentaires.VERSION
+            )
+            db.session.add(nouveau_commentaire)
+            db.session.commit()
+            return jsonify({
+                'success': True,
+                'mode': mode,
+                'commentaire': contenu,
+                'id_commentaire': nouveau_commentaire.id
+            })
         
         # Construction du prompt pour l'IA
         prompt = construire_prompt_ia(eleve, evaluations, type_commentaire, 
                                     observations, periode)
         
-        # Appel à l'API OpenAI
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Tu es un enseignant expérimenté qui rédige des commentaires d'évaluation pour le Livret Scolaire Unique. Tes commentaires sont bienveillants, précis et constructifs."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        
-        commentaire_ia = response.choices[0].message.content
+        # Réponse immédiate si le même prompt est déjà en cache
+        fournisseur = fournisseur_actif()
+        commentaire_ia = None if regenerer else \
+            cache_ia.lire(cle_prompt(prompt, fournisseur))
+        if commentaire_ia is None:
+            # Sinon l'appel au modèle est confié aux workers de la file
+            tache_id = enfiler('commentaire', current_user.id, {
+                'eleve_id': eleve.id,
+                'type_commentaire': type_commentaire,
+                'periode': periode,
+                'annee_scolaire': eleve.classe.annee_scolaire,
+                'prompt': prompt,
+                'regenerer': regenerer
+            })
+            return jsonify({
+                'success': True,
+                'tache_id': tache_id,
+                'statut': url_for('statut_tache', tache_id=tache_id)
+            }), 202
         
         # Sauvegarde du commentaire
+        jetons_prompt, jetons_reponse = jetons_generation(prompt, commentaire_ia)
         nouveau_commentaire = Commentaire(
             eleve_id=eleve_id,
             auteur_id=current_user.id,
@@ -248,8 +375,10 @@ def generer_commentaire():
             periode=periode,
             annee_scolaire=eleve.classe.annee_scolaire,
             contenu=commentaire_ia,
-            version_ia="gpt-3.5-turbo",
-            prompt_utilise=prompt
+            version_ia=fournisseur.version,
+            prompt_utilise=prompt,
+            jetons_prompt=jetons_prompt,
+            jetons_reponse=jetons_reponse
         )
         db.session.add(nouveau_commentaire)
         db.session.commit()
@@ -257,42 +386,317 @@ def generer_commentaire():
         return jsonify({
             'success': True,
             'commentaire': commentaire_ia,
-            'id_commentaire': nouveau_commentaire.id
+            'id_commentaire': nouveau_commentaire.id,
+            'cache': True
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-def construire_prompt_ia(eleve, evaluations, type_commentaire, observations, 
-                        periode):
-    """Construction du prompt pour l'IA"""
-    prompt = f"""
-    Élève: {eleve.prenom} {eleve.nom} - Classe: {eleve.classe.nom}
-    Période: {periode}
-    Type de commentaire: {type_commentaire}
+@app.route('/generateur/taches/<int:tache_id>')
+@login_required
+def statut_tache(tache_id):
+    """État d'une génération confiée à la file d'attente"""
+    tache = TacheIA.query.get_or_404(tache_id)
+    if tache.auteur_id != current_user.id:
+        return jsonify({'error': 'Accès non autorisé'}), 403
     
-    Observations de l'enseignant: {observations}
+    reponse = {
+        'tache_id': tache.id,
+        'statut': tache.statut,
+        'tentatives': tache.tentatives
+    }
+    if tache.statut == 'terminee':
+        reponse.update(tache.get_resultat())
+    elif tache.erreur:
+        reponse['error'] = tache.erreur
+    return jsonify(reponse)
+
+
+@app.route('/generateur/commentaire/flux', methods=['POST'])
+@login_required
+def generer_commentaire_flux():
+    """Génération d'un commentaire par IA diffusée en Server-Sent Events"""
+    data = request.get_json() or {}
+    mode, graine, erreur = mode_generation(data)
+    if erreur:
+        return erreur
+    eleve_id = data.get('eleve_id')
+    type_commentaire = data.get('type_commentaire')
+    periode = data.get('periode')
+    observations = data.get('observations', '')
+    regenerer = bool(data.get('regenerer', False))
+    
+    # Vérification des droits
+    eleve = Eleve.query.options(joinedload(Eleve.classe)).filter_by(
+        id=eleve_id
+    ).first_or_404()
+    if not current_user.possede_classe(eleve.classe_id):
+        return jsonify({'error': 'Accès non autorisé'}), 403
     
-    Évaluations de la période:
-    """
+    evaluations = evaluations_eleve(eleve, periode)
+    if mode == 'modele':
+        # Texte complet envoyé en un seul fragment, sans prompt ni cache IA
+        contenu_modele = composer_eleve(eleve, evaluations, type_commentaire,
+                                        periode, observations, graine)
+        prompt = cle = None
+        version = modeles_commentaires.VERSION
+    else:
+        contenu_modele = None
+        prompt = construire_prompt_ia(eleve, evaluations, type_commentaire,
+                                      observations, periode)
+        fournisseur = fournisseur_actif()
+        cle = cle_prompt(prompt, fournisseur)
+        version = fournisseur.version
+    auteur_id = current_user.id
+    annee_scolaire = eleve.classe.annee_scolaire
     
-    for eval in evaluations:
-        prompt += f"- {eval.matiere.nom}: {eval.niveau}\n"
-        if eval.commentaire:
-            prompt += f"  Commentaire: {eval.commentaire}\n"
+    def evenement(nom, contenu):
+        return f"event: {nom}\ndata: {json.dumps(contenu, ensure_ascii=False)}\n\n"
     
-    prompt += f"""
-    Génère un commentaire {type_commentaire} pour {eleve.prenom} {eleve.nom} 
-    en te basant sur ces informations. Le commentaire doit être:
-    - Bienveillant et encourageant
-    - Précis sur les acquis et les difficultés
-    - Constructif avec des pistes d'amélioration
-    - Adapté au niveau de la classe {eleve.classe.nom}
-    - Entre 3 et 5 phrases maximum
-    """
+    def flux():
+        depuis_cache = False
+        releve = {}
+        commentaire_ia = contenu_modele
+        try:
+            if commentaire_ia is None and not regenerer:
+                commentaire_ia = cache_ia.lire(cle)
+                depuis_cache = commentaire_ia is not None
+            if commentaire_ia is not None:
+                yield evenement('fragment', {'texte': commentaire_ia})
+            else:
+                fragments = []
+                source = flux_ia(prompt, fournisseur, releve)
+                try:
+                    for fragment in source:
+                        fragments.append(fragment)
+                        yield evenement('fragment', {'texte': fragment})
+                finally:
+                    # Une déconnexion du client ferme ce générateur : on
+                    # interrompt alors aussi l'appel en cours vers le modèle
+                    source.close()
+                commentaire_ia = ''.join(fragments)
+                cache_ia.ecrire(cle, fournisseur.modele, commentaire_ia)
+            
+            # Sauvegarde une fois le flux complet (sans jetons en mode modèles)
+            jetons_prompt = jetons_reponse = None
+            if mode == 'ia':
+                jetons_prompt, jetons_reponse = jetons_generation(
+                    prompt, commentaire_ia, releve)
+            nouveau_commentaire = Commentaire(
+                eleve_id=eleve_id,
+                auteur_id=auteur_id,
+                type_commentaire=type_commentaire,
+                periode=periode,
+                annee_scolaire=annee_scolaire,
+                contenu=commentaire_ia,
+                version_ia=version,
+                prompt_utilise=prompt,
+                jetons_prompt=jetons_prompt,
+                jetons_reponse=jetons_reponse
+            )
+            db.session.add(nouveau_commentaire)
+            db.session.commit()
+            
+            yield evenement('fin', {
+                'success': True,
+                'mode': mode,
+                'id_commentaire': nouveau_commentaire.id,
+                'cache': depuis_cache
+            })
+        except Exception as e:
+            db.session.rollback()
+            yield evenement('erreur', {'error': str(e)})
     
-    return prompt
+    return Response(stream_with_context(flux()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache',
+                             'X-Accel-Buffering': 'no'})
+
+
+@app.route('/generateur/lot', methods=['POST'])
+@login_required
+def generer_commentaires_lot():
+    """Génération des commentaires de toute une classe"""
+    data = request.get_json() or {}
+    mode, graine, erreur = mode_generation(data)
+    if erreur:
+        return erreur
+    try:
+        classe_id = data.get('classe_id')
+        type_commentaire = data.get('type_commentaire')
+        periode = data.get('periode')
+
+        if not classe_id or not type_commentaire or not periode:
+            return jsonify({'error': 'Paramètres manquants'}), 400
+
+        # Vérification des droits
+        classe = Classe.query.get_or_404(classe_id)
+        if not current_user.possede_classe(classe.id):
+            return jsonify({'error': 'Accès non autorisé'}), 403
+
+        # Mode modèles : toute la classe en une passe, réponse immédiate
+        if mode == 'modele':
+            resultats = composer_classe(classe, type_commentaire, periode, graine)
+            db.session.add_all([
+                Commentaire(
+                    eleve_id=resultat['eleve_id'],
+                    auteur_id=current_user.id,
+                    type_commentaire=type_commentaire,
+                    periode=periode,
+                    annee_scolaire=classe.annee_scolaire,
+                    contenu=resultat['commentaire'],
+                    version_ia=modeles_commentaires.VERSION
+                )
+                for resultat in resultats
+            ])
+            db.session.commit()
+            return jsonify({
+                'success': True,
+                'mode': mode,
+                'statut': 'termine',
+                'total': len(resultats),
+                'termines': len(resultats),
+                'erreurs': 0,
+                'resultats': resultats
+            })
+
+        # Un commentaire par élève, confié aux workers de la file
+        lot_id = enfiler_lot(classe, type_commentaire, periode, current_user.id,
+                             forcer=bool(data.get('regenerer', False)))
+        if lot_id is None:
+            # Classe sans élève : lot terminé d'emblée, rien à suivre
+            return jsonify({'success': True, 'statut': 'termine', 'total': 0,
+                            'termines': 0, 'erreurs': 0, 'resultats': []})
+        return jsonify({
+            'success': True,
+            'lot_id': lot_id,
+            'progression': url_for('progression_commentaires_lot', lot_id=lot_id)
+        }), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/generateur/lot/<lot_id>')
+@login_required
+def progression_commentaires_lot(lot_id):
+    """Progression d'une génération par lot"""
+    lot = progression_lot(lot_id, current_user.id)
+    if lot is None:
+        return jsonify({'error': 'Lot introuvable'}), 404
+    return jsonify(lot)
+
+
+@app.route('/generateur/cache')
+@login_required
+def statistiques_cache_ia():
+    """Statistiques du cache des générations IA"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    return jsonify(cache_ia.statistiques())
+
+
+# ===== IMPORT EN MASSE =====
+
+@app.route('/import/<type_import>', methods=['POST'])
+@login_required
+def importer_donnees(type_import):
+    """Import en masse d'élèves ou d'évaluations (CSV, JSON Lines ou tableau JSON)"""
+    if type_import not in ('eleves', 'evaluations'):
+        return jsonify({'error': "Type d'import inconnu"}), 404
+    
+    fichier = request.files.get('fichier')
+    if not fichier or fichier.filename == '':
+        return jsonify({'error': 'Aucun fichier sélectionné'}), 400
+    
+    try:
+        format_fichier = fichier.filename.rsplit('.', 1)[-1].lower()
+        lignes = lire_lignes(fichier.stream, format_fichier,
+                             request.form.get('encodage', 'utf-8-sig'))
+        rapport = ImportDonnees(current_user).importer(type_import, lignes)
+        return jsonify(dict(rapport, success=rapport['erreurs'] == 0))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ===== EXPORT DES LIVRETS =====
+
+@app.route('/export/livrets')
+@login_required
+def exporter_livrets():
+    """Archive ZIP des livrets PDF d'une classe ou de toute l'école"""
+    periode = request.args.get('periode')
+    if not periode:
+        return jsonify({'error': 'Période requise'}), 400
+    
+    requete = Classe.query
+    if request.args.get('classe'):
+        requete = requete.filter_by(id=request.args.get('classe', type=int))
+    if request.args.get('annee_scolaire'):
+        requete = requete.filter_by(annee_scolaire=request.args['annee_scolaire'])
+    # Un enseignant n'exporte que ses classes, l'école entière est réservée à l'admin
+    if current_user.role != 'admin':
+        requete = requete.filter_by(enseignant_id=current_user.id)
+    classe_ids = [classe_id for (classe_id,) in requete.with_entities(Classe.id)]
+    if not classe_ids:
+        return jsonify({'error': 'Classe non trouvée'}), 404
+    
+    commun, livrets = charger_lot(classe_ids, periode)
+    nom_archive = secure_filename(
+        f"livrets_{periode}_{request.args.get('classe', 'ecole')}.zip")
+    return Response(
+        stream_with_context(generer_zip(commun, livrets)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{nom_archive}"'}
+    )
+
+
+# ===== RAPPORTS =====
+
+@app.route('/rapports/competences/<code>')
+@login_required
+@budget_requetes(1)
+def rapport_competence_non_atteinte(code):
+    """Élèves n'ayant pas encore atteint une compétence (une seule requête indexée)"""
+    periode = request.args.get('periode')
+    if not periode:
+        return jsonify({'error': 'Période manquante'}), 400
+    
+    requete = db.session.query(
+        Eleve.id, Eleve.nom, Eleve.prenom, Classe.nom, EvaluationCompetence.niveau
+    ).join(
+        Evaluation, EvaluationCompetence.evaluation_id == Evaluation.id
+    ).join(
+        Eleve, Evaluation.eleve_id == Eleve.id
+    ).join(
+        Classe, Evaluation.classe_id == Classe.id
+    ).filter(
+        EvaluationCompetence.code == code,
+        EvaluationCompetence.niveau.in_(NIVEAUX_NON_ATTEINTS),
+        Evaluation.periode == periode,
+        Classe.enseignant_id == current_user.id
+    )
+    if request.args.get('classe'):
+        requete = requete.filter(Classe.nom == request.args['classe'])
+    if request.args.get('annee_scolaire'):
+        requete = requete.filter(
+            Evaluation.annee_scolaire == request.args['annee_scolaire']
+        )
+    
+    return jsonify({
+        'competence': code,
+        'periode': periode,
+        'eleves': [
+            {'eleve_id': eleve_id, 'nom': nom, 'prenom': prenom,
+             'classe': classe, 'niveau': niveau}
+            for eleve_id, nom, prenom, classe, niveau
+            in requete.order_by(Eleve.nom, Eleve.prenom)
+        ]
+    })
 
 
 # ===== GESTION DES PHOTOS =====
@@ -308,38 +712,149 @@ def photos():
 @app.route('/photos/upload', methods=['POST'])
 @login_required
 def upload_photo():
-    """Upload d'une photo de classe"""
+    """Upload d'une photo de classe ou d'élève"""
     if 'photo' not in request.files:
         flash('Aucun fichier sélectionné', 'error')
         return redirect(url_for('photos'))
     
     file = request.files['photo']
-    classe_id = request.form.get('classe_id')
+    # Identifiant non numérique : None, refusé comme une classe d'un autre
+    classe_id = request.form.get('classe_id', type=int)
+    eleve_id = request.form.get('eleve_id', type=int)
     
     if file.filename == '':
         flash('Aucun fichier sélectionné', 'error')
         return redirect(url_for('photos'))
     
     # Vérification des droits
-    classe = Classe.query.get_or_404(classe_id)
-    if classe.enseignant_id != current_user.id:
+    if request.form.get('eleve_id'):
+        eleve = Eleve.query.get_or_404(eleve_id) if eleve_id is not None else None
+        cible, cible_id, autorise = 'eleve', eleve_id, \
+            eleve is not None and current_user.possede_classe(eleve.classe_id)
+    else:
+        cible, cible_id, autorise = 'classe', classe_id, \
+            classe_id is not None and current_user.possede_classe(classe_id)
+    if not autorise:
         flash('Accès non autorisé', 'error')
         return redirect(url_for('photos'))
     
-    if file:
-        filename = secure_filename(f"classe_{classe_id}_{file.filename}")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'photos', filename)
-        file.save(filepath)
-        
-        # Mise à jour de la base de données
-        classe.photo_classe = f"uploads/photos/{filename}"
+    try:
+        empreinte = enregistrer_original(file)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('photos'))
+    
+    # Photo déjà reçue : ses versions web existent, sinon elles sont
+    # produites par la file d'attente et associées une fois prêtes
+    if variantes_pretes(empreinte):
+        associer_photo(cible, cible_id, photo_affichee(empreinte))
         db.session.commit()
-        
         flash('Photo uploadée avec succès !', 'success')
+    else:
+        enfiler('photo', current_user.id,
+                {'empreinte': empreinte, 'cible': cible, 'cible_id': cible_id})
+        flash('Photo reçue : elle sera affichée dès que ses versions web seront prêtes', 'success')
     
     return redirect(url_for('photos'))
 
 
+# ===== API JSON =====
+
+@app.route('/api/<any(eleves, evaluations, commentaires):ressource>')
+@login_required
+@budget_requetes(1)
+def api_liste(ressource):
+    """Liste paginée par curseur (filtres, champs, limite, ordre, curseur)"""
+    try:
+        return jsonify(api.page(ressource, request.args, current_user))
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/synchro')
+@login_required
+@budget_requetes(5)
+def synchro_modifications():
+    """Lignes modifiées depuis la révision du client (gzip si accepté)"""
+    try:
+        depuis = int(request.args.get('depuis', 0))
+        limite = int(request.args.get('limite', synchro.LIMITE_DEFAUT))
+    except ValueError:
+        return jsonify({'error': 'Révision ou limite invalide'}), 400
+    try:
+        return synchro.reponse_json(synchro.modifications(depuis, current_user, limite))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/synchro', methods=['POST'])
+@login_required
+def synchro_envoi():
+    """Modifications du client hors ligne, avec détection des conflits"""
+    try:
+        corps = synchro.lire_corps()
+        return synchro.reponse_json(
+            synchro.appliquer(corps.get('modifications'), current_user))
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Modifications incompatibles avec les données du serveur'}), 409
+
+
+# ===== RECHERCHE =====
+
+@app.route('/recherche')
+@login_required
+@budget_requetes(1)
+def rechercher_texte():
+    """Recherche plein texte dans les commentaires, évaluations et élèves"""
+    texte = request.args.get('q', '').strip()
+    if not texte:
+        return jsonify({'error': 'Texte à rechercher manquant'}), 400
+    types = [t for t in request.args.get('type', '').split(',') if t] or None
+    try:
+        limite = max(1, min(int(request.args.get('limite', 20)), recherche.LIMITE_MAX))
+    except ValueError:
+        return jsonify({'error': 'Limite invalide'}), 400
+    try:
+        resultats = recherche.rechercher(texte, current_user, types, limite,
+                                         request.args.get('apres'))
+    except ValueError:
+        return jsonify({'error': 'Curseur invalide'}), 400
+    
+    # Page pleine : la suivante reprend après son dernier résultat
+    suivant = resultats[-1]['curseur'] if len(resultats) == limite else None
+    return jsonify({
+        'q': texte,
+        'resultats': resultats,
+        'suivant': suivant
+    })
+
+
+# ===== MÉTRIQUES =====
+
+@app.route('/metrics')
+def metriques_prometheus():
+    """Métriques techniques au format Prometheus"""
+    if not metriques.acces_autorise():
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    contenu, type_contenu = metriques.exposer()
+    return Response(contenu, mimetype=type_contenu)
+
+
+@app.route('/api/metrics')
+def metriques_metier():
+    """Indicateurs métier au format Prometheus"""
+    if not metriques.acces_autorise():
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    contenu, type_contenu = metriques.exposer_metier()
+    return Response(contenu, mimetype=type_contenu)
+
+
 # ===== PARAMÈTRES =====
 
 @app.route('/parametres')
@@ -366,10 +881,8 @@ def modifier_parametre():
         cle = data.get('cle')
         valeur = data.get('valeur')
         
-        parametre = Parametre.query.filter_by(cle=cle).first()
-        if parametre:
-            parametre.set_valeur(valeur)
-            db.session.commit()
+        # Écriture en base puis invalidation du cache des paramètres
+        if cache_parametres.definir(cle, valeur):
             return jsonify({'success': True})
         else:
             return jsonify({'error': 'Paramètre non trouvé'}), 404
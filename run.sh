@@ -19,6 +19,15 @@ if [ ! -f "lsu_ecole_cap.db" ]; then
     python init_db.py
 fi
 
+# Mise à jour du schéma (index, nouvelles tables)
+python migrations.py
+
+# Lancement des workers de la file d'attente IA
+echo "🧵 Lancement des workers IA..."
+python file_attente.py &
+WORKERS_PID=$!
+trap "kill $WORKERS_PID 2>/dev/null" EXIT
+
 # Lancement de l'application
 echo "🌐 Lancement de l'application..."
 echo "📱 Accédez à http://localhost:5000"
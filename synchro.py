@@ -0,0 +1,471 @@
+"""
+Synchronisation différentielle du client hors ligne (LSU École du Cap)
+Chaque écriture d'un élève, d'une évaluation ou d'un commentaire est inscrite,
+dans la même transaction, au journal (table journal_synchro) sous une
+révision croissante. Une ligne n'y figure qu'une fois, avec sa dernière
+révision ; les suppressions y restent comme pierres tombales. Le client
+envoie la dernière révision reçue et ne reçoit que les lignes modifiées
+depuis : le volume échangé dépend des modifications, pas de la taille de
+l'école. Ses propres modifications portent la révision sur laquelle elles
+ont été faites : une ligne modifiée entre-temps sur le serveur est renvoyée
+en conflit, sans être écrasée.
+
+    GET  /api/synchro?depuis=1234
+    POST /api/synchro  {"modifications": [{"ressource": "evaluations", "id": 12,
+                        "revision": 1234, "champs": {"niveau": "Très bien"}}]}
+
+Les insertions groupées qui contournent l'ORM appellent journaliser().
+"""
+
+from app import app, db
+from models import Classe, Eleve, Matiere, Evaluation, Commentaire, JournalSynchro, NIVEAUX
+from flask import request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+import api
+import gzip
+import io
+import json
+
+
+LIMITE_DEFAUT = 1000
+LIMITE_MAX = 5000
+MODIFICATIONS_MAX = 500  # modifications envoyées par requête
+COMPRESSION_MIN = 1024  # octets : en dessous, gzip ne fait rien gagner
+CORPS_MAX = 8 * 1024 * 1024  # corps décompressé
+
+# Colonnes que le client peut écrire ; classe_id d'une évaluation et
+# auteur_id d'un commentaire sont fixés par le serveur
+CHAMPS_MODIFIABLES = {
+    'eleves': ('nom', 'prenom', 'date_naissance', 'classe_id', 'observations'),
+    'evaluations': ('eleve_id', 'matiere_id', 'periode', 'annee_scolaire',
+                    'niveau', 'commentaire'),
+    'commentaires': ('eleve_id', 'type_commentaire', 'periode',
+                     'annee_scolaire', 'contenu'),
+}
+
+
+def _par_lots(valeurs, taille=500):
+    valeurs = list(valeurs)
+    for debut in range(0, len(valeurs), taille):
+        yield valeurs[debut:debut + taille]
+
+
+# ----- Journal -----
+
+def journaliser(connexion, ressource, lignes, supprime=False):
+    """Inscrit les lignes [(id, classe_id)] au journal sous de nouvelles révisions"""
+    lignes = dict(lignes)
+    if not lignes:
+        return
+    journal = JournalSynchro.__table__
+    if connexion.dialect.name == 'postgresql':
+        # Révisions visibles dans l'ordre : un client ne doit jamais lire la
+        # révision n+1 avant que la transaction qui écrit n soit validée
+        connexion.execute(db.text("SELECT pg_advisory_xact_lock(hashtext('journal_synchro'))"))
+    precedentes = {}
+    for lot in _par_lots(sorted(lignes)):
+        condition = (journal.c.ressource == ressource) & journal.c.ligne_id.in_(lot)
+        for entree in connexion.execute(db.select(
+                journal.c.ligne_id, journal.c.classe_id, journal.c.classe_precedente
+        ).where(condition)):
+            precedentes[entree.ligne_id] = entree
+        connexion.execute(journal.delete().where(condition))
+    maintenant = datetime.utcnow()
+    entrees = []
+    for ligne_id in sorted(lignes):
+        classe_id = lignes[ligne_id]
+        precedente = precedentes.get(ligne_id)
+        if precedente is None:
+            classe_precedente = None
+        elif precedente.classe_id != classe_id:
+            classe_precedente = precedente.classe_id
+        else:
+            classe_precedente = precedente.classe_precedente
+        entrees.append({'ressource': ressource, 'ligne_id': ligne_id,
+                        'classe_id': classe_id, 'classe_precedente': classe_precedente,
+                        'supprime': supprime, 'date_modification': maintenant})
+    connexion.execute(journal.insert(), entrees)
+
+
+def _sources():
+    """(ressource, sélection (id, classe_id)) des lignes synchronisées"""
+    return [
+        ('eleves', db.select(Eleve.id, Eleve.classe_id)),
+        ('evaluations', db.select(Evaluation.id, Evaluation.classe_id)),
+        ('commentaires', db.select(Commentaire.id, Eleve.classe_id).join(Eleve)),
+    ]
+
+
+def initialiser_journal(connexion):
+    """Inscrit au journal les lignes qui n'y figurent pas encore (migration, volume)"""
+    journal = JournalSynchro.__table__
+    maintenant = datetime.utcnow()
+    for ressource, selection in _sources():
+        modele = api.RESSOURCES[ressource].modele
+        absentes = selection.add_columns(
+            db.literal(ressource), db.literal(False), db.literal(maintenant)
+        ).where(~db.exists().where(
+            (journal.c.ressource == ressource) & (journal.c.ligne_id == modele.id)
+        )).order_by(modele.id)
+        connexion.execute(journal.insert().from_select(
+            ['ligne_id', 'classe_id', 'ressource', 'supprime', 'date_modification'],
+            absentes))
+
+
+def revision_courante():
+    """Dernière révision attribuée (0 si le journal est vide)"""
+    return db.session.execute(
+        db.select(db.func.coalesce(db.func.max(JournalSynchro.revision), 0))).scalar()
+
+
+def _revisions(cles):
+    """Révision courante de chaque ligne {(ressource, id): révision}"""
+    par_ressource = {}
+    for ressource, ligne_id in cles:
+        par_ressource.setdefault(ressource, set()).add(ligne_id)
+    revisions = {}
+    for ressource, ids in par_ressource.items():
+        for lot in _par_lots(sorted(ids)):
+            revisions.update({
+                (ressource, ligne_id): revision
+                for ligne_id, revision in db.session.execute(
+                    db.select(JournalSynchro.ligne_id, JournalSynchro.revision)
+                    .where(JournalSynchro.ressource == ressource,
+                           JournalSynchro.ligne_id.in_(lot)))
+            })
+    return revisions
+
+
+# ----- Envoi au client -----
+
+def modifications(depuis, utilisateur, limite=LIMITE_DEFAUT):
+    """Lignes modifiées après la révision depuis, dans le périmètre de l'utilisateur
+
+    Format colonnes + lignes (les noms de champs ne sont pas répétés) ; une
+    ligne sortie du périmètre (élève changé de classe) est une suppression
+    pour ce client. suite indique qu'il faut redemander à partir de revision.
+    """
+    if not 1 <= limite <= LIMITE_MAX:
+        raise ValueError(f'La limite doit être comprise entre 1 et {LIMITE_MAX}')
+    journal = JournalSynchro.__table__
+    requete = db.select(journal.c.revision, journal.c.ressource, journal.c.ligne_id,
+                        journal.c.classe_id, journal.c.supprime
+                        ).where(journal.c.revision > depuis)
+    admin = utilisateur.role == 'admin'
+    if not admin:
+        classes = sorted(utilisateur.classe_ids)
+        requete = requete.where(journal.c.classe_id.in_(classes) |
+                                journal.c.classe_precedente.in_(classes))
+    entrees = db.session.execute(
+        requete.order_by(journal.c.revision).limit(limite + 1)).all()
+    suite = len(entrees) > limite
+    entrees = entrees[:limite]
+
+    a_lire = {nom: {} for nom in CHAMPS_MODIFIABLES}
+    suppressions = {nom: [] for nom in CHAMPS_MODIFIABLES}
+    for entree in entrees:
+        if entree.supprime or not (admin or utilisateur.possede_classe(entree.classe_id)):
+            suppressions[entree.ressource].append(entree.ligne_id)
+        else:
+            a_lire[entree.ressource][entree.ligne_id] = entree.revision
+
+    resultat = {}
+    for nom, revisions in a_lire.items():
+        if not revisions:
+            continue
+        ressource = api.RESSOURCES[nom]
+        champs = ressource.champs
+        colonnes = [getattr(ressource.modele, champ) for champ in champs]
+        lignes = []
+        for lot in _par_lots(sorted(revisions)):
+            lignes.extend(
+                [api.serialiser(valeur) for valeur in ligne] + [revisions[ligne.id]]
+                for ligne in db.session.execute(
+                    db.select(*colonnes).where(ressource.modele.id.in_(lot)))
+            )
+        resultat[nom] = {'champs': [*champs, 'revision'], 'lignes': lignes}
+
+    return {
+        'revision': entrees[-1].revision if suite else max(depuis, revision_courante()),
+        'suite': suite,
+        'modifications': resultat,
+        'suppressions': {nom: ids for nom, ids in suppressions.items() if ids},
+    }
+
+
+# ----- Réception des modifications du client -----
+
+def _convertir(modele, champ, valeur):
+    """Valeur JSON convertie au type de la colonne"""
+    if valeur is None:
+        return None
+    colonne = modele.__table__.c[champ]
+    try:
+        type_python = colonne.type.python_type
+        if type_python is date:
+            return date.fromisoformat(valeur)
+        if type_python is int:
+            if isinstance(valeur, bool):
+                raise ValueError
+            return int(valeur)
+        if not isinstance(valeur, str):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError(f'Valeur invalide pour {champ}')
+    longueur = getattr(colonne.type, 'length', None)
+    if longueur and len(valeur) > longueur:
+        raise ValueError(f'Valeur trop longue pour {champ}')
+    return valeur
+
+
+def _classe(objet):
+    if isinstance(objet, Commentaire):
+        return db.session.get(Eleve, objet.eleve_id).classe_id
+    return objet.classe_id
+
+
+def _conflit(ressource, ligne_id, revision, objet):
+    """Modification refusée : état actuel de la ligne sur le serveur"""
+    serveur = None
+    if objet is not None:
+        serveur = {champ: api.serialiser(getattr(objet, champ))
+                   for champ in api.RESSOURCES[ressource].champs}
+    return {'ressource': ressource, 'id': ligne_id, 'revision': revision,
+            'serveur': serveur}
+
+
+def _appliquer_une(modification, utilisateur, revisions):
+    """Applique une modification dans la session : (objet, conflit)"""
+    ressource = modification.get('ressource')
+    if ressource not in CHAMPS_MODIFIABLES:
+        raise ValueError('Ressource inconnue')
+    modele = api.RESSOURCES[ressource].modele
+    champs = modification.get('champs') or {}
+    if not isinstance(champs, dict):
+        raise ValueError('Champs invalides')
+    inconnus = sorted(set(champs) - set(CHAMPS_MODIFIABLES[ressource]))
+    if inconnus:
+        raise ValueError(f"Champs non modifiables : {', '.join(inconnus)}")
+    valeurs = {champ: _convertir(modele, champ, valeur) for champ, valeur in champs.items()}
+    if valeurs.get('niveau') is not None and valeurs['niveau'] not in NIVEAUX:
+        raise ValueError(f"Niveau invalide : {valeurs['niveau']!r}")
+    autorisee = (lambda classe_id: utilisateur.role == 'admin'
+                 or utilisateur.possede_classe(classe_id))
+
+    if modification.get('id') is None:
+        if modification.get('supprime'):
+            raise ValueError('Suppression sans identifiant')
+        objet = modele(auteur_id=utilisateur.id) if modele is Commentaire else modele()
+    else:
+        try:
+            ligne_id = int(modification['id'])
+            base = int(modification.get('revision') or 0)
+        except (TypeError, ValueError):
+            raise ValueError('Identifiant ou révision invalide')
+        objet = db.session.get(modele, ligne_id)
+        courante = revisions.get((ressource, ligne_id), 0)
+        if objet is None:
+            if courante:  # supprimée sur le serveur depuis
+                return None, _conflit(ressource, ligne_id, courante, None)
+            raise LookupError('Ligne introuvable')
+        if not autorisee(_classe(objet)):
+            raise PermissionError('Accès non autorisé')
+        if courante > base:
+            return None, _conflit(ressource, ligne_id, courante, objet)
+        if modification.get('supprime'):
+            if modele is Eleve and (objet.evaluations or objet.commentaires):
+                raise ValueError("Élève avec évaluations ou commentaires : suppression refusée")
+            db.session.delete(objet)
+            return objet, None
+
+    # Validation sur l'état final avant de toucher à l'objet : une
+    # modification rejetée ne doit rien laisser dans la session
+    etat = {colonne.name: valeurs.get(colonne.name, getattr(objet, colonne.name))
+            for colonne in modele.__table__.columns}
+
+    # Rattachement : classe de l'élève, qui doit être dans le périmètre
+    if modele is Eleve:
+        if etat['classe_id'] is not None and db.session.get(Classe, etat['classe_id']) is None:
+            raise LookupError('Classe introuvable')
+    else:
+        eleve = db.session.get(Eleve, etat['eleve_id']) if etat['eleve_id'] else None
+        if etat['eleve_id'] is not None and eleve is None:
+            raise LookupError('Élève introuvable')
+        if modele is Evaluation:
+            etat['classe_id'] = valeurs['classe_id'] = eleve.classe_id if eleve else None
+            if etat['matiere_id'] is not None and db.session.get(Matiere, etat['matiere_id']) is None:
+                raise LookupError('Matière introuvable')
+        else:
+            etat['classe_id'] = eleve.classe_id if eleve else None
+    if etat['classe_id'] is not None and not autorisee(etat['classe_id']):
+        raise PermissionError('Accès non autorisé')
+
+    manquants = [colonne.name for colonne in modele.__table__.columns
+                 if not colonne.nullable and colonne.default is None
+                 and not colonne.primary_key and etat[colonne.name] is None]
+    if manquants:
+        raise ValueError(f"Champs obligatoires : {', '.join(manquants)}")
+
+    if modele is Evaluation:
+        # Une seule évaluation par élève, matière et période : celle du serveur l'emporte
+        existante = Evaluation.query.filter_by(
+            eleve_id=etat['eleve_id'], matiere_id=etat['matiere_id'],
+            periode=etat['periode'], annee_scolaire=etat['annee_scolaire']).first()
+        if existante is not None and existante is not objet:
+            revision = _revisions([(ressource, existante.id)]).get((ressource, existante.id), 0)
+            return None, _conflit(ressource, existante.id, revision, existante)
+
+    for champ, valeur in valeurs.items():
+        setattr(objet, champ, valeur)
+    if modele is Commentaire and objet.id is not None:
+        objet.modifie = True
+    db.session.add(objet)
+    return objet, None
+
+
+def appliquer(modifications_client, utilisateur):
+    """Applique les modifications du client en une transaction
+
+    Chaque modification est appliquée, refusée en conflit (ligne modifiée
+    sur le serveur après la révision indiquée) ou rejetée en erreur ; ref
+    (facultatif) est renvoyé tel quel pour que le client s'y retrouve.
+    """
+    if not isinstance(modifications_client, list):
+        raise ValueError('Liste de modifications attendue')
+    if len(modifications_client) > MODIFICATIONS_MAX:
+        raise ValueError(f'Au plus {MODIFICATIONS_MAX} modifications par envoi')
+    cles = []
+    for modification in modifications_client:
+        try:
+            cles.append((modification['ressource'], int(modification['id'])))
+        except (TypeError, KeyError, ValueError):
+            continue  # création, ou modification rejetée plus loin
+    revisions = _revisions(cles)
+
+    resultat = {'appliquees': [], 'conflits': [], 'erreurs': []}
+    for position, modification in enumerate(modifications_client):
+        ref = modification.get('ref', position) if isinstance(modification, dict) else position
+        try:
+            if not isinstance(modification, dict):
+                raise ValueError('Modification invalide')
+            with db.session.no_autoflush:
+                objet, conflit = _appliquer_une(modification, utilisateur, revisions)
+        except (ValueError, LookupError, PermissionError) as e:
+            resultat['erreurs'].append({'ref': ref, 'error': str(e)})
+            continue
+        if conflit:
+            resultat['conflits'].append({'ref': ref, **conflit})
+            continue
+        # Écrite aussitôt : identifiant des créations et nouvelle révision
+        # connus, une deuxième modification de la ligne dans l'envoi sur la
+        # même révision de base est un conflit
+        db.session.flush()
+        cle = (modification['ressource'], objet.id)
+        revisions.update(_revisions([cle]))
+        resultat['appliquees'].append({'ref': ref, 'ressource': cle[0], 'id': cle[1],
+                                       'revision': revisions.get(cle)})
+
+    db.session.commit()
+    resultat['revision'] = revision_courante()
+    return resultat
+
+
+# ----- Transport compressé -----
+
+def lire_corps():
+    """Corps JSON de la requête, éventuellement compressé (Content-Encoding: gzip)"""
+    brut = request.get_data()
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        with gzip.GzipFile(fileobj=io.BytesIO(brut)) as flux:
+            brut = flux.read(CORPS_MAX + 1)
+        if len(brut) > CORPS_MAX:
+            raise ValueError('Corps trop volumineux')
+    try:
+        corps = json.loads(brut or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('JSON invalide')
+    if not isinstance(corps, dict):
+        raise ValueError('Objet JSON attendu')
+    return corps
+
+
+def reponse_json(donnees):
+    """JSON compact, compressé en gzip si le client l'accepte"""
+    corps = json.dumps(donnees, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    reponse = app.response_class(mimetype='application/json')
+    reponse.vary.add('Accept-Encoding')
+    if len(corps) >= COMPRESSION_MIN and 'gzip' in request.accept_encodings:
+        corps = gzip.compress(corps, compresslevel=6)
+        reponse.headers['Content-Encoding'] = 'gzip'
+    reponse.set_data(corps)
+    return reponse
+
+
+# ----- Inscription au journal à l'écriture -----
+
+_RESSOURCES_MODELES = {Eleve: 'eleves', Evaluation: 'evaluations', Commentaire: 'commentaires'}
+
+
+@event.listens_for(Session, 'before_flush')
+def _noter_lignes_modifiees(session, contexte_flush, instances):
+    notees = session.info.setdefault(
+        'synchro', {'ecrites': [], 'supprimees': [], 'eleves_deplaces': set()})
+    for objet in (*session.new, *session.dirty):
+        ressource = _RESSOURCES_MODELES.get(type(objet))
+        if ressource is None:
+            continue
+        notees['ecrites'].append((ressource, objet))
+        if ressource == 'eleves' and objet.id is not None \
+                and inspect(objet).attrs.classe_id.history.has_changes():
+            notees['eleves_deplaces'].add(objet)
+    for objet in session.deleted:
+        ressource = _RESSOURCES_MODELES.get(type(objet))
+        if ressource is not None:
+            # Classe lue avant la suppression (l'élève peut partir dans le même flush)
+            notees['supprimees'].append((ressource, objet.id, _classe(objet)))
+
+
+@event.listens_for(Session, 'after_flush')
+def _journaliser_lignes(session, contexte_flush):
+    notees = session.info.pop('synchro', None)
+    if not notees:
+        return
+    connexion = session.connection()
+    ecrites = {nom: {} for nom in CHAMPS_MODIFIABLES}
+    commentaires = {}
+    for ressource, objet in notees['ecrites']:
+        if objet in session.deleted or objet.id is None:
+            continue
+        if ressource == 'commentaires':
+            commentaires[objet.id] = objet.eleve_id
+        else:
+            ecrites[ressource][objet.id] = objet.classe_id
+    # Les commentaires suivent l'élève quand il change de classe
+    deplaces = {eleve.id: eleve.classe_id for eleve in notees['eleves_deplaces']}
+    if deplaces:
+        commentaires.update(connexion.execute(
+            db.select(Commentaire.id, Commentaire.eleve_id)
+            .where(Commentaire.eleve_id.in_(sorted(deplaces)))).all())
+    if commentaires:
+        eleves = set(commentaires.values()) - set(deplaces)
+        classes = dict(connexion.execute(
+            db.select(Eleve.id, Eleve.classe_id).where(Eleve.id.in_(sorted(eleves)))
+        ).all()) if eleves else {}
+        classes.update(deplaces)
+        ecrites['commentaires'] = {ligne_id: classes[eleve_id]
+                                   for ligne_id, eleve_id in commentaires.items()
+                                   if eleve_id in classes}
+    for ressource, lignes in ecrites.items():
+        journaliser(connexion, ressource, lignes)
+    supprimees = {}
+    for ressource, ligne_id, classe_id in notees['supprimees']:
+        supprimees.setdefault(ressource, {})[ligne_id] = classe_id
+    for ressource, lignes in supprimees.items():
+        journaliser(connexion, ressource, lignes, supprime=True)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _oublier_lignes_modifiees(session, transaction_precedente):
+    session.info.pop('synchro', None)
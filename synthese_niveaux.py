@@ -0,0 +1,138 @@
+"""
+Synthèse des niveaux par classe, matière et période pour le système LSU
+La table SyntheseNiveaux est tenue à jour à chaque flush de la session
+(insertion, modification ou suppression d'une Evaluation). Les insertions
+groupées qui contournent l'ORM appellent appliquer_deltas() elles-mêmes, ou
+reconstruisent la table :
+
+    python synthese_niveaux.py --reconstruire
+"""
+
+from app import app, db
+from models import Evaluation, EvaluationArchive, SyntheseNiveaux, Matiere
+from collections import Counter
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import argparse
+
+
+CHAMPS_CLE = ('classe_id', 'matiere_id', 'periode', 'annee_scolaire', 'niveau')
+
+
+def _cle(evaluation, anciennes_valeurs=False):
+    """Clé de synthèse d'une évaluation (valeurs avant modification si demandé)"""
+    etat = inspect(evaluation)
+    valeurs = []
+    for champ in CHAMPS_CLE:
+        historique = etat.attrs[champ].history
+        if anciennes_valeurs and historique.deleted:
+            valeurs.append(historique.deleted[0])
+        elif anciennes_valeurs and historique.unchanged:
+            valeurs.append(historique.unchanged[0])
+        else:
+            valeurs.append(getattr(evaluation, champ))
+    return tuple(valeurs)
+
+
+def _ajouter(deltas, cle, increment):
+    # Une évaluation sans niveau n'entre pas dans la répartition
+    if cle[-1] is not None:
+        deltas[cle] += increment
+
+
+def appliquer_deltas(connexion, deltas):
+    """Ajoute les variations {clé: delta} à la table de synthèse (upsert)"""
+    deltas = {cle: delta for cle, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = SyntheseNiveaux.__table__
+    insert = postgresql.insert if connexion.dialect.name == 'postgresql' \
+        else sqlite.insert
+    for cle, delta in deltas.items():
+        instruction = insert(table).values(dict(zip(CHAMPS_CLE, cle), nombre=delta))
+        connexion.execute(instruction.on_conflict_do_update(
+            index_elements=list(CHAMPS_CLE),
+            set_={'nombre': table.c.nombre + delta}
+        ))
+
+
+@event.listens_for(Session, 'before_flush')
+def _calculer_deltas(session, contexte_flush, instances):
+    """Variations de la synthèse dues aux évaluations de ce flush
+
+    Calculées avant le flush, tant que les lignes supprimées sont encore
+    lisibles, puis appliquées dans la même transaction après le flush.
+    """
+    deltas = session.info.setdefault('synthese_niveaux', Counter())
+    for objet in session.new:
+        if isinstance(objet, Evaluation):
+            _ajouter(deltas, _cle(objet), 1)
+    for objet in session.deleted:
+        if isinstance(objet, Evaluation):
+            _ajouter(deltas, _cle(objet, anciennes_valeurs=True), -1)
+    for objet in session.dirty:
+        if isinstance(objet, Evaluation) and session.is_modified(objet):
+            ancienne, nouvelle = _cle(objet, True), _cle(objet)
+            if ancienne != nouvelle:
+                _ajouter(deltas, ancienne, -1)
+                _ajouter(deltas, nouvelle, 1)
+
+
+@event.listens_for(Session, 'after_flush')
+def _maj_synthese(session, contexte_flush):
+    deltas = session.info.pop('synthese_niveaux', None)
+    if deltas:
+        appliquer_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _oublier_deltas(session, transaction_precedente):
+    session.info.pop('synthese_niveaux', None)
+
+
+def reconstruire(connexion):
+    """Recalcule entièrement la synthèse à partir des évaluations, archives comprises"""
+    table = SyntheseNiveaux.__table__
+    connexion.execute(table.delete())
+    evaluations = db.union_all(*[
+        db.select(*[source.c[champ] for champ in CHAMPS_CLE])
+        .where(source.c.niveau.isnot(None))
+        for source in (Evaluation.__table__, EvaluationArchive.__table__)
+    ]).subquery()
+    colonnes = [evaluations.c[champ] for champ in CHAMPS_CLE]
+    connexion.execute(table.insert().from_select(
+        list(CHAMPS_CLE) + ['nombre'],
+        db.select(*colonnes, db.func.count()).group_by(*colonnes)
+    ))
+
+
+def synthese_classe(classe_id, annee_scolaire):
+    """Répartition {matière: {période: {niveau: nombre}}} d'une classe"""
+    lignes = db.session.query(
+        Matiere.nom, SyntheseNiveaux.periode, SyntheseNiveaux.niveau,
+        SyntheseNiveaux.nombre
+    ).join(Matiere, SyntheseNiveaux.matiere_id == Matiere.id).filter(
+        SyntheseNiveaux.classe_id == classe_id,
+        SyntheseNiveaux.annee_scolaire == annee_scolaire,
+        SyntheseNiveaux.nombre > 0
+    ).all()
+    synthese = {}
+    for matiere, periode, niveau, nombre in lignes:
+        synthese.setdefault(matiere, {}).setdefault(periode, {})[niveau] = nombre
+    return synthese
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Synthèse des niveaux par classe")
+    parser.add_argument('--reconstruire', action='store_true',
+                        help="recalcule la synthèse depuis les évaluations")
+    args = parser.parse_args()
+
+    if args.reconstruire:
+        with app.app_context():
+            with db.engine.begin() as connexion:
+                reconstruire(connexion)
+            print(f"✅ Synthèse reconstruite : {SyntheseNiveaux.query.count()} lignes")
+    else:
+        parser.print_help()
@@ -0,0 +1,47 @@
+"""
+Application de test : base SQLite temporaire peuplée par init_db.py, budgets
+de requêtes en mode strict (un dépassement fait échouer la requête).
+
+    python -m pytest -q
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FICHIER_BASE = os.path.join(tempfile.mkdtemp(prefix='lsu-tests-'), 'lsu.db')
+# Avant l'import de app : jamais la base locale
+os.environ['DATABASE_URL'] = f'sqlite:///{FICHIER_BASE}'
+os.environ['BUDGET_REQUETES_STRICT'] = 'true'
+os.environ['IA_FOURNISSEUR'] = 'bouchon'
+sys.path.insert(0, RACINE)
+
+
+@pytest.fixture(scope='session')
+def application():
+    import init_db
+    from app import app, db
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.init_database()
+    with app.app_context():
+        db.session.remove()
+    return app
+
+
+@pytest.fixture
+def connexion(application):
+    """Client de test connecté avec l'identifiant et le mot de passe donnés"""
+    def connecter(identifiant, mot_de_passe):
+        client = application.test_client()
+        reponse = client.post('/login', data={'username': identifiant,
+                                              'password': mot_de_passe})
+        assert reponse.status_code == 302
+        return client
+    return connecter
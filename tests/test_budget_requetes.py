@@ -0,0 +1,80 @@
+"""
+Budgets de requêtes SQL des vues principales (BUDGET_REQUETES_STRICT : une
+vue qui dépasse son budget lève DepassementBudgetRequetes)
+"""
+
+import pytest
+from jinja2 import TemplateNotFound
+
+from app import db  # avant budget_requetes (import circulaire sinon)
+from budget_requetes import DepassementBudgetRequetes, budget_requetes, compter_requetes
+from models import User, Classe, Eleve, Evaluation
+import routes
+
+BUDGETS = {
+    'dashboard': 2,
+    'classes': 1,
+    'eleves': 1,
+    'detail_eleve': 3,
+    'generateur': 2,
+}
+COMPTES = [('dupont.marie', 'enseignant123'), ('martin.pierre', 'enseignant123')]
+# Relations affichées par les gabarits absents de l'arbre (eleves/liste.html,
+# eleves/detail.html), préchargées par leurs vues
+RELATIONS_AFFICHEES = {Eleve: ('classe',), Evaluation: ('matiere',)}
+
+
+@pytest.fixture
+def gabarits(monkeypatch):
+    """Rendu réel, ou à défaut lecture des relations affichées (dans le budget)"""
+    rendu = routes.render_template
+
+    def rendre(gabarit, **contexte):
+        try:
+            return rendu(gabarit, **contexte)
+        except TemplateNotFound:
+            for valeur in contexte.values():
+                for objet in valeur if isinstance(valeur, list) else [valeur]:
+                    for relation in RELATIONS_AFFICHEES.get(type(objet), ()):
+                        getattr(objet, relation)
+            return gabarit
+    monkeypatch.setattr(routes, 'render_template', rendre)
+
+
+def _eleve_de(application, identifiant):
+    with application.app_context():
+        utilisateur = User.query.filter_by(username=identifiant).one()
+        return Eleve.query.join(Classe).filter(
+            Classe.enseignant_id == utilisateur.id
+        ).order_by(Eleve.id).first().id
+
+
+@pytest.mark.parametrize('vue, budget', sorted(BUDGETS.items()))
+def test_budgets_declares(application, vue, budget):
+    assert application.view_functions[vue].budget_requetes == budget
+
+
+@pytest.mark.parametrize('identifiant, mot_de_passe', COMPTES)
+def test_vues_dans_leur_budget(application, connexion, gabarits, identifiant,
+                               mot_de_passe):
+    client = connexion(identifiant, mot_de_passe)
+    eleve_id = _eleve_de(application, identifiant)
+    for url in ['/dashboard', '/classes', '/eleves', f'/eleves/{eleve_id}',
+                '/generateur']:
+        # En mode strict, un dépassement fait échouer la requête
+        reponse = client.get(url)
+        assert reponse.status_code == 200, url
+
+
+def test_mode_strict_leve_le_depassement(application):
+    @budget_requetes(1)
+    def vue():
+        Eleve.query.first()
+        Eleve.query.count()
+
+    with application.test_request_context():
+        with compter_requetes() as compteur:
+            with pytest.raises(DepassementBudgetRequetes):
+                vue()
+        db.session.remove()
+    assert compteur.total == 2
@@ -0,0 +1,174 @@
+"""
+Version des données de chaque enseignant pour le système LSU École du Cap
+Toute modification d'une Classe, d'un Eleve, d'une Evaluation ou d'un
+Commentaire (ou de l'enseignant lui-même) incrémente, dans la même
+transaction, la version de l'enseignant concerné (table donnees_version).
+Les pages décorées par @reponse_conditionnelle en tirent un ETag : une page
+inchangée est servie en 304 après une seule lecture par clé primaire, sans
+passer par l'ORM, et les fragments HTML rendus par fragment() restent en
+cache tant que la version ne bouge pas.
+
+Les insertions groupées qui contournent l'ORM appellent incrementer().
+"""
+
+from app import app, db
+from models import User, Classe, Eleve, Evaluation, Commentaire, VersionDonnees
+from cache_ia import CacheMemoire
+from flask import g, request, session, make_response, render_template
+from flask_login import current_user
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from datetime import datetime
+from functools import wraps
+import hashlib
+import os
+
+
+_fragments = CacheMemoire(app.config['FRAGMENTS_TAILLE'], app.config['FRAGMENTS_TTL'])
+
+
+def _signature_gabarits():
+    """Empreinte des gabarits : un déploiement qui les modifie change les ETag"""
+    empreinte = hashlib.sha256()
+    dossier = os.path.join(app.root_path, app.template_folder)
+    for racine, _, fichiers in sorted(os.walk(dossier)):
+        for nom in sorted(fichiers):
+            chemin = os.path.join(racine, nom)
+            empreinte.update(f'{chemin}:{os.path.getmtime(chemin)}'.encode('utf-8'))
+    return empreinte.hexdigest()[:12]
+
+
+_SIGNATURE_GABARITS = _signature_gabarits()
+
+
+def version(enseignant_id):
+    """(version, date de modification) des données de l'enseignant"""
+    table = VersionDonnees.__table__
+    ligne = db.session.execute(
+        db.select(table.c.version, table.c.date_modification)
+        .where(table.c.enseignant_id == enseignant_id)
+    ).first()
+    return (ligne.version, ligne.date_modification) if ligne else (0, None)
+
+
+def version_courante():
+    """Version de l'utilisateur connecté, lue une fois par requête"""
+    if 'version_donnees' not in g:
+        g.version_donnees = version(current_user.id)
+    return g.version_donnees
+
+
+def incrementer(connexion, enseignant_ids):
+    """Incrémente la version des enseignants (dans la transaction de connexion)"""
+    enseignant_ids = sorted({i for i in enseignant_ids if i is not None})
+    if not enseignant_ids:
+        return
+    table = VersionDonnees.__table__
+    maintenant = datetime.utcnow()
+    insert = postgresql.insert if connexion.dialect.name == 'postgresql' \
+        else sqlite.insert
+    instruction = insert(table)
+    connexion.execute(instruction.on_conflict_do_update(
+        index_elements=['enseignant_id'],
+        set_={'version': table.c.version + 1, 'date_modification': maintenant}
+    ), [{'enseignant_id': i, 'version': 1, 'date_modification': maintenant}
+        for i in enseignant_ids])
+
+
+def _etag(version_donnees):
+    contenu = f'{current_user.id}:{version_donnees}:{_SIGNATURE_GABARITS}:{request.full_path}'
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()[:32]
+
+
+def reponse_conditionnelle(vue):
+    """ETag / Last-Modified d'une page de l'enseignant, 304 si inchangée
+
+    À placer après @login_required : la vue n'est pas appelée pour un 304.
+    """
+    @wraps(vue)
+    def enveloppe(*args, **kwargs):
+        version_donnees, modification = version_courante()
+        # Messages flash en attente : la page affichée ne sera pas la même
+        if session.get('_flashes'):
+            return vue(*args, **kwargs)
+        etag = _etag(version_donnees)
+        if request.if_none_match:
+            inchangee = request.if_none_match.contains_weak(etag)
+        else:
+            inchangee = bool(modification and request.if_modified_since and
+                             modification.replace(microsecond=0) <=
+                             request.if_modified_since.replace(tzinfo=None))
+        if inchangee:
+            reponse = app.response_class(status=304)
+        else:
+            reponse = make_response(vue(*args, **kwargs))
+            if reponse.status_code != 200:
+                return reponse
+        reponse.set_etag(etag, weak=True)
+        if modification:
+            reponse.last_modified = modification
+        # Réponse propre à l'utilisateur, toujours revalidée
+        reponse.cache_control.private = True
+        reponse.cache_control.no_cache = True
+        return reponse
+    return enveloppe
+
+
+def fragment(nom, gabarit, contexte):
+    """HTML de gabarit rendu avec contexte(), en cache pour la version courante
+
+    contexte n'est appelé (et ses requêtes exécutées) qu'en cas d'absence.
+    """
+    cle = (nom, current_user.id, version_courante()[0])
+    html = _fragments.get(cle)
+    if html is None:
+        html = Markup(render_template(gabarit, **contexte()))
+        _fragments.set(cle, html)
+    return html
+
+
+# ----- Incrémentation à l'écriture -----
+
+def _anciennes_et_nouvelle(objet, attribut):
+    historique = inspect(objet).attrs[attribut].history
+    return [*historique.deleted, getattr(objet, attribut)]
+
+
+@event.listens_for(Session, 'before_flush')
+def _noter_donnees_modifiees(session, contexte_flush, instances):
+    modifiees = session.info.setdefault(
+        'donnees_modifiees', {'enseignants': set(), 'classes': set(), 'eleves': set()})
+    for objet in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(objet, User):
+            modifiees['enseignants'].add(objet.id)
+        elif isinstance(objet, Classe):
+            modifiees['enseignants'].update(_anciennes_et_nouvelle(objet, 'enseignant_id'))
+        elif isinstance(objet, (Eleve, Evaluation)):
+            modifiees['classes'].update(_anciennes_et_nouvelle(objet, 'classe_id'))
+        elif isinstance(objet, Commentaire):
+            modifiees['eleves'].update(_anciennes_et_nouvelle(objet, 'eleve_id'))
+
+
+@event.listens_for(Session, 'after_flush')
+def _incrementer_versions(session, contexte_flush):
+    modifiees = session.info.pop('donnees_modifiees', None)
+    if not modifiees:
+        return
+    connexion = session.connection()
+    enseignants = set(modifiees['enseignants'])
+    classes = {i for i in modifiees['classes'] if i is not None}
+    eleves = [i for i in modifiees['eleves'] if i is not None]
+    if eleves:
+        classes.update(connexion.execute(
+            db.select(Eleve.classe_id).where(Eleve.id.in_(eleves))).scalars())
+    if classes:
+        enseignants.update(connexion.execute(
+            db.select(Classe.enseignant_id).where(Classe.id.in_(classes))).scalars())
+    incrementer(connexion, enseignants)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _oublier_donnees_modifiees(session, transaction_precedente):
+    session.info.pop('donnees_modifiees', None)